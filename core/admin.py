@@ -1,15 +1,22 @@
 from django.contrib import admin
-from django.utils.html import format_html
+from django.contrib.admin.actions import delete_selected
+from django.utils.html import format_html, format_html_join
 from django.utils.safestring import mark_safe
-from django.urls import path
-from django.shortcuts import render, redirect
+from django.urls import path, reverse
+from django.shortcuts import get_object_or_404, render, redirect
+from django.http import FileResponse, Http404
 from django.contrib import messages
 from django.utils import timezone
+from django.db.models import Count, Q
 from import_export import resources, fields
-from import_export.admin import ImportExportModelAdmin
+from import_export.admin import ExportMixin, ImportExportModelAdmin
 from import_export.widgets import ForeignKeyWidget
 
-from .models import Room, Teacher, CourseGroup, Student, Enrollment, Payment, Attendance, Session, SessionException
+from .exports import enqueue_export_job
+from .imports import BulkImportMixin, CachedForeignKeyWidget
+from .message_templates import PLACEHOLDERS, TEMPLATE_CODE_CHOICES, allowed_placeholders, compile_template
+from .models import Room, Teacher, CourseGroup, Student, Enrollment, Payment, Attendance, Session, SessionException, PayrollRun, PayrollLine, KpiSnapshot, ExportJob, OutboundMessage, MessageTemplate, receipt_numbers
+from .phones import duplicate_parent_contacts
 from django.core.exceptions import ValidationError
 
 
@@ -45,6 +52,9 @@ class CourseGroupResource(resources.ModelResource):
         fields = ('id', 'name', 'subject', 'level', 'monthly_price', 
                   'teacher', 'room', 'schedule_day', 'start_time', 'end_time')
 
+    def get_queryset(self):
+        return CourseGroup.objects.select_related('teacher', 'room')
+
 
 class StudentResource(resources.ModelResource):
     total_fees = fields.Field()
@@ -55,11 +65,16 @@ class StudentResource(resources.ModelResource):
         fields = ('id', 'name', 'phone', 'parent_contact', 'parent_name', 
                   'address', 'is_active', 'total_fees', 'payment_status')
     
+    def get_queryset(self):
+        return Student.objects.with_row_data()
+    
     def dehydrate_total_fees(self, student):
-        return str(student.total_monthly_fees())
+        # Annoté par with_row_data() : pas de requête par ligne
+        fees = getattr(student, 'monthly_fees', None)
+        return str(fees if fees is not None else student.total_monthly_fees())
     
     def dehydrate_payment_status(self, student):
-        return student.payment_status()
+        return getattr(student, 'row_status', None) or student.payment_status()
 
 
 class PaymentResource(resources.ModelResource):
@@ -74,6 +89,122 @@ class PaymentResource(resources.ModelResource):
         fields = ('id', 'receipt_number', 'student', 'amount', 'payment_date',
                   'month_covered', 'status', 'payment_method', 'notes')
 
+    def get_queryset(self):
+        return Payment.objects.select_related('student')
+
+
+class AttendanceResource(resources.ModelResource):
+    student = fields.Field(
+        column_name='student',
+        attribute='student',
+        widget=ForeignKeyWidget(Student, 'name')
+    )
+    course_group = fields.Field(
+        column_name='course_group',
+        attribute='course_group',
+        widget=ForeignKeyWidget(CourseGroup, 'name')
+    )
+
+    class Meta:
+        model = Attendance
+        fields = ('id', 'date', 'student', 'course_group', 'is_present', 'notes')
+
+    def get_queryset(self):
+        return Attendance.objects.select_related('student', 'course_group')
+
+
+# ==================== IMPORT RAPIDE (voir core.imports) ====================
+
+BULK_RESOURCE_NAME = "Import rapide (en masse, sans rapport détaillé)"
+
+
+class CourseGroupBulkResource(BulkImportMixin, CourseGroupResource):
+    teacher = fields.Field(
+        column_name='teacher',
+        attribute='teacher',
+        widget=CachedForeignKeyWidget(Teacher, 'name')
+    )
+    room = fields.Field(
+        column_name='room',
+        attribute='room',
+        widget=CachedForeignKeyWidget(Room, 'name')
+    )
+
+    class Meta(CourseGroupResource.Meta):
+        name = BULK_RESOURCE_NAME
+
+
+class StudentBulkResource(BulkImportMixin, StudentResource):
+
+    class Meta(StudentResource.Meta):
+        name = BULK_RESOURCE_NAME
+
+
+class PaymentBulkResource(BulkImportMixin, PaymentResource):
+    student = fields.Field(
+        column_name='student',
+        attribute='student',
+        widget=CachedForeignKeyWidget(Student, 'name')
+    )
+
+    class Meta(PaymentResource.Meta):
+        name = BULK_RESOURCE_NAME
+
+    def get_bulk_clean_exclude(self):
+        # Attribué à l'enregistrement
+        return {'receipt_number'}
+
+    def before_import(self, dataset, **kwargs):
+        super().before_import(dataset, **kwargs)
+        self.receipts = receipt_numbers()
+
+    def before_save_instance(self, instance, row, **kwargs):
+        # Ce que fait Payment.save(), sans requête par ligne
+        if instance.month_covered:
+            instance.month_covered = instance.month_covered.replace(day=1)
+        if not instance.receipt_number:
+            instance.receipt_number = next(self.receipts)
+        super().before_save_instance(instance, row, **kwargs)
+
+
+class BulkImportAdminMixin:
+    """Propose la ressource d'import rapide en plus de la ressource normale."""
+    bulk_resource_class = None
+
+    def get_import_resource_classes(self, request):
+        return list(super().get_import_resource_classes(request)) + [self.bulk_resource_class]
+
+
+class BackgroundExportMixin:
+    """
+    « Exporter » en CSV / XLSX met l'export en file (ExportJob, traité par
+    `manage.py run_export_jobs`) au lieu de générer le fichier pendant la
+    requête. Les autres formats restent immédiats.
+    """
+
+    def _do_file_export(self, file_format, request, queryset, export_form=None):
+        extension = file_format.get_extension()
+        if extension not in dict(ExportJob.FORMAT_CHOICES):
+            return super()._do_file_export(file_format, request, queryset, export_form=export_form)
+        # Éléments cochés (action « Exporter ») ; sinon toute la liste filtrée
+        pks = None
+        if export_form is not None and 'export_items' in export_form.changed_data:
+            pks = export_form.cleaned_data['export_items']
+        job = enqueue_export_job(
+            self.model,
+            self.choose_export_resource_class(export_form, request),
+            extension,
+            export_form.get_selected_resource_export_fields() if export_form else None,
+            created_by=request.user.get_username(),
+            params=request.GET,
+            pks=pks,
+        )
+        messages.success(
+            request,
+            f"📦 Export n°{job.pk} en préparation : le lien de téléchargement apparaîtra ici une fois le fichier prêt."
+        )
+        return redirect('admin:core_exportjob_changelist')
+
 
 # ==================== INLINE ADMINS ====================
 
@@ -84,6 +215,9 @@ class EnrollmentInline(admin.TabularInline):
     readonly_fields = ('enrolled_date',)
     autocomplete_fields = ['course_group']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('student', 'course_group')
+
 
 class PaymentInline(admin.TabularInline):
     model = Payment
@@ -110,20 +244,11 @@ class PaymentStatusFilter(admin.SimpleListFilter):
         )
     
     def queryset(self, request, queryset):
-        if self.value():
-            def normalize(s):
-                return (s or '').strip().upper()
-            wanted = self.value()
-            filtered_ids = []
-            for student in queryset:
-                status = normalize(student.payment_status())
-                if wanted == 'ok' and status in ('OK','PAID','UP_TO_DATE','À_JOUR','AJOUR'):
-                    filtered_ids.append(student.id)
-                elif wanted == 'partial' and status in ('PARTIAL','PARTIEL','PARTIALLY_PAID'):
-                    filtered_ids.append(student.id)
-                elif wanted == 'unpaid' and status in ('UNPAID','IMPAID','OVERDUE','DUE',''):
-                    filtered_ids.append(student.id)
-            return queryset.filter(id__in=filtered_ids)
+        if self.value() in ('ok', 'partial', 'unpaid'):
+            # Statut calculé en SQL (Student.objects.with_row_data)
+            if 'row_status' not in queryset.query.annotations:
+                queryset = queryset.with_row_data()
+            return queryset.filter(row_status=self.value().upper())
         return queryset
 
 
@@ -150,6 +275,22 @@ class CurrentMonthPaymentFilter(admin.SimpleListFilter):
         return queryset
 
 
+class SharedParentContactFilter(admin.SimpleListFilter):
+    title = 'Téléphone parent'
+    parameter_name = 'shared_parent'
+
+    def lookups(self, request, model_admin):
+        return (
+            ('yes', 'Partagé (fratrie)'),
+        )
+
+    def queryset(self, request, queryset):
+        if self.value() == 'yes':
+            shared = duplicate_parent_contacts(Student.objects.all()).values('parent_contact_e164')
+            return queryset.filter(parent_contact_e164__in=shared)
+        return queryset
+
+
 # ==================== MAIN ADMIN CLASSES ====================
 
 @admin.register(Room)
@@ -159,6 +300,11 @@ class RoomAdmin(ImportExportModelAdmin):
     list_filter = ('is_active',)
     search_fields = ('name',)
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            active_course_count=Count('course_groups', filter=Q(course_groups__is_active=True))
+        )
+    
     def active_status(self, obj):
         if obj.is_active:
             return mark_safe('<span style="color: green;">✓ Active</span>')
@@ -166,9 +312,9 @@ class RoomAdmin(ImportExportModelAdmin):
     active_status.short_description = 'Statut'
     
     def course_count(self, obj):
-        count = obj.course_groups.filter(is_active=True).count()
-        return format_html('<strong>{}</strong> cours', count)
+        return format_html('<strong>{}</strong> cours', obj.active_course_count)
     course_count.short_description = 'Cours actifs'
+    course_count.admin_order_field = 'active_course_count'
 
 
 @admin.register(Teacher)
@@ -188,16 +334,23 @@ class TeacherAdmin(ImportExportModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            active_course_count=Count('course_groups', filter=Q(course_groups__is_active=True))
+        )
+    
     def hourly_rate_display(self, obj):
         return format_html('<strong>{} DH/h</strong>', obj.hourly_rate)
     hourly_rate_display.short_description = 'Tarif'
+    hourly_rate_display.admin_order_field = 'hourly_rate'
     
     def course_count(self, obj):
-        count = obj.course_groups.filter(is_active=True).count()
+        count = obj.active_course_count
         if count > 0:
             return format_html('<span style="color: green;">{} groupes</span>', count)
         return mark_safe('<span style="color: gray;">0 groupe</span>')
     course_count.short_description = 'Groupes'
+    course_count.admin_order_field = 'active_course_count'
     
     def active_status(self, obj):
         if obj.is_active:
@@ -207,9 +360,10 @@ class TeacherAdmin(ImportExportModelAdmin):
 
 
 @admin.register(CourseGroup)
-class CourseGroupAdmin(ImportExportModelAdmin):
+class CourseGroupAdmin(BulkImportAdminMixin, ImportExportModelAdmin):
 
     resource_class = CourseGroupResource
+    bulk_resource_class = CourseGroupBulkResource
     list_display = ('name', 'subject', 'level', 'schedule_display', 'room', 
                     'teacher', 'price_display', 'student_count', 'status_badge')
     list_filter = ('is_active', 'schedule_day', 'teacher', 'room', 'level')
@@ -231,6 +385,11 @@ class CourseGroupAdmin(ImportExportModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('teacher', 'room').annotate(
+            active_student_count=Count('students', filter=Q(students__is_active=True), distinct=True)
+        )
+    
     def schedule_display(self, obj):
         return format_html(
             '<strong>{}</strong><br>{} - {}',
@@ -239,13 +398,15 @@ class CourseGroupAdmin(ImportExportModelAdmin):
             obj.end_time.strftime('%H:%M')
         )
     schedule_display.short_description = 'Horaire'
+    schedule_display.admin_order_field = 'schedule_day'
     
     def price_display(self, obj):
         return format_html('<strong>{} DH</strong>/mois', obj.monthly_price)
     price_display.short_description = 'Prix'
+    price_display.admin_order_field = 'monthly_price'
     
     def student_count(self, obj):
-        count = obj.students.filter(is_active=True).count()
+        count = obj.active_student_count
         if count >= (obj.room.capacity * 0.8):
             color = 'red'
         elif count >= (obj.room.capacity * 0.5):
@@ -257,6 +418,7 @@ class CourseGroupAdmin(ImportExportModelAdmin):
             color, count, obj.room.capacity
         )
     student_count.short_description = 'Élèves'
+    student_count.admin_order_field = 'active_student_count'
     
     def status_badge(self, obj):
         if obj.is_active:
@@ -278,11 +440,12 @@ class CourseGroupAdmin(ImportExportModelAdmin):
 
 
 @admin.register(Student)
-class StudentAdmin(ImportExportModelAdmin):
+class StudentAdmin(BackgroundExportMixin, BulkImportAdminMixin, ImportExportModelAdmin):
     resource_class = StudentResource
+    bulk_resource_class = StudentBulkResource
     list_display = ('name', 'parent_contact', 'groups_display', 'monthly_fees_display', 
                     'payment_status_badge', 'active_badge')
-    list_filter = ('is_active', PaymentStatusFilter, 'enrollment__course_group')
+    list_filter = ('is_active', PaymentStatusFilter, SharedParentContactFilter, 'enrollment__course_group')
     search_fields = ('name', 'phone', 'parent_contact', 'parent_name')
     inlines = [EnrollmentInline, PaymentInline]
     
@@ -291,7 +454,7 @@ class StudentAdmin(ImportExportModelAdmin):
             'fields': ('name', 'phone', 'date_of_birth')
         }),
         ('Contact parent', {
-            'fields': ('parent_name', 'parent_contact', 'address')
+            'fields': ('parent_name', 'parent_contact', 'message_language', 'address')
         }),
         ('Autres', {
             'fields': ('is_active', 'notes')
@@ -300,23 +463,28 @@ class StudentAdmin(ImportExportModelAdmin):
     
     actions = ['generate_payment_reminders']
     
+    def get_queryset(self, request):
+        # Frais, payé du mois, statut et inscriptions actives : annotés / préchargés
+        return super().get_queryset(request).with_row_data()
+    
     def groups_display(self, obj):
-        groups = obj.enrollment_set.filter(is_active=True)
-        if groups.exists():
-            group_list = '<br>'.join([f"• {e.course_group.name}" for e in groups[:3]])
-            if groups.count() > 3:
-                group_list += f'<br>... +{groups.count() - 3} autres'
-            return mark_safe(group_list)
+        groups = obj.active_enrollments
+        if groups:
+            group_list = format_html_join(mark_safe('<br>'), '• {}', ((e.course_group.name,) for e in groups[:3]))
+            if obj.active_enrollment_count > 3:
+                group_list += format_html('<br>... +{} autres', obj.active_enrollment_count - 3)
+            return group_list
         return mark_safe('<span style="color: gray;">Aucun groupe</span>')
     groups_display.short_description = 'Groupes'
+    groups_display.admin_order_field = 'active_enrollment_count'
     
     def monthly_fees_display(self, obj):
-        total = obj.total_monthly_fees()
-        return format_html('<strong style="font-size: 14px;">{} DH</strong>', total)
+        return format_html('<strong style="font-size: 14px;">{} DH</strong>', obj.monthly_fees)
     monthly_fees_display.short_description = 'Frais mensuels'
+    monthly_fees_display.admin_order_field = 'monthly_fees'
     
     def payment_status_badge(self, obj):
-        status = (obj.payment_status() or '').strip().upper()
+        status = (obj.row_status or '').strip().upper()
         if status in ('OK','PAID','UP_TO_DATE','À_JOUR','AJOUR'):
             return mark_safe('<span style="background: #28a745; color: white; padding: 4px 10px; border-radius: 4px; font-weight: bold;">✓ PAYÉ</span>')
         if status in ('PARTIAL','PARTIEL','PARTIALLY_PAID'):
@@ -326,6 +494,7 @@ class StudentAdmin(ImportExportModelAdmin):
         # fallback: show raw normalized status
         return format_html('<span style="background: gray; color: white; padding: 4px 10px; border-radius: 4px; font-weight: bold;">{}</span>', status)
     payment_status_badge.short_description = 'Statut'
+    payment_status_badge.admin_order_field = 'row_status'
 
     
     def active_badge(self, obj):
@@ -336,10 +505,11 @@ class StudentAdmin(ImportExportModelAdmin):
     
     def generate_payment_reminders(self, request, queryset):
         """Action pour générer des rappels de paiement"""
-        unpaid = []
-        for student in queryset:
-            if student.payment_status() in ['UNPAID', 'PARTIAL']:
-                unpaid.append(student.name)
+        if 'row_status' not in queryset.query.annotations:
+            queryset = queryset.with_row_data()
+        unpaid = list(
+            queryset.filter(row_status__in=['UNPAID', 'PARTIAL']).prefetch_related(None).values_list('name', flat=True)
+        )
         
         if unpaid:
             messages.warning(
@@ -354,8 +524,9 @@ class StudentAdmin(ImportExportModelAdmin):
 
 
 @admin.register(Payment)
-class PaymentAdmin(ImportExportModelAdmin):
+class PaymentAdmin(BackgroundExportMixin, BulkImportAdminMixin, ImportExportModelAdmin):
     resource_class = PaymentResource
+    bulk_resource_class = PaymentBulkResource
     list_display = ('receipt_number', 'student', 'amount_display', 'payment_date', 
                     'month_covered', 'status_badge', 'payment_method', 'locked_status')
     list_filter = ('status', 'payment_method', CurrentMonthPaymentFilter, 'is_locked', 'payment_date')
@@ -378,9 +549,13 @@ class PaymentAdmin(ImportExportModelAdmin):
     
     readonly_fields = ('receipt_number', 'created_at')
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('student')
+    
     def amount_display(self, obj):
         return format_html('<strong style="font-size: 15px; color: #28a745;">{} DH</strong>', obj.amount)
     amount_display.short_description = 'Montant'
+    amount_display.admin_order_field = 'amount'
     
     def status_badge(self, obj):
         colors = {
@@ -394,6 +569,7 @@ class PaymentAdmin(ImportExportModelAdmin):
             obj.get_status_display()
         )
     status_badge.short_description = 'Statut'
+    status_badge.admin_order_field = 'status'
     
     def locked_status(self, obj):
         if obj.is_locked:
@@ -407,6 +583,9 @@ class SessionExceptionAdmin(admin.ModelAdmin):
     list_filter = ('cancelled', 'course_group__teacher', 'course_group__room')
     search_fields = ('course_group__name',)
     autocomplete_fields = ('course_group', 'override_room')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('course_group', 'override_room')
     # locked_status.short_description = 'Verrou'
     
     def has_delete_permission(self, request, obj=None):
@@ -438,18 +617,23 @@ class SessionExceptionAdmin(admin.ModelAdmin):
 
 
 @admin.register(Attendance)
-class AttendanceAdmin(admin.ModelAdmin):
+class AttendanceAdmin(BackgroundExportMixin, ExportMixin, admin.ModelAdmin):
+    resource_class = AttendanceResource
     list_display = ('date', 'student', 'course_group', 'presence_badge', 'notes_preview')
     list_filter = ('is_present', 'date', 'course_group')
     search_fields = ('student__name', 'course_group__name')
-    autocomplete_fields = ['student', 'course_group']
+    autocomplete_fields = ['student', 'course_group', 'session']
     date_hierarchy = 'date'
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('student', 'course_group')
+    
     def presence_badge(self, obj):
         if obj.is_present:
             return mark_safe('<span style="color: green; font-size: 18px; font-weight: bold;">✓ Présent</span>')
         return mark_safe('<span style="color: red; font-size: 18px; font-weight: bold;">✗ Absent</span>')
     presence_badge.short_description = 'Présence'
+    presence_badge.admin_order_field = 'is_present'
     
     def notes_preview(self, obj):
         if obj.notes:
@@ -465,13 +649,18 @@ class SessionAdmin(admin.ModelAdmin):
     search_fields = ('group__name', 'group__teacher__name', 'group__room__name')
     autocomplete_fields = ['group']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('group__room', 'group__teacher')
+
     def get_room(self, obj):
         return obj.group.room.name if obj.group and obj.group.room else '-'
     get_room.short_description = 'Salle'
+    get_room.admin_order_field = 'group__room__name'
 
     def get_teacher(self, obj):
         return obj.group.teacher.name if obj.group and obj.group.teacher else '-'
     get_teacher.short_description = 'Professeur'
+    get_teacher.admin_order_field = 'group__teacher__name'
 
     def save_model(self, request, obj, form, change):
         try:
@@ -483,6 +672,227 @@ class SessionAdmin(admin.ModelAdmin):
             return
 
 
+class PayrollLineInline(admin.TabularInline):
+    model = PayrollLine
+    extra = 0
+    fields = ('teacher', 'sessions_count', 'minutes', 'hourly_rate', 'amount')
+    readonly_fields = fields
+    can_delete = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('teacher')
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PayrollRun)
+class PayrollRunAdmin(admin.ModelAdmin):
+    list_display = ('month', 'status', 'total_amount', 'computed_at', 'approved_at', 'approved_by')
+    list_filter = ('status',)
+    readonly_fields = ('total_minutes', 'total_amount', 'created_at', 'created_by',
+                       'computed_at', 'approved_at', 'approved_by')
+    inlines = [PayrollLineInline]
+
+    def has_change_permission(self, request, obj=None):
+        if obj and obj.is_approved:
+            return False
+        return super().has_change_permission(request, obj)
+
+    def has_delete_permission(self, request, obj=None):
+        if obj and obj.is_approved:
+            return False
+        return super().has_delete_permission(request, obj)
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        if 'delete_selected' in actions:
+            actions['delete_selected'] = (
+                PayrollRunAdmin.delete_selected_drafts, 'delete_selected', delete_selected.short_description
+            )
+        return actions
+
+    def delete_selected_drafts(self, request, queryset):
+        """« Supprimer » de la liste : refusé si la sélection contient une paie validée."""
+        approved = [str(run) for run in queryset.filter(status='APPROVED')]
+        if approved:
+            self.message_user(
+                request,
+                f"Suppression annulée : paie(s) validée(s) dans la sélection ({', '.join(approved)}).",
+                messages.ERROR,
+            )
+            return None
+        return delete_selected(self, request, queryset)
+
+    def delete_queryset(self, request, queryset):
+        # Garde-fou : seules les paies en brouillon sont supprimées
+        queryset.exclude(status='APPROVED').delete()
+
+
+@admin.register(KpiSnapshot)
+class KpiSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('date', 'active_students', 'active_enrollments', 'revenue', 'unpaid_amount', 'attendance_rate')
+    date_hierarchy = 'date'
+    readonly_fields = [f.name for f in KpiSnapshot._meta.fields]
+
+    def has_add_permission(self, request):
+        # Rempli par la commande snapshot_kpis
+        return False
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'model_label', 'file_format', 'status_badge', 'progress_display',
+                    'created_by', 'created_at', 'download_link')
+    list_filter = ('status', 'file_format')
+    readonly_fields = ('model_label', 'resource_path', 'file_format', 'export_fields', 'status',
+                       'total_rows', 'processed_rows', 'download_link', 'error',
+                       'created_at', 'created_by', 'started_at', 'finished_at')
+    exclude = ('file',)
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        if not request.user.is_superuser:
+            qs = qs.filter(created_by=request.user.username)
+        return qs
+
+    def has_add_permission(self, request):
+        # Créés par le bouton « Exporter » des autres listes
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        urls = super().get_urls()
+        return [
+            path('<int:pk>/download/', self.admin_site.admin_view(self.download_view),
+                 name='core_exportjob_download'),
+        ] + urls
+
+    def download_view(self, request, pk):
+        job = get_object_or_404(self.get_queryset(request), pk=pk, status='DONE')
+        if not job.file:
+            raise Http404
+        try:
+            return FileResponse(job.file.open('rb'), as_attachment=True, filename=job.file.name.split('/')[-1])
+        except FileNotFoundError:
+            raise Http404
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        # Rafraîchir la page tant qu'un export est en cours
+        if self.get_queryset(request).filter(status__in=['PENDING', 'RUNNING']).exists():
+            response['Refresh'] = '5'
+        return response
+
+    def status_badge(self, obj):
+        colors = {
+            'PENDING': '#6c757d',
+            'RUNNING': '#ffc107',
+            'DONE': '#28a745',
+            'FAILED': '#dc3545',
+        }
+        return format_html(
+            '<span style="background: {}; color: white; padding: 3px 10px; border-radius: 3px;">{}</span>',
+            colors.get(obj.status, 'gray'),
+            obj.get_status_display()
+        )
+    status_badge.short_description = 'Statut'
+    status_badge.admin_order_field = 'status'
+
+    def progress_display(self, obj):
+        if obj.progress is None:
+            return '-'
+        return format_html('{}% <small style="color: gray;">({} / {})</small>',
+                           obj.progress, obj.processed_rows, obj.total_rows)
+    progress_display.short_description = 'Avancement'
+
+    def download_link(self, obj):
+        if obj.status == 'DONE' and obj.file:
+            return format_html('<a href="{}">⬇ Télécharger</a>', reverse('admin:core_exportjob_download', args=[obj.pk]))
+        return '-'
+    download_link.short_description = 'Fichier'
+
+
+@admin.register(OutboundMessage)
+class OutboundMessageAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'channel', 'to', 'student', 'status_badge', 'attempts',
+                    'next_attempt_at', 'sent_at', 'created_at')
+    list_filter = ('status', 'kind', 'channel')
+    search_fields = ('to', 'student__name', 'provider_id')
+    date_hierarchy = 'created_at'
+    list_select_related = ('student',)
+    readonly_fields = ('channel', 'kind', 'to', 'body', 'student', 'status', 'attempts', 'next_attempt_at',
+                       'last_error', 'provider_id', 'created_at', 'sent_at')
+    actions = ['retry_messages', 'cancel_messages']
+
+    def has_add_permission(self, request):
+        # Créés par les pages WhatsApp, les rappels... (core.outbox)
+        return False
+
+    def status_badge(self, obj):
+        colors = {
+            'QUEUED': '#6c757d',
+            'SENDING': '#ffc107',
+            'SENT': '#28a745',
+            'FAILED': '#dc3545',
+            'CANCELLED': '#343a40',
+        }
+        return format_html(
+            '<span style="background: {}; color: white; padding: 3px 10px; border-radius: 3px;" title="{}">{}</span>',
+            colors.get(obj.status, 'gray'),
+            obj.last_error,
+            obj.get_status_display()
+        )
+    status_badge.short_description = 'Statut'
+    status_badge.admin_order_field = 'status'
+
+    def retry_messages(self, request, queryset):
+        updated = queryset.filter(status__in=['FAILED', 'CANCELLED']).update(
+            status='QUEUED', attempts=0, next_attempt_at=timezone.now(), last_error=''
+        )
+        messages.success(request, f"🔁 {updated} message(s) remis en file d'envoi")
+    retry_messages.short_description = "🔁 Renvoyer"
+
+    def cancel_messages(self, request, queryset):
+        updated = queryset.filter(status='QUEUED').update(status='CANCELLED')
+        messages.success(request, f"🚫 {updated} message(s) annulé(s)")
+    cancel_messages.short_description = "🚫 Annuler l'envoi"
+
+
+@admin.register(MessageTemplate)
+class MessageTemplateAdmin(admin.ModelAdmin):
+    list_display = ('code', 'language', 'is_active', 'excerpt', 'updated_at')
+    list_filter = ('code', 'language', 'is_active')
+    search_fields = ('body',)
+    readonly_fields = ('placeholders_help', 'preview', 'updated_at')
+    fields = ('code', 'language', 'is_active', 'body', 'placeholders_help', 'preview', 'updated_at')
+
+    def excerpt(self, obj):
+        return obj.body[:80] + ('…' if len(obj.body) > 80 else '')
+    excerpt.short_description = 'Texte'
+
+    def placeholders_help(self, obj):
+        return format_html_join(
+            '', '<div><code>{{{}}}</code> : {}</div>',
+            ((name, label) for code, _ in TEMPLATE_CODE_CHOICES if code == obj.code
+             for name, label in PLACEHOLDERS[code].items())
+        ) or "Choisissez le message puis enregistrez pour voir les variables disponibles."
+    placeholders_help.short_description = 'Variables'
+
+    def preview(self, obj):
+        if not obj.pk:
+            return '-'
+        try:
+            render_body = compile_template(obj.body, allowed_placeholders(obj.code))
+        except ValidationError as e:
+            return ', '.join(e.messages)
+        sample = {name: f'[{label}]' for name, label in PLACEHOLDERS[obj.code].items()}
+        return format_html('<div style="white-space: pre-wrap;">{}</div>', render_body(sample))
+    preview.short_description = 'Aperçu'
+
+
 # ==================== CUSTOMISATION DU SITE ADMIN ====================
 
 admin.site.site_header = "🎓 École de Soutien - Gestion"
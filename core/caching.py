@@ -0,0 +1,165 @@
+"""
+Cache des statistiques du tableau de bord
+
+Chaque section (effectifs, recettes, impayés, conflits, séances du jour) a
+sa propre clé dans le cache Django. Les signaux de core.signals invalident les sections touchées
+par une écriture ; le TTL (DASHBOARD_CACHE_TTL) sert de filet de sécurité pour
+les écritures qui ne passent pas par save()/delete() (queryset.update, SQL).
+
+Les compteurs de hits / misses sont eux aussi stockés dans le cache afin
+d'être partagés par tous les workers lorsque le backend l'est (fichiers).
+
+Fragments de template versionnés (tag {% versioned_cache %}) : la clé d'un
+fragment contient la version de la ligne affichée (Student.version,
+Session.version, incrémentées par save() et les signaux) et une génération par type
+de fragment, incrémentée quand un objet partagé change (groupe, salle...).
+Une ligne modifiée change de clé et se recalcule ; les autres sont servies
+telles quelles.
+"""
+import hashlib
+import logging
+import time
+from typing import Callable, Dict, Iterable, Optional, Sequence
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'dashboard'
+SECTIONS = ('counts', 'revenue', 'unpaid', 'conflicts', 'today')
+METRICS = ('hits', 'misses', 'invalidations', 'overruns')
+
+FRAGMENT_PREFIX = 'fragment'
+FRAGMENT_KINDS = ('student_card', 'student_row', 'schedule_cell')
+FRAGMENT_METRICS = ('hits', 'misses')
+
+
+def _ttl() -> int:
+    return getattr(settings, 'DASHBOARD_CACHE_TTL', 120)
+
+
+def _section_key(section: str) -> str:
+    return f'{KEY_PREFIX}:{section}'
+
+
+def _metric_key(section: str, metric: str) -> str:
+    return f'{KEY_PREFIX}:metrics:{section}:{metric}'
+
+
+def _incr(key: str):
+    # add() est atomique : crée le compteur s'il n'existe pas encore
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def cached_section(section: str, compute: Callable, ttl: Optional[int] = None,
+                   budget: Optional[float] = None):
+    """
+    Valeur d'une section, calculée par `compute()` en cas d'absence.
+
+    La valeur est datée : une entrée d'hier (recette du jour, mois courant)
+    est traitée comme un miss. Un calcul plus long que `budget` secondes est
+    compté comme dépassement.
+    """
+    today = timezone.now().date()
+    entry = cache.get(_section_key(section))
+    if entry is not None and entry['day'] == today:
+        _incr(_metric_key(section, 'hits'))
+        return entry['value']
+
+    _incr(_metric_key(section, 'misses'))
+    started = time.monotonic()
+    value = compute()
+    elapsed = time.monotonic() - started
+    if budget is not None and elapsed > budget:
+        _incr(_metric_key(section, 'overruns'))
+        logger.warning('Dashboard section %s took %.2fs (budget %.2fs)', section, elapsed, budget)
+    cache.set(_section_key(section), {'day': today, 'value': value}, ttl if ttl is not None else _ttl())
+    return value
+
+
+def invalidate_sections(sections: Iterable[str]):
+    sections = list(sections)
+    cache.delete_many([_section_key(s) for s in sections])
+    for section in sections:
+        _incr(_metric_key(section, 'invalidations'))
+
+
+def get_cache_metrics() -> Dict:
+    """{section: {'hits', 'misses', 'invalidations', 'overruns', 'hit_rate'}}"""
+    keys = [_metric_key(s, m) for s in SECTIONS for m in METRICS]
+    values = cache.get_many(keys)
+
+    metrics = {}
+    for section in SECTIONS:
+        data = {m: values.get(_metric_key(section, m), 0) for m in METRICS}
+        lookups = data['hits'] + data['misses']
+        data['hit_rate'] = round(data['hits'] / lookups, 3) if lookups else None
+        metrics[section] = data
+    return metrics
+
+
+def reset_cache_metrics():
+    cache.delete_many(
+        [_metric_key(s, m) for s in SECTIONS for m in METRICS]
+        + [_fragment_metric_key(k, m) for k in FRAGMENT_KINDS for m in FRAGMENT_METRICS]
+    )
+
+
+# ==================== FRAGMENTS ====================
+
+def _fragment_ttl() -> int:
+    return getattr(settings, 'FRAGMENT_CACHE_TTL', 3600)
+
+
+def _generation_key(kind: str) -> str:
+    return f'{FRAGMENT_PREFIX}:generation:{kind}'
+
+
+def _fragment_metric_key(kind: str, metric: str) -> str:
+    return f'{FRAGMENT_PREFIX}:metrics:{kind}:{metric}'
+
+
+def get_fragment_generation(kind: str) -> int:
+    return cache.get(_generation_key(kind), 0)
+
+
+def bump_fragment_generation(kinds: Iterable[str]):
+    """Périme tous les fragments de ces types (objet partagé modifié)."""
+    for kind in kinds:
+        _incr(_generation_key(kind))
+
+
+def fragment_key(kind: str, generation: int, obj_id, version, vary: Sequence = ()) -> str:
+    digest = hashlib.md5(repr(list(vary)).encode('utf-8')).hexdigest()[:12]
+    return f'{FRAGMENT_PREFIX}:{kind}:{generation}:{obj_id}:{version}:{digest}'
+
+
+def cached_fragment(kind: str, key: str, render: Callable[[], str]) -> str:
+    html = cache.get(key)
+    if html is not None:
+        _incr(_fragment_metric_key(kind, 'hits'))
+        return html
+    _incr(_fragment_metric_key(kind, 'misses'))
+    html = render()
+    cache.set(key, html, _fragment_ttl())
+    return html
+
+
+def get_fragment_metrics() -> Dict:
+    """{type: {'hits', 'misses', 'hit_rate'}}"""
+    keys = [_fragment_metric_key(k, m) for k in FRAGMENT_KINDS for m in FRAGMENT_METRICS]
+    values = cache.get_many(keys)
+
+    metrics = {}
+    for kind in FRAGMENT_KINDS:
+        data = {m: values.get(_fragment_metric_key(kind, m), 0) for m in FRAGMENT_METRICS}
+        lookups = data['hits'] + data['misses']
+        data['hit_rate'] = round(data['hits'] / lookups, 3) if lookups else None
+        metrics[kind] = data
+    return metrics
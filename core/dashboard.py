@@ -0,0 +1,120 @@
+"""
+Panneaux du tableau de bord (cockpit)
+
+Chaque panneau est calculé et mis en cache indépendamment, avec son propre
+TTL et son budget de calcul. La page charge par défaut chaque panneau par une
+requête HTMX séparée : le premier affichage ne dépend plus du panneau le plus
+lent. En mode « eager » (DASHBOARD_EAGER_PANELS ou ?eager=1), les panneaux
+sont calculés en parallèle dans un pool de threads partagé par le processus
+(DASHBOARD_WORKERS threads au plus) ; ceux qui dépassent
+DASHBOARD_EAGER_TIMEOUT retombent sur le chargement HTMX.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from .caching import cached_section
+from .utils import get_dashboard_conflicts, get_dashboard_counts, get_dashboard_revenue, get_dashboard_unpaid
+
+
+def get_today_sessions() -> List:
+    from .models import Session
+
+    return list(
+        Session.objects.filter(date=timezone.now().date())
+        .select_related('group__teacher', 'group__room', 'room')
+        .order_by('start_time')
+    )
+
+
+# Ordre d'affichage ; ttl en secondes, budget de calcul en secondes
+PANELS = {
+    'counts': {
+        'compute': get_dashboard_counts,
+        'template': 'core/_panel_counts.html',
+        'ttl': 300,
+        'budget': 0.2,
+    },
+    'revenue': {
+        'compute': get_dashboard_revenue,
+        'template': 'core/_panel_revenue.html',
+        'ttl': 120,
+        'budget': 0.2,
+    },
+    'today': {
+        'compute': get_today_sessions,
+        'template': 'core/_panel_today.html',
+        'ttl': 60,
+        'budget': 0.3,
+    },
+    'unpaid': {
+        'compute': get_dashboard_unpaid,
+        'template': 'core/_panel_unpaid.html',
+        'ttl': 120,
+        'budget': 2.0,
+    },
+    'conflicts': {
+        'compute': get_dashboard_conflicts,
+        'template': 'core/_panel_conflicts.html',
+        'ttl': 600,
+        'budget': 1.0,
+    },
+}
+
+
+def get_panel(name: str):
+    """Valeur (en cache si possible) d'un panneau."""
+    panel = PANELS[name]
+    return cached_section(name, panel['compute'], ttl=panel['ttl'], budget=panel['budget'])
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Pool partagé par toutes les requêtes du processus, créé au premier usage."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'DASHBOARD_WORKERS', len(PANELS)),
+                    thread_name_prefix='dashboard',
+                )
+    return _executor
+
+
+def _get_panel_in_thread(name: str):
+    # Chaque thread ouvre sa propre connexion : la refermer en sortant
+    close_old_connections()
+    try:
+        return get_panel(name)
+    finally:
+        connection.close()
+
+
+def compute_panels_concurrently(names: List[str], timeout: float = None) -> Dict:
+    """
+    Calcule les panneaux en parallèle et retourne ceux terminés à temps.
+
+    Les panneaux absents du résultat seront chargés par HTMX ; leur calcul
+    se poursuit en arrière-plan et alimente le cache.
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'DASHBOARD_EAGER_TIMEOUT', 1.5)
+
+    executor = get_executor()
+    futures = {executor.submit(_get_panel_in_thread, name): name for name in names}
+    # Ne pas attendre les retardataires : ils finissent dans le pool
+    done, _ = wait(futures, timeout=timeout)
+
+    results = {}
+    for future in done:
+        if future.exception() is None:
+            results[futures[future]] = future.result()
+    return results
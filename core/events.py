@@ -0,0 +1,181 @@
+"""
+Événements métier diffusés en direct (Server-Sent Events)
+
+Les chemins d'écriture appellent `publish_event()` ; l'événement part après
+la validation de la transaction. Deux backends, choisis par EVENTS_BACKEND :
+
+- 'local' : diffuseur en mémoire du processus (runserver, un seul worker
+  ASGI). Les abonnés sont des asyncio.Queue alimentées depuis n'importe
+  quel thread.
+- 'file'  : spool JSON lines (EVENTS_SPOOL_PATH) partagé par tous les
+  workers d'une même machine ; chaque flux SSE lit la fin du fichier.
+  L'identifiant d'un événement est sa position dans le fichier.
+
+Un petit historique permet de reprendre après une reconnexion grâce à
+l'en-tête Last-Event-ID.
+
+Le flux ne s'ouvre que si l'application est servie en ASGI
+(`streaming_available`) : sous WSGI (runserver, gunicorn sync), Django
+consomme un itérateur asynchrone en entier avant de répondre, et un flux
+sans fin bloquerait un thread par onglet ouvert. Les pages n'ouvrent alors
+pas d'EventSource et se rafraîchissent autrement.
+"""
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, Optional
+
+from django.conf import settings
+from django.db import transaction
+
+PAYMENT_RECORDED = 'payment.recorded'
+ATTENDANCE_SAVED = 'attendance.saved'
+SESSION_STATUS = 'session.status'
+
+HEARTBEAT_SECONDS = 15
+
+
+class LocalBroadcaster:
+    """Diffuseur en mémoire : un seul processus."""
+
+    def __init__(self, history: int = 200):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._history = deque(maxlen=history)
+        self._subscribers = set()
+
+    def publish(self, event: Dict):
+        with self._lock:
+            event = dict(event, id=next(self._ids))
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # boucle fermée : l'abonné est parti
+                pass
+
+    async def subscribe(self, last_id: Optional[str] = None) -> AsyncIterator[Optional[Dict]]:
+        """Événements à partir de last_id ; None toutes les HEARTBEAT_SECONDS sans activité."""
+        queue = asyncio.Queue()
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            backlog = list(self._history)
+        try:
+            if last_id and last_id.isdigit():
+                for event in backlog:
+                    if event['id'] > int(last_id):
+                        yield event
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+
+
+class FileSpoolBroadcaster:
+    """Spool JSON lines partagé entre workers (même machine)."""
+
+    def __init__(self, path, max_bytes: int = 1024 * 1024, poll_interval: float = 0.5):
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.poll_interval = poll_interval
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+    def publish(self, event: Dict):
+        line = (json.dumps(event, default=str) + '\n').encode('utf-8')
+        try:
+            if os.path.getsize(self.path) > self.max_bytes:
+                # Les lecteurs voient la taille diminuer et repartent du début
+                os.replace(self.path, self.path + '.1')
+        except FileNotFoundError:
+            pass
+        # O_APPEND : une ligne courte est écrite d'un seul bloc
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def _size(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def _read_from(self, offset: int):
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for raw in f:
+                if not raw.endswith(b'\n'):
+                    # ligne en cours d'écriture
+                    break
+                offset += len(raw)
+                event = json.loads(raw)
+                event['id'] = offset
+                yield event
+
+    async def subscribe(self, last_id: Optional[str] = None) -> AsyncIterator[Optional[Dict]]:
+        size = self._size()
+        offset = int(last_id) if last_id and last_id.isdigit() and int(last_id) <= size else size
+        idle = 0.0
+        while True:
+            size = self._size()
+            if size < offset:
+                offset = 0
+            if size > offset:
+                for event in self._read_from(offset):
+                    offset = event['id']
+                    idle = 0.0
+                    yield event
+                continue
+            await asyncio.sleep(self.poll_interval)
+            idle += self.poll_interval
+            if idle >= HEARTBEAT_SECONDS:
+                idle = 0.0
+                yield None
+
+
+_broadcaster = None
+_broadcaster_lock = threading.Lock()
+
+
+def get_broadcaster():
+    global _broadcaster
+    with _broadcaster_lock:
+        if _broadcaster is None:
+            if getattr(settings, 'EVENTS_BACKEND', 'local') == 'file':
+                _broadcaster = FileSpoolBroadcaster(
+                    getattr(settings, 'EVENTS_SPOOL_PATH', os.path.join(settings.BASE_DIR, 'var', 'events.jsonl'))
+                )
+            else:
+                _broadcaster = LocalBroadcaster()
+        return _broadcaster
+
+
+def streaming_available(request) -> bool:
+    """Vrai si la requête est servie en ASGI (flux SSE possible)."""
+    from django.core.handlers.asgi import ASGIRequest
+
+    return isinstance(request, ASGIRequest)
+
+
+def publish_event(event_type: str, **data):
+    """Publie un événement après la validation de la transaction en cours."""
+    event = {'type': event_type, 'data': data, 'ts': time.time()}
+    transaction.on_commit(lambda: get_broadcaster().publish(event))
+
+
+def format_sse(event: Optional[Dict]) -> str:
+    if event is None:
+        return ': keepalive\n\n'
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
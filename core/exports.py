@@ -0,0 +1,363 @@
+"""
+Exports en flux (CSV / XLSX) des listes du front-office
+
+Les lignes sont lues par paquets (`iterator(chunk_size=...)`) avec des
+colonnes annotées en SQL, puis écrites au fil de l'eau dans une
+StreamingHttpResponse : mémoire constante quel que soit le nombre de lignes,
+premier octet envoyé dès le premier paquet.
+
+Le XLSX est écrit à la main (zip en flux, chaînes « inline ») : pas de
+dépendance et pas de classeur construit en mémoire.
+
+Les gros exports de l'admin (paiements, présences...) ne sont pas générés
+pendant la requête : « Exporter » crée un ExportJob (paramètres de la liste
+de l'admin et éléments cochés, pas de requête sérialisée), que la commande
+`run_export_jobs` traite en reconstruisant le queryset par le ModelAdmin, en écrivant le fichier par paquets dans
+MEDIA_ROOT/exports/, avec l'avancement enregistré au fil de l'eau. Les
+fichiers sont supprimés après EXPORT_JOB_RETENTION_DAYS jours.
+"""
+import csv
+import os
+import zipfile
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Iterable, Iterator, List, Optional, Sequence
+from xml.sax.saxutils import escape
+
+from django.apps import apps
+from django.conf import settings
+from django.http import HttpRequest, QueryDict, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+PAYMENT_STATUS_LABELS = {'OK': 'À jour', 'PARTIAL': 'Partiel', 'UNPAID': 'Impayé'}
+
+STUDENT_COLUMNS = [
+    ('name', 'Nom'),
+    ('parent_name', 'Parent'),
+    ('parent_contact', 'Téléphone parent'),
+    ('phone', 'Téléphone élève'),
+    ('active_enrollment_count', 'Groupes'),
+    ('monthly_fees', 'Frais mensuels (DH)'),
+    ('month_paid', 'Payé ce mois (DH)'),
+    ('row_status', 'Statut'),
+]
+
+SESSION_COLUMNS = [
+    ('date', 'Date'),
+    ('start_time', 'Début'),
+    ('end_time', 'Fin'),
+    ('group__name', 'Groupe'),
+    ('group__subject', 'Matière'),
+    ('group__teacher__name', 'Professeur'),
+    ('group__room__name', 'Salle'),
+    ('status', 'Statut'),
+    ('duration_minutes', 'Durée (min)'),
+]
+
+
+def _chunk_size() -> int:
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+def export_rows(queryset, columns: Sequence) -> Iterator[tuple]:
+    """Tuples des colonnes demandées, lus par paquets (sans préchargement)."""
+    fields = [field for field, _ in columns]
+    return queryset.prefetch_related(None).values_list(*fields).iterator(chunk_size=_chunk_size())
+
+
+def _labelled_rows(queryset, columns: Sequence, field: str, labels: dict) -> Iterator[list]:
+    """Comme export_rows, avec les codes de `field` remplacés par leur libellé."""
+    index = [f for f, _ in columns].index(field)
+    for row in export_rows(queryset, columns):
+        row = list(row)
+        row[index] = labels.get(row[index], row[index])
+        yield row
+
+
+def student_export_rows(queryset) -> Iterator[list]:
+    return _labelled_rows(queryset, STUDENT_COLUMNS, 'row_status', PAYMENT_STATUS_LABELS)
+
+
+def session_export_rows(queryset) -> Iterator[list]:
+    from .models import Session
+
+    return _labelled_rows(queryset, SESSION_COLUMNS, 'status', dict(Session.STATUS_CHOICES))
+
+
+def _format(value):
+    if value is None:
+        return ''
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    return value
+
+
+# ==================== CSV ====================
+
+class _Echo:
+    """Pseudo-fichier : write() renvoie la ligne au lieu de la stocker."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(header: List[str], rows: Iterable[Sequence]) -> Iterator[str]:
+    writer = csv.writer(_Echo(), delimiter=';')
+    # BOM : Excel détecte l'UTF-8
+    yield '\ufeff' + writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([_format(v) for v in row])
+
+
+# ==================== XLSX ====================
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+
+class _ChunkSink:
+    """Sortie non « seekable » du zip : les octets écrits sont repris par le générateur."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _cell(value) -> str:
+    value = _format(value)
+    if isinstance(value, bool):
+        value = 'Oui' if value else 'Non'
+    if isinstance(value, (int, float, Decimal)):
+        return f'<c><v>{value}</v></c>'
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>'
+
+
+def _xml_row(values) -> bytes:
+    return ('<row>' + ''.join(_cell(v) for v in values) + '</row>').encode('utf-8')
+
+
+def stream_xlsx(sheet_name: str, header: List[str], rows: Iterable[Sequence],
+                rows_per_flush: int = 500) -> Iterator[bytes]:
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        zf.writestr('_rels/.rels', _ROOT_RELS)
+        zf.writestr('xl/workbook.xml', _WORKBOOK.format(name=escape(sheet_name[:31])))
+        zf.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        yield sink.drain()
+
+        with zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xml_row(header))
+            for i, row in enumerate(rows, start=1):
+                sheet.write(_xml_row(row))
+                if i % rows_per_flush == 0:
+                    data = sink.drain()
+                    if data:
+                        yield data
+            sheet.write(b'</sheetData></worksheet>')
+    yield sink.drain()
+
+
+def streaming_export(fmt: str, filename: str, sheet_name: str, columns: Sequence,
+                     rows: Iterable[Sequence]) -> StreamingHttpResponse:
+    """Réponse en flux, `fmt` = 'csv' ou 'xlsx' (sans extension dans `filename`)."""
+    header = [label for _, label in columns]
+    if fmt == 'xlsx':
+        response = StreamingHttpResponse(
+            stream_xlsx(sheet_name, header, rows),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+    else:
+        fmt = 'csv'
+        response = StreamingHttpResponse(stream_csv(header, rows), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+
+# ==================== EXPORTS EN ARRIÈRE-PLAN ====================
+
+EXPORT_JOB_DIR = 'exports'
+
+
+def enqueue_export_job(model, resource_class, file_format: str, export_fields=None,
+                       created_by: str = '', params: Optional[QueryDict] = None, pks=None):
+    """
+    Met en file l'export de la liste de l'admin de `model` avec la ressource
+    donnée.
+
+    Args:
+        params: paramètres GET de la liste (filtres, recherche, tri)
+        pks: éléments cochés ; vide = toute la liste filtrée
+    """
+    from .models import ExportJob
+
+    return ExportJob.objects.create(
+        model_label=model._meta.label,
+        resource_path=f'{resource_class.__module__}.{resource_class.__qualname__}',
+        file_format=file_format,
+        params=dict(params.lists()) if params else {},
+        pks=[str(pk) for pk in pks or []],
+        export_fields=list(export_fields or []),
+        created_by=created_by,
+    )
+
+
+def job_queryset(job):
+    """
+    Queryset du job, reconstruit par le ModelAdmin comme pour la liste
+    d'origine : mêmes paramètres GET, au nom du même utilisateur.
+    """
+    from django.contrib import admin
+    from django.contrib.auth import get_user_model
+
+    model = apps.get_model(job.model_label)
+    model_admin = admin.site._registry[model]
+
+    request = HttpRequest()
+    request.method = 'GET'
+    request.GET = QueryDict(mutable=True)
+    for key, values in job.params.items():
+        request.GET.setlist(key, values)
+    request.user = get_user_model()._default_manager.get_by_natural_key(job.created_by)
+
+    queryset = model_admin.get_export_queryset(request)
+    if job.pks:
+        queryset = queryset.filter(pk__in=job.pks)
+    return queryset
+
+
+def claim_next_job():
+    """Prend le plus ancien job en attente ; None s'il n'y en a pas."""
+    from .models import ExportJob
+
+    pending = ExportJob.objects.filter(status='PENDING').order_by('created_at').values_list('pk', flat=True)
+    for pk in pending[:10]:
+        # Un autre worker a pu le prendre entre-temps
+        if ExportJob.objects.filter(pk=pk, status='PENDING').update(status='RUNNING', started_at=timezone.now()):
+            return ExportJob.objects.get(pk=pk)
+    return None
+
+
+def _job_rows(job, resource, queryset, export_fields) -> Iterator[list]:
+    from .models import ExportJob
+
+    step = _chunk_size()
+    # XLSX : nombres et dates gardent leur type (comme l'export de l'admin)
+    native = job.file_format == 'xlsx'
+    done = 0
+    for obj in resource.iter_queryset(queryset):
+        yield resource.export_resource(obj, selected_fields=export_fields, force_native_type=native)
+        done += 1
+        if done % step == 0:
+            ExportJob.objects.filter(pk=job.pk).update(processed_rows=done)
+    job.processed_rows = done
+
+
+def run_export_job(job) -> None:
+    """Écrit le fichier du job par paquets ; le job finit DONE ou FAILED."""
+    from .models import ExportJob
+
+    path = None
+    try:
+        resource = import_string(job.resource_path)()
+        queryset = resource.filter_export(job_queryset(job))
+        export_fields = job.export_fields or None
+        job.total_rows = queryset.count()
+        ExportJob.objects.filter(pk=job.pk).update(total_rows=job.total_rows)
+
+        header = resource.get_export_headers(selected_fields=export_fields)
+        rows = _job_rows(job, resource, queryset, export_fields)
+        if job.file_format == 'xlsx':
+            chunks = stream_xlsx(job.model_label.split('.')[-1], header, rows)
+        else:
+            chunks = (chunk.encode('utf-8') for chunk in stream_csv(header, rows))
+
+        stamp = timezone.localtime().strftime('%Y%m%d-%H%M%S')
+        name = f"{EXPORT_JOB_DIR}/{job.model_label.split('.')[-1].lower()}-{stamp}-{job.pk}.{job.file_format}"
+        path = os.path.join(settings.MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+
+        job.file.name = name
+        job.status = 'DONE'
+        job.finished_at = timezone.now()
+        job.save(update_fields=['file', 'status', 'processed_rows', 'finished_at'])
+    except Exception as e:
+        if path and os.path.exists(path):
+            os.remove(path)
+        job.status = 'FAILED'
+        job.error = f'{type(e).__name__}: {e}'
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+
+
+def cleanup_export_jobs(days: Optional[int] = None, stale_hours: int = 6) -> int:
+    """
+    Supprime les jobs terminés depuis plus de `days` jours (et leur fichier,
+    voir core.signals) ; marque en échec les jobs « en cours » abandonnés
+    par un worker arrêté. Retourne le nombre de jobs supprimés.
+    """
+    from .models import ExportJob
+
+    if days is None:
+        days = getattr(settings, 'EXPORT_JOB_RETENTION_DAYS', 7)
+    now = timezone.now()
+    ExportJob.objects.filter(status='RUNNING', started_at__lt=now - timedelta(hours=stale_hours)).update(
+        status='FAILED', error='Interrompu (worker arrêté)', finished_at=now
+    )
+    old = ExportJob.objects.filter(status__in=['DONE', 'FAILED'], finished_at__lt=now - timedelta(days=days))
+    count = 0
+    for job in old.only('pk', 'file'):
+        job.delete()
+        count += 1
+    return count
@@ -1,8 +1,8 @@
 import django_filters
 from django import forms
-from django.db.models import Q
 
 from .models import Student, CourseGroup, Teacher, Room, Session
+from .search import filter_students
 
 
 class StudentFilter(django_filters.FilterSet):
@@ -51,34 +51,18 @@ class StudentFilter(django_filters.FilterSet):
         fields = ['q', 'payment_status', 'course_group', 'is_active']
 
     def filter_q(self, queryset, name, value):
-        """Search across name, parent name, and contact info"""
+        """Search across name, parent name, and contact info (full-text index, accent-insensitive)"""
         if not value:
             return queryset
-        return queryset.filter(
-            Q(name__icontains=value) | 
-            Q(parent_contact__icontains=value) | 
-            Q(parent_name__icontains=value) |
-            Q(phone__icontains=value)
-        )
+        return filter_students(queryset, value)
     
     def filter_payment_status(self, queryset, name, value):
-        """Filter by payment status (requires calculating status for each student)"""
+        """Filter by current-month payment status (computed in SQL)"""
         if not value:
             return queryset
-        
-        # We need to filter in Python since payment_status is a method
-        # Get all students and filter by their payment status
-        student_ids = []
-        for student in queryset:
-            status = student.payment_status()
-            if value == 'ok' and status == 'OK':
-                student_ids.append(student.id)
-            elif value == 'partial' and status == 'PARTIAL':
-                student_ids.append(student.id)
-            elif value == 'unpaid' and status == 'UNPAID':
-                student_ids.append(student.id)
-        
-        return queryset.filter(id__in=student_ids)
+        if 'row_status' not in queryset.query.annotations:
+            queryset = queryset.with_row_data()
+        return queryset.filter(row_status=value.upper())
 
 
 class CourseGroupFilter(django_filters.FilterSet):
@@ -7,7 +7,7 @@ class StudentForm(forms.ModelForm):
     
     class Meta:
         model = Student
-        fields = ['name', 'phone', 'parent_name', 'parent_contact', 'date_of_birth', 'address', 'is_active', 'notes']
+        fields = ['name', 'phone', 'parent_name', 'parent_contact', 'message_language', 'date_of_birth', 'address', 'is_active', 'notes']
         widgets = {
             'name': forms.TextInput(attrs={
                 'class': 'form-control',
@@ -28,6 +28,9 @@ class StudentForm(forms.ModelForm):
                 'type': 'tel',
                 'required': True
             }),
+            'message_language': forms.Select(attrs={
+                'class': 'form-select'
+            }),
             'date_of_birth': forms.DateInput(attrs={
                 'class': 'form-control',
                 'type': 'date'
@@ -0,0 +1,112 @@
+"""
+Foyers : élèves qui partagent le numéro du parent
+
+Les frères et sœurs ont le même `parent_contact`. Un foyer regroupe les élèves
+dont le numéro normalisé (`parent_contact_e164`, voir core.phones) est le
+même ; un élève dont le numéro n'a pas pu être normalisé forme un foyer à lui
+seul.
+
+Utilisé pour :
+- les rappels de paiement : un seul message par foyer, qui liste le montant
+  dû de chaque enfant (modèle 'household_payment_reminder') ;
+- la caisse : un paiement du parent réparti entre les enfants, enregistré en
+  une transaction (`record_household_payment`).
+"""
+from decimal import Decimal
+from typing import List, Sequence, Tuple
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+
+def household_key(student) -> str:
+    return student.parent_contact_e164 or f"student-{student.pk}"
+
+
+def household_members(student, queryset=None):
+    """Élèves du foyer de `student` (lui compris), dans `queryset` (défaut : tous)."""
+    from .models import Student
+
+    if queryset is None:
+        queryset = Student.objects.all()
+    if not student.parent_contact_e164:
+        return queryset.filter(pk=student.pk)
+    return queryset.filter(parent_contact_e164=student.parent_contact_e164)
+
+
+def household_heads(queryset):
+    """
+    Un élève par foyer de `queryset` (le plus petit id) : pour paginer les
+    foyers comme des élèves.
+    """
+    earlier_sibling = queryset.filter(
+        parent_contact_e164=OuterRef('parent_contact_e164'), pk__lt=OuterRef('pk')
+    )
+    return queryset.exclude(Q(parent_contact_e164__gt='') & Exists(earlier_sibling))
+
+
+def split_amount(total: Decimal, dues: Sequence[Decimal]) -> List[Decimal]:
+    """
+    Répartit `total` entre les enfants dans l'ordre : chacun reçoit au plus son
+    dû, le surplus éventuel va au premier.
+
+    >>> split_amount(Decimal('300'), [Decimal('200'), Decimal('200')])
+    [Decimal('200'), Decimal('100')]
+    """
+    shares, left = [], total
+    for due in dues:
+        share = min(max(due, Decimal('0')), left)
+        shares.append(share)
+        left -= share
+    if shares and left > 0:
+        shares[0] += left
+    return shares
+
+
+def record_household_payment(allocations: Sequence[Tuple[object, Decimal]], month_covered,
+                             payment_method: str = 'CASH', created_by: str = '',
+                             payment_date=None) -> List:
+    """
+    Enregistre un paiement du foyer : un Payment (et un n° de reçu) par enfant
+    dont la part est positive, tous dans la même transaction.
+
+    Args:
+        allocations: [(élève, montant), ...], élèves d'un même foyer
+
+    Raises:
+        ValidationError: aucun montant positif, montant négatif, ou élèves de
+        foyers différents
+    """
+    from .models import Payment, receipt_numbers
+
+    allocations = [(student, amount) for student, amount in allocations if amount]
+    if any(amount < 0 for _, amount in allocations):
+        raise ValidationError('Montant négatif.')
+    if not allocations:
+        raise ValidationError('Aucun montant à encaisser.')
+    if len({household_key(student) for student, _ in allocations}) > 1:
+        raise ValidationError("Les élèves n'appartiennent pas au même foyer.")
+
+    payment_date = payment_date or timezone.now().date()
+    month_covered = month_covered.replace(day=1)
+    total = sum((amount for _, amount in allocations), Decimal('0'))
+    names = ', '.join(student.name for student, _ in allocations)
+
+    with transaction.atomic():
+        numbers = receipt_numbers(payment_date.year)
+        payments = []
+        for student, amount in allocations:
+            payments.append(Payment.objects.create(
+                student=student,
+                amount=amount,
+                payment_date=payment_date,
+                month_covered=month_covered,
+                status='PAID',
+                payment_method=payment_method,
+                receipt_number=next(numbers),
+                created_by=created_by,
+                notes=f"Paiement famille : {total} DH pour {names}" if len(allocations) > 1 else '',
+            ))
+    return payments
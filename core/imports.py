@@ -0,0 +1,210 @@
+"""
+Import en masse (django-import-export)
+
+Le mode normal des ressources enregistre ligne par ligne : save(), une
+requête par clé étrangère (ForeignKeyWidget), recherche du dernier n° de
+reçu dans Payment.save()... Un fichier de 20 000 lignes prend plusieurs
+minutes.
+
+Le mode rapide (BulkImportMixin) :
+
+1. précharge en mémoire les clés étrangères (nom -> objet) et les lignes
+   existantes (par id) : une requête par table ;
+2. valide tout le fichier dans une première passe, sans rien écrire : à la
+   moindre erreur, rien n'est importé et les lignes fautives sont listées ;
+3. insère par lots (bulk_create / bulk_update, IMPORT_BATCH_SIZE lignes) ;
+4. ne calcule pas le rapport de différences ligne à ligne, sauf demande
+   (`skip_diff=False`) ;
+5. rattrape ce que font les signaux à l'enregistrement : caches, versions
+   des lignes, index plein texte (core.signals.refresh_after_bulk_write).
+
+Utilisé par l'admin (ressource « import rapide ») et par la commande
+`manage.py bulk_import`.
+"""
+from copy import copy
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from import_export.instance_loaders import CachedInstanceLoader
+from import_export.widgets import ForeignKeyWidget
+
+
+def _batch_size() -> int:
+    return getattr(settings, 'IMPORT_BATCH_SIZE', 1000)
+
+
+class CachedForeignKeyWidget(ForeignKeyWidget):
+    """
+    ForeignKeyWidget résolu dans un dictionnaire {valeur: objet} chargé en une
+    requête au premier usage, au lieu d'un .get() par ligne.
+    """
+
+    def __init__(self, model, field='pk', **kwargs):
+        super().__init__(model, field, **kwargs)
+        self.reset()
+
+    def reset(self):
+        self._index: Optional[Dict[str, object]] = None
+        self._ambiguous = set()
+
+    @staticmethod
+    def _key(value) -> str:
+        return ' '.join(str(value).split())
+
+    def _load(self):
+        self._index = {}
+        for obj in self.model.objects.only('pk', self.field).order_by('pk'):
+            key = self._key(getattr(obj, self.field))
+            if key in self._index:
+                self._ambiguous.add(key)
+            self._index[key] = obj
+
+    def get_instance_by_lookup_fields(self, value, row, **kwargs):
+        if self._index is None:
+            self._load()
+        key = self._key(value)
+        verbose_name = self.model._meta.verbose_name
+        if key in self._ambiguous:
+            raise ValueError(f"{verbose_name} « {value} » ambigu : plusieurs enregistrements portent ce nom")
+        try:
+            return self._index[key]
+        except KeyError:
+            raise ValueError(f"{verbose_name} « {value} » introuvable")
+
+
+class BulkInstanceLoader(CachedInstanceLoader):
+    """Lignes existantes chargées en une requête, sans les annotations d'export."""
+
+    def get_queryset(self):
+        return self.resource._meta.model.objects.all()
+
+
+class BulkImportMixin:
+    """
+    Mode rapide d'une ModelResource (voir le docstring du module).
+
+    Args (constructeur):
+        skip_diff: ne pas construire le rapport de différences (défaut)
+        batch_size: lignes par bulk_create (défaut IMPORT_BATCH_SIZE)
+        progress: appelée avec (étape, lignes traitées, total) pendant l'import
+    """
+
+    def __init__(self, skip_diff: bool = True, batch_size: Optional[int] = None,
+                 progress: Optional[Callable] = None, **kwargs):
+        super().__init__(**kwargs)
+        # Options propres à cette instance (le Meta de la classe est partagé)
+        self._meta = copy(self._meta)
+        self._meta.use_bulk = True
+        self._meta.batch_size = batch_size or _batch_size()
+        self._meta.skip_diff = skip_diff
+        self._meta.instance_loader_class = BulkInstanceLoader
+        self.progress = progress
+        self.written: List = []
+
+    def _report(self, step: str, done: int, total: int):
+        if self.progress:
+            self.progress(step, done, total)
+
+    def _cached_widgets(self) -> List[CachedForeignKeyWidget]:
+        return [f.widget for f in self.get_import_fields() if isinstance(f.widget, CachedForeignKeyWidget)]
+
+    # ---------- passe 1 : validation ----------
+
+    def get_bulk_clean_exclude(self) -> set:
+        """Champs non vérifiés par clean_fields() (remplis à l'enregistrement)."""
+        return set()
+
+    def clean_bulk_instance(self, instance):
+        """
+        Validation sans requête : clean_fields() hors clés étrangères (dont
+        validate() interroge la base), leur présence étant vérifiée ici.
+        """
+        exclude = self.get_bulk_clean_exclude()
+        relations = {f.name for f in instance._meta.concrete_fields if f.is_relation}
+        errors = {}
+        for field in instance._meta.concrete_fields:
+            if (field.is_relation and not field.null and field.name not in exclude
+                    and getattr(instance, field.attname) is None):
+                errors[field.name] = [ValidationError('Ce champ est obligatoire.', code='required')]
+        try:
+            instance.clean_fields(exclude=exclude | relations)
+        except ValidationError as e:
+            errors.update(e.error_dict)
+        if errors:
+            raise ValidationError(errors)
+
+    def validate_dataset(self, dataset) -> List[Tuple[int, dict, ValidationError]]:
+        """Première passe, sans écriture : (n° de ligne, ligne, erreur) des lignes invalides."""
+        loader = self._meta.instance_loader_class(self, dataset)
+        errors = []
+        total = len(dataset)
+        for number, values in enumerate(dataset, 1):
+            row = dict(zip(dataset.headers, values))
+            try:
+                instance, _ = self.get_or_init_instance(loader, row)
+                self.import_instance(instance, row)
+                self.clean_bulk_instance(instance)
+            except ValidationError as e:
+                errors.append((number, row, e))
+            except ValueError as e:
+                errors.append((number, row, ValidationError(str(e))))
+            except ArithmeticError:
+                # decimal.InvalidOperation des DecimalWidget
+                errors.append((number, row, ValidationError('Nombre invalide')))
+            if number % self._meta.batch_size == 0:
+                self._report('validation', number, total)
+        self._report('validation', total, total)
+        return errors
+
+    def import_data_inner(self, dataset, dry_run, raise_errors, using_transactions,
+                          collect_failed_rows, **kwargs):
+        for widget in self._cached_widgets():
+            widget.reset()
+        self.written = []
+
+        errors = self.validate_dataset(dataset)
+        if errors:
+            # Fichier refusé en entier : aucune ligne écrite
+            result = self.get_result_class()()
+            result.diff_headers = self.get_diff_headers()
+            result.total_rows = len(dataset)
+            for number, row, error in errors:
+                result.append_invalid_row(number, row, error)
+            return result
+
+        return super().import_data_inner(
+            dataset, dry_run, raise_errors, using_transactions, collect_failed_rows, **kwargs
+        )
+
+    # ---------- passe 2 : écriture par lots ----------
+
+    def get_bulk_update_fields(self):
+        """Seulement les colonnes du modèle (pas les colonnes calculées d'export)."""
+        concrete = {f.name for f in self._meta.model._meta.concrete_fields}
+        return [
+            f.attribute for name, f in self.fields.items()
+            if name not in self._meta.import_id_fields and f.attribute in concrete
+        ]
+
+    def after_save_instance(self, instance, row, **kwargs):
+        super().after_save_instance(instance, row, **kwargs)
+        self.written.append(instance)
+
+    def after_import_row(self, row, row_result, **kwargs):
+        super().after_import_row(row, row_result, **kwargs)
+        number = kwargs.get('row_number') or 0
+        if number and number % self._meta.batch_size == 0 and number < self._total_rows:
+            self._report('import', number, self._total_rows)
+
+    def before_import(self, dataset, **kwargs):
+        super().before_import(dataset, **kwargs)
+        self._total_rows = len(dataset)
+
+    def after_import(self, dataset, result, **kwargs):
+        super().after_import(dataset, result, **kwargs)
+        self._report('import', len(dataset), len(dataset))
+        if not self._is_dry_run(kwargs) and not result.has_errors():
+            from .signals import refresh_after_bulk_write
+
+            refresh_after_bulk_write(self._meta.model, self.written)
@@ -0,0 +1,185 @@
+"""
+Série temporelle des indicateurs (KpiSnapshot)
+
+Une ligne par jour, remplie chaque nuit par `snapshot_kpis` et reconstituée
+pour le passé avec `snapshot_kpis --backfill`. Les deux chemins utilisent le
+même calcul ensembliste sur une plage de dates : quelques requêtes, puis un
+balayage jour par jour en mémoire.
+
+Limite du rattrapage : les inscriptions n'ont pas de date de fin, l'état
+« actif » actuel est donc projeté sur le passé.
+"""
+import math
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from django.db.models import Count, Min, Q, Sum
+
+from .models import Attendance, Enrollment, KpiSnapshot, Payment
+from .utils import PAID_STATUSES
+
+# Agrégation lors du sous-échantillonnage : flux additionnés, niveaux moyennés
+KPI_METRICS = {
+    'active_students': 'avg',
+    'active_enrollments': 'avg',
+    'revenue': 'sum',
+    'unpaid_amount': 'avg',
+    'attendance_rate': 'avg',
+    'attendance_count': 'sum',
+}
+
+
+def compute_kpi_snapshots(start: date, end: date) -> List[KpiSnapshot]:
+    """Indicateurs de chaque jour de [start, end] (objets non enregistrés)."""
+    first_month = start.replace(day=1)
+
+    enrollments = sorted(
+        Enrollment.objects.filter(
+            is_active=True,
+            student__is_active=True,
+            enrolled_date__lte=end,
+        ).values_list('enrolled_date', 'student_id', 'course_group__monthly_price'),
+        key=lambda e: e[0],
+    )
+
+    payments_by_month = defaultdict(list)
+    for month, paid_on, student_id, amount in Payment.objects.filter(
+        status__in=PAID_STATUSES,
+        month_covered__range=[first_month, end],
+        payment_date__lte=end,
+    ).values_list('month_covered', 'payment_date', 'student_id', 'amount'):
+        payments_by_month[month].append((paid_on, student_id, amount))
+    for rows in payments_by_month.values():
+        rows.sort(key=lambda p: p[0])
+
+    revenue = dict(
+        Payment.objects.filter(status='PAID', payment_date__range=[start, end])
+        .values('payment_date')
+        .annotate(total=Sum('amount'))
+        .values_list('payment_date', 'total')
+    )
+
+    attendance = {
+        row['date']: row
+        for row in Attendance.objects.filter(date__range=[start, end])
+        .values('date')
+        .annotate(total=Count('id'), present=Count('id', filter=Q(is_present=True)))
+    }
+
+    required = defaultdict(Decimal)
+    enrollment_count = 0
+    e_index = 0
+
+    current_month = None
+    paid = defaultdict(Decimal)
+    p_index = 0
+
+    snapshots = []
+    day = start
+    while day <= end:
+        while e_index < len(enrollments) and enrollments[e_index][0] <= day:
+            _, student_id, price = enrollments[e_index]
+            required[student_id] += price
+            enrollment_count += 1
+            e_index += 1
+
+        month = day.replace(day=1)
+        if month != current_month:
+            current_month, paid, p_index = month, defaultdict(Decimal), 0
+        month_payments = payments_by_month.get(month, [])
+        while p_index < len(month_payments) and month_payments[p_index][0] <= day:
+            _, student_id, amount = month_payments[p_index]
+            paid[student_id] += amount
+            p_index += 1
+
+        unpaid = sum(
+            (max(req - paid[student_id], Decimal('0')) for student_id, req in required.items()),
+            Decimal('0.00'),
+        )
+
+        att = attendance.get(day)
+        snapshots.append(KpiSnapshot(
+            date=day,
+            active_students=len(required),
+            active_enrollments=enrollment_count,
+            revenue=revenue.get(day) or Decimal('0.00'),
+            unpaid_amount=unpaid,
+            attendance_count=att['total'] if att else 0,
+            attendance_rate=(
+                (Decimal(att['present'] * 100) / att['total']).quantize(Decimal('0.01')) if att else None
+            ),
+        ))
+        day += timedelta(days=1)
+
+    return snapshots
+
+
+def save_kpi_snapshots(start: date, end: date) -> int:
+    """Calcule et enregistre (upsert) les indicateurs de la plage."""
+    snapshots = compute_kpi_snapshots(start, end)
+    KpiSnapshot.objects.bulk_create(
+        snapshots,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['date'],
+        update_fields=[
+            'active_students', 'active_enrollments', 'revenue', 'unpaid_amount',
+            'attendance_count', 'attendance_rate', 'computed_at',
+        ],
+    )
+    return len(snapshots)
+
+
+def earliest_history_date() -> Optional[date]:
+    """Première date présente dans les paiements, inscriptions ou présences."""
+    candidates = [
+        Payment.objects.aggregate(d=Min('payment_date'))['d'],
+        Enrollment.objects.aggregate(d=Min('enrolled_date'))['d'],
+        Attendance.objects.aggregate(d=Min('date'))['d'],
+    ]
+    candidates = [d for d in candidates if d]
+    return min(candidates) if candidates else None
+
+
+def kpi_series(metric: str, start: date, end: date, max_points: int = 120) -> Dict:
+    """
+    Série d'un indicateur sur [start, end], réduite à `max_points` points au plus.
+
+    Les jours sont regroupés en paquets de taille fixe ; chaque point porte la
+    date de début de son paquet.
+    """
+    if metric not in KPI_METRICS:
+        raise ValueError(f"Unknown metric: {metric}")
+
+    days = (end - start).days + 1
+    bucket_days = max(1, math.ceil(days / max(1, max_points)))
+
+    buckets = defaultdict(list)
+    for day, value in (
+        KpiSnapshot.objects.filter(date__range=[start, end])
+        .order_by('date')
+        .values_list('date', metric)
+    ):
+        if value is not None:
+            buckets[(day - start).days // bucket_days].append(value)
+
+    points = []
+    for index in sorted(buckets):
+        values = buckets[index]
+        total = sum(values)
+        value = total if KPI_METRICS[metric] == 'sum' else total / len(values)
+        points.append({
+            'date': (start + timedelta(days=index * bucket_days)).isoformat(),
+            'value': round(float(value), 2),
+        })
+
+    return {
+        'metric': metric,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'bucket_days': bucket_days,
+        'aggregation': KPI_METRICS[metric],
+        'points': points,
+    }
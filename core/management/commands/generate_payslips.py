@@ -0,0 +1,45 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from ...payroll import parse_month
+from ...payslips import build_payslips_pdf, build_payslips_zip, collect_payslip_data, payslip_pool
+
+
+class Command(BaseCommand):
+    help = "Render every teacher's payslip for a month into a single PDF or a ZIP"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', type=str, help='Month YYYY-MM (defaults to previous month)')
+        parser.add_argument('--format', choices=['pdf', 'zip'], default='pdf')
+        parser.add_argument('--output', type=str, help='Output file (defaults to fiches_paie_YYYY_MM.<format>)')
+
+    def handle(self, *args, **options):
+        if options.get('month'):
+            month = parse_month(options['month'])
+            if month is None:
+                raise CommandError('Month must be in YYYY-MM format')
+        else:
+            first_of_month = timezone.now().date().replace(day=1)
+            month = (first_of_month - timezone.timedelta(days=1)).replace(day=1)
+
+        started = time.monotonic()
+        payloads = collect_payslip_data(month)
+        if not payloads:
+            raise CommandError(f'No sessions for {month:%Y-%m}')
+
+        build = build_payslips_zip if options['format'] == 'zip' else build_payslips_pdf
+        pool = payslip_pool()
+        try:
+            content = build(payloads, executor=pool)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        output = Path(options.get('output') or f"fiches_paie_{month:%Y_%m}.{options['format']}")
+        output.write_bytes(content)
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(payloads)} payslips written to {output} ({len(content) // 1024} KB, {time.monotonic() - started:.2f}s)'
+        ))
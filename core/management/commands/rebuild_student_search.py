@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ...search import fts_available, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the student full-text search index (after bulk imports or raw SQL updates)'
+
+    def handle(self, *args, **options):
+        if not fts_available():
+            self.stdout.write(self.style.WARNING('Full-text index unavailable (not SQLite/FTS5); search uses icontains'))
+            return
+        with transaction.atomic():
+            count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'{count} students indexed'))
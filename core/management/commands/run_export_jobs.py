@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from ...exports import claim_next_job, cleanup_export_jobs, run_export_job
+
+
+class Command(BaseCommand):
+    help = 'Process queued admin exports (ExportJob) and delete old export files; runs until stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the pending jobs, then exit')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls when idle')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            removed = cleanup_export_jobs()
+            if removed:
+                self.stdout.write(f'{removed} old export(s) deleted')
+
+            job = claim_next_job()
+            while job is not None:
+                started = time.monotonic()
+                self.stdout.write(f'Export #{job.pk} ({job.model_label}, {job.file_format})...')
+                run_export_job(job)
+                if job.status == 'DONE':
+                    self.stdout.write(self.style.SUCCESS(
+                        f'  {job.processed_rows} rows -> {job.file.name} ({time.monotonic() - started:.1f}s)'
+                    ))
+                else:
+                    self.stdout.write(self.style.ERROR(f'  failed: {job.error}'))
+                job = claim_next_job()
+
+            if options['once']:
+                return
+            time.sleep(options['interval'])
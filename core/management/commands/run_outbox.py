@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from ...outbox import process_outbox, release_stale_messages
+
+
+class Command(BaseCommand):
+    help = 'Send queued outbound messages (OutboundMessage) through the configured gateway; runs until stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Send the messages due now, then exit')
+        parser.add_argument('--interval', type=float, default=10, help='Seconds between polls when idle')
+        parser.add_argument('--batch-size', type=int, help='Messages per gateway call (default OUTBOX_BATCH_SIZE)')
+        parser.add_argument('--limit', type=int, help='Stop after this many messages')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            released = release_stale_messages()
+            if released:
+                self.stdout.write(f'{released} interrupted message(s) queued again')
+
+            started = time.monotonic()
+            stats = process_outbox(
+                batch_size=options['batch_size'],
+                limit=options['limit'],
+                progress=lambda totals: self.stdout.write(
+                    '  {sent} sent, {retried} to retry, {failed} failed'.format(**totals)
+                ) if options['verbosity'] > 1 else None,
+            )
+            if any(stats.values()):
+                self.stdout.write(self.style.SUCCESS(
+                    '{sent} sent, {retried} to retry, {failed} failed'.format(**stats)
+                    + f' ({time.monotonic() - started:.1f}s)'
+                ))
+
+            if options['once'] or options['limit']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,39 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.utils import timezone
+
+from ...payroll import approve_payroll_run, compute_payroll_run, parse_month
+
+
+class Command(BaseCommand):
+    help = 'Compute the monthly payroll snapshot for all teachers (optionally approve it)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', type=str, help='Month YYYY-MM (defaults to previous month)')
+        parser.add_argument('--approve', action='store_true', help='Approve the run once computed (makes it immutable)')
+        parser.add_argument('--user', type=str, default='', help='Name recorded as creator/approver')
+
+    def handle(self, *args, **options):
+        if options.get('month'):
+            month = parse_month(options['month'])
+            if month is None:
+                raise CommandError('Month must be in YYYY-MM format')
+        else:
+            first_of_month = timezone.now().date().replace(day=1)
+            month = (first_of_month - timezone.timedelta(days=1)).replace(day=1)
+
+        reset_queries()
+        try:
+            run = compute_payroll_run(month, created_by=options['user'])
+            if options['approve']:
+                approve_payroll_run(run, approved_by=options['user'])
+        except ValidationError as e:
+            raise CommandError(e.messages[0])
+
+        self.stdout.write(self.style.SUCCESS(f'Payroll {month:%Y-%m} ({run.get_status_display()}):'))
+        for line in run.lines.select_related('teacher'):
+            self.stdout.write(f'  {line.teacher.name}: {line.sessions_count} sessions, {line.hours} h, {line.amount} DH')
+        self.stdout.write(f'  TOTAL: {run.total_hours} h, {run.total_amount} DH')
+        if connection.queries:
+            self.stdout.write(f'  queries: {len(connection.queries)}')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ...reminders import reminder_hours, schedule_session_reminders
+
+
+class Command(BaseCommand):
+    help = 'Queue WhatsApp reminders for every session starting in the next hours (run hourly from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, help='Look-ahead window in hours (default SESSION_REMINDER_HOURS)')
+        parser.add_argument('--dry-run', action='store_true', help='Count the reminders without queuing them')
+
+    def handle(self, *args, **options):
+        hours = options['hours'] if options['hours'] is not None else reminder_hours()
+        if hours <= 0:
+            raise CommandError('--hours must be positive')
+
+        stats = schedule_session_reminders(hours=hours, dry_run=options['dry_run'])
+        summary = (
+            '{sessions} session(s) in the next %dh, {reminders} reminder(s), '
+            '{already_queued} already queued' % hours
+        ).format(**stats)
+        if options['dry_run']:
+            self.stdout.write(f"{summary}, {stats['reminders'] - stats['already_queued']} would be queued")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{summary}, {stats['queued']} queued"))
@@ -0,0 +1,42 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from ...kpis import earliest_history_date, save_kpi_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Store daily KPI snapshots (run nightly); --backfill rebuilds history from existing data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=str, help='Day to snapshot YYYY-MM-DD (defaults to today)')
+        parser.add_argument('--backfill', action='store_true', help='Rebuild every day since the earliest payment/enrollment/attendance')
+        parser.add_argument('--start', type=str, help='First day of the range YYYY-MM-DD')
+        parser.add_argument('--end', type=str, help='Last day of the range YYYY-MM-DD (defaults to --date/today)')
+
+    def _parse(self, value):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'Invalid date: {value} (expected YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        today = timezone.now().date()
+        end = self._parse(options['end'] or options['date']) if (options['end'] or options['date']) else today
+
+        if options['start']:
+            start = self._parse(options['start'])
+        elif options['backfill']:
+            start = earliest_history_date()
+            if start is None:
+                self.stdout.write('No history to backfill')
+                return
+        else:
+            start = end
+
+        if start > end:
+            raise CommandError('Start date is after end date')
+
+        count = save_kpi_snapshots(start, end)
+        self.stdout.write(self.style.SUCCESS(f'{count} KPI snapshot(s) stored ({start} → {end})'))
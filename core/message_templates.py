@@ -0,0 +1,300 @@
+"""
+Textes des messages aux parents (WhatsApp, SMS)
+
+Chaque message (rappel de paiement, absence...) a un code et, par langue,
+un texte stocké en base (MessageTemplate) avec des variables entre
+accolades : « Bonjour {name}, ... ». Les variables autorisées pour chaque
+code sont listées dans PLACEHOLDERS ; un texte qui en utilise d'autres, ou
+qui accède à un attribut (« {name.upper} »), est refusé à l'enregistrement.
+
+Un texte est analysé une seule fois et compilé en fonction de rendu
+(`compile_template`). Les fonctions compilées de tous les modèles actifs
+sont chargées en une requête et gardées en mémoire du processus ; une
+version en cache (incrémentée par les signaux à chaque modification, voir
+core.signals) les fait recharger. Pour un envoi en lot :
+
+    render = message_renderer('payment_reminder')
+    for student in students:
+        text = render(values, student.message_language)
+
+ne fait ni requête ni analyse de texte dans la boucle.
+
+Sans texte en base pour une langue, le texte de MESSAGE_DEFAULT_LANGUAGE
+est utilisé, puis celui de DEFAULT_TEXTS.
+"""
+import threading
+from functools import lru_cache
+from string import Formatter
+from typing import Callable, Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+
+VERSION_KEY = 'message_templates:version'
+
+# Variables utilisables par code de message
+PLACEHOLDERS = {
+    'payment_reminder': {
+        'name': 'Nom du parent',
+        'student_name': "Nom de l'élève",
+        'amount': 'Montant dû (DH)',
+        'month': 'Mois concerné',
+        'reference': 'Référence (élève-mois)',
+        'school_name': "Nom de l'école",
+    },
+    'household_payment_reminder': {
+        'name': 'Nom du parent',
+        'children': 'Une ligne par enfant : nom et montant dû',
+        'student_names': 'Noms des enfants',
+        'amount': 'Total dû (DH)',
+        'month': 'Mois concerné',
+        'reference': 'Référence (foyer-mois)',
+        'school_name': "Nom de l'école",
+    },
+    'payment_reminder_sms': {
+        'name': 'Nom du parent',
+        'student_name': "Nom de l'élève",
+        'amount': 'Montant dû (DH)',
+        'school_name': "Nom de l'école",
+    },
+    'payment_confirmation': {
+        'name': 'Nom du parent',
+        'student_name': "Nom de l'élève",
+        'amount': 'Montant payé (DH)',
+        'date': 'Date du paiement',
+        'receipt_number': 'N° de reçu',
+        'month': 'Mois couvert',
+        'school_name': "Nom de l'école",
+    },
+    'absence': {
+        'name': 'Nom du parent',
+        'student_name': "Nom de l'élève",
+        'course_name': 'Groupe',
+        'date': 'Date',
+        'time': 'Horaire',
+        'school_name': "Nom de l'école",
+    },
+    'session_reminder': {
+        'name': 'Nom du parent',
+        'student_name': "Nom de l'élève",
+        'course_name': 'Groupe',
+        'date': 'Date',
+        'time': 'Heure de début',
+        'room': 'Salle',
+        'teacher': 'Professeur',
+        'school_name': "Nom de l'école",
+    },
+    'announcement': {
+        'name': 'Nom du parent',
+        'student_name': "Nom de l'élève",
+        'school_name': "Nom de l'école",
+    },
+}
+
+TEMPLATE_CODE_CHOICES = [
+    ('payment_reminder', 'Rappel de paiement (WhatsApp)'),
+    ('household_payment_reminder', 'Rappel de paiement groupé (fratrie)'),
+    ('payment_reminder_sms', 'Rappel de paiement (SMS)'),
+    ('payment_confirmation', 'Confirmation de paiement'),
+    ('absence', "Notification d'absence"),
+    ('session_reminder', 'Rappel de séance'),
+]
+
+# Textes utilisés sans modèle en base (même contenu que la migration initiale)
+DEFAULT_TEXTS = {
+    'payment_reminder': (
+        "Bonjour {name},\n\n"
+        "Nous vous rappelons qu'un montant de {amount} DH reste à régler pour {student_name} ({month}).\n"
+        "Référence : {reference}\n\n"
+        "Merci de régulariser auprès de l'accueil.\n\n"
+        "Cordialement,\n{school_name}"
+    ),
+    'household_payment_reminder': (
+        "Bonjour {name},\n\n"
+        "Nous vous rappelons les montants restant à régler pour {month} :\n"
+        "{children}\n\n"
+        "Total : {amount} DH\n"
+        "Référence : {reference}\n\n"
+        "Merci de régulariser auprès de l'accueil.\n\n"
+        "Cordialement,\n{school_name}"
+    ),
+    'payment_reminder_sms': (
+        "Bonjour,\n"
+        "Rappel : Un montant de {amount} DH reste à régler pour {student_name}.\n"
+        "{school_name}"
+    ),
+    'payment_confirmation': (
+        "Bonjour {name},\n\n"
+        "Nous confirmons la réception de votre paiement:\n\n"
+        "Montant: {amount} DH\n"
+        "Date: {date}\n"
+        "Reçu N°: {receipt_number}\n"
+        "Pour le mois de: {month}\n\n"
+        "Merci pour votre confiance!\n\n"
+        "Cordialement,\nL'équipe administrative"
+    ),
+    'absence': (
+        "Bonjour {name},\n\n"
+        "Nous vous informons que {student_name} était absent(e) au cours de {course_name} le {date}.\n\n"
+        "Si vous avez des questions, n'hésitez pas à nous contacter.\n\n"
+        "Cordialement,\nL'équipe pédagogique"
+    ),
+    'session_reminder': (
+        "Bonjour {name},\n\n"
+        "Rappel : {student_name} a cours de {course_name} le {date} à {time}, salle {room}.\n\n"
+        "Cordialement,\n{school_name}"
+    ),
+}
+
+
+def default_language() -> str:
+    return getattr(settings, 'MESSAGE_DEFAULT_LANGUAGE', 'fr')
+
+
+# ==================== COMPILATION ====================
+
+def parse_template(text: str, allowed: Optional[FrozenSet[str]] = None) -> List[Tuple[str, Optional[str]]]:
+    """
+    Découpe `text` en (texte littéral, variable ou None). « {{ » et « }} »
+    donnent des accolades littérales.
+
+    Raises:
+        ValidationError: accolade non fermée, variable vide, attribut ou
+        indice (« {a.b} », « {a[0]} »), format (« {a:>10} »), ou variable
+        absente de `allowed`
+    """
+    try:
+        parsed = list(Formatter().parse(text))
+    except ValueError as e:
+        raise ValidationError(f"Texte invalide : {e}. Doublez les accolades littérales ({{{{ et }}}}).")
+
+    parts, unknown = [], []
+    for literal, field, spec, conversion in parsed:
+        if field is None:
+            parts.append((literal, None))
+            continue
+        if not field.isidentifier():
+            raise ValidationError(f"Variable invalide : {{{field}}}")
+        if spec or conversion:
+            raise ValidationError(f"Format non pris en charge dans {{{field}}}")
+        if allowed is not None and field not in allowed:
+            unknown.append(field)
+        parts.append((literal, field))
+    if unknown:
+        raise ValidationError(
+            "Variable(s) inconnue(s) : %(unknown)s. Disponibles : %(allowed)s",
+            params={
+                'unknown': ', '.join(f'{{{f}}}' for f in unknown),
+                'allowed': ', '.join(f'{{{f}}}' for f in sorted(allowed)),
+            },
+        )
+    return parts
+
+
+@lru_cache(maxsize=512)
+def compile_template(text: str, allowed: Optional[FrozenSet[str]] = None) -> Callable[[Mapping], str]:
+    """
+    Fonction de rendu de `text` : render(values) -> str. Une variable absente
+    de `values` reste telle quelle (« {name} »).
+
+    Résultat mis en cache par texte : un même texte n'est analysé qu'une fois.
+    """
+    parts = tuple(parse_template(text, allowed))
+    if all(field is None for _, field in parts):
+        constant = ''.join(literal for literal, _ in parts)
+        return lambda values: constant
+
+    def render(values: Mapping) -> str:
+        out = []
+        for literal, field in parts:
+            out.append(literal)
+            if field is not None:
+                value = values.get(field)
+                out.append('{' + field + '}' if value is None else str(value))
+        return ''.join(out)
+
+    return render
+
+
+def allowed_placeholders(code: str) -> FrozenSet[str]:
+    return frozenset(PLACEHOLDERS.get(code, ()))
+
+
+def validate_template(code: str, text: str):
+    """ValidationError si `text` n'est pas un texte valide pour `code`."""
+    if code not in PLACEHOLDERS:
+        raise ValidationError(f"Code de message inconnu : {code}")
+    parse_template(text, allowed_placeholders(code))
+
+
+# ==================== MODÈLES EN MÉMOIRE ====================
+
+_compiled: Optional[Tuple[int, Dict[Tuple[str, str], Callable]]] = None
+_compiled_lock = threading.Lock()
+
+
+def bump_templates_version():
+    if not cache.add(VERSION_KEY, 1, timeout=None):
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, 1, timeout=None)
+
+
+def _load_compiled() -> Dict[Tuple[str, str], Callable]:
+    from .models import MessageTemplate
+
+    compiled = {}
+    for code, language, body in MessageTemplate.objects.filter(is_active=True).values_list('code', 'language', 'body'):
+        try:
+            compiled[(code, language)] = compile_template(body, allowed_placeholders(code))
+        except ValidationError:
+            # Texte modifié hors du formulaire : le texte par défaut prend le relais
+            continue
+    return compiled
+
+
+def get_compiled_templates() -> Dict[Tuple[str, str], Callable]:
+    """{(code, langue): render} des modèles actifs, rechargés quand leur version change."""
+    global _compiled
+    version = cache.get(VERSION_KEY, 0)
+    current = _compiled
+    if current is None or current[0] != version:
+        with _compiled_lock:
+            current = _compiled
+            if current is None or current[0] != version:
+                current = (version, _load_compiled())
+                _compiled = current
+    return current[1]
+
+
+def message_renderer(code: str) -> Callable[..., str]:
+    """
+    render(values, language=None) pour le code `code`, lié aux modèles
+    chargés à l'appel : à appeler une fois par lot.
+
+    Raises:
+        KeyError: code sans texte enregistré ni par défaut (« announcement » :
+        texte saisi à chaque envoi, voir compile_template)
+    """
+    if code not in DEFAULT_TEXTS:
+        raise KeyError(code)
+    templates = get_compiled_templates()
+    fallback_language = default_language()
+    fallback = templates.get((code, fallback_language)) or compile_template(
+        DEFAULT_TEXTS[code], allowed_placeholders(code)
+    )
+    school_name = getattr(settings, 'SCHOOL_NAME', '')
+
+    def render(values: Mapping, language: Optional[str] = None) -> str:
+        if 'school_name' not in values:
+            values = dict(values, school_name=school_name)
+        return templates.get((code, language or fallback_language), fallback)(values)
+
+    return render
+
+
+def render_message(code: str, values: Mapping, language: Optional[str] = None) -> str:
+    """Rendu d'un seul message (pour un lot, utiliser message_renderer)."""
+    return message_renderer(code)(values, language)
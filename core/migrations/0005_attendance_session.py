@@ -0,0 +1,74 @@
+# Generated by Django 6.0 on 2026-10-19 08:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def backfill_attendance_session(apps, schema_editor):
+    """Rattache chaque présence existante à la séance du même groupe et du même jour.
+
+    Traitement par lots (pk croissant) : une requête pour les présences, une pour
+    les séances candidates et un bulk_update par lot. En cas de plusieurs séances
+    le même jour, la séance DONE la plus tôt est retenue.
+    """
+    Attendance = apps.get_model('core', 'Attendance')
+    Session = apps.get_model('core', 'Session')
+
+    last_pk = 0
+    while True:
+        batch = list(
+            Attendance.objects.filter(session__isnull=True, pk__gt=last_pk)
+            .order_by('pk')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+
+        candidates = Session.objects.filter(
+            group_id__in={a.course_group_id for a in batch},
+            date__in={a.date for a in batch},
+        ).values_list('group_id', 'date', 'status', 'start_time', 'pk')
+
+        mapping = {}
+        for group_id, day, status, start_time, pk in sorted(
+            candidates, key=lambda c: (c[2] != 'DONE', c[3], c[4])
+        ):
+            mapping.setdefault((group_id, day), pk)
+
+        linked = []
+        for attendance in batch:
+            session_id = mapping.get((attendance.course_group_id, attendance.date))
+            if session_id:
+                attendance.session_id = session_id
+                linked.append(attendance)
+        Attendance.objects.bulk_update(linked, ['session'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_attendance_sync_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendance',
+            name='session',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='attendances', to='core.session', verbose_name='Séance'),
+        ),
+        migrations.RunPython(backfill_attendance_session, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='attendance',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='attendance',
+            constraint=models.UniqueConstraint(fields=('student', 'session'), name='unique_attendance_per_session'),
+        ),
+        migrations.AddConstraint(
+            model_name='attendance',
+            constraint=models.UniqueConstraint(condition=models.Q(('session__isnull', True)), fields=('student', 'course_group', 'date'), name='unique_attendance_per_day_without_session'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 6.0 on 2026-10-19 08:29
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_attendance_session'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayrollRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='Premier jour du mois payé', unique=True, verbose_name='Mois')),
+                ('status', models.CharField(choices=[('DRAFT', 'Brouillon'), ('APPROVED', 'Validée')], default='DRAFT', max_length=10, verbose_name='Statut')),
+                ('total_minutes', models.PositiveIntegerField(default=0, verbose_name='Total minutes')),
+                ('total_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='Total (DH)')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.CharField(blank=True, max_length=100, verbose_name='Créé par')),
+                ('computed_at', models.DateTimeField(blank=True, null=True, verbose_name='Calculée le')),
+                ('approved_at', models.DateTimeField(blank=True, null=True, verbose_name='Validée le')),
+                ('approved_by', models.CharField(blank=True, max_length=100, verbose_name='Validée par')),
+            ],
+            options={
+                'verbose_name': 'Paie mensuelle',
+                'verbose_name_plural': 'Paies mensuelles',
+                'ordering': ['-month'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PayrollLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sessions_count', models.PositiveIntegerField(default=0, verbose_name='Séances')),
+                ('minutes', models.PositiveIntegerField(default=0, verbose_name='Minutes')),
+                ('hourly_rate', models.DecimalField(decimal_places=2, max_digits=8, verbose_name='Tarif horaire (DH)')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Montant (DH)')),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='payroll_lines', to='core.teacher', verbose_name='Professeur')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='core.payrollrun', verbose_name='Paie')),
+            ],
+            options={
+                'verbose_name': 'Ligne de paie',
+                'verbose_name_plural': 'Lignes de paie',
+                'ordering': ['teacher__name'],
+                'unique_together': {('run', 'teacher')},
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 6.0 on 2026-10-19 08:32
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def _minutes(start_time, end_time):
+    return max(0, (end_time.hour * 60 + end_time.minute) - (start_time.hour * 60 + start_time.minute))
+
+
+def backfill_duration_minutes(apps, schema_editor):
+    """Calcule duration_minutes pour les groupes et séances existants, par lots."""
+    for model_name in ('CourseGroup', 'Session'):
+        Model = apps.get_model('core', model_name)
+        last_pk = 0
+        while True:
+            batch = list(
+                Model.objects.filter(pk__gt=last_pk)
+                .only('pk', 'start_time', 'end_time')
+                .order_by('pk')[:BATCH_SIZE]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            for obj in batch:
+                obj.duration_minutes = _minutes(obj.start_time, obj.end_time)
+            Model.objects.bulk_update(batch, ['duration_minutes'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_payrollrun_payrollline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coursegroup',
+            name='duration_minutes',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Durée (minutes)'),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='duration_minutes',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Durée (minutes)'),
+        ),
+        migrations.RunPython(backfill_duration_minutes, migrations.RunPython.noop),
+    ]
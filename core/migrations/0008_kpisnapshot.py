@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-19 08:38
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_duration_minutes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KpiSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='Date')),
+                ('active_students', models.PositiveIntegerField(default=0, verbose_name='Élèves actifs')),
+                ('active_enrollments', models.PositiveIntegerField(default=0, verbose_name='Inscriptions actives')),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='Recette du jour (DH)')),
+                ('unpaid_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Reste dû pour le mois en cours à cette date', max_digits=12, verbose_name='Impayés du mois (DH)')),
+                ('attendance_count', models.PositiveIntegerField(default=0, verbose_name='Présences saisies')),
+                ('attendance_rate', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True, verbose_name='Taux de présence (%)')),
+                ('computed_at', models.DateTimeField(auto_now=True, verbose_name='Calculé le')),
+            ],
+            options={
+                'verbose_name': 'Indicateurs du jour',
+                'verbose_name_plural': 'Indicateurs journaliers',
+                'ordering': ['-date'],
+            },
+        ),
+    ]
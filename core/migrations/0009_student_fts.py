@@ -0,0 +1,92 @@
+# Generated by Django 6.0 on 2026-10-19 08:40
+
+import re
+import unicodedata
+
+from django.db import migrations
+
+FTS_TABLE = 'core_student_fts'
+BATCH_SIZE = 2000
+
+
+# Copie figée de la normalisation de core.search au moment de la migration :
+# la migration ne doit pas dépendre du code courant de l'application.
+
+def fold(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    text = re.sub(r'[^a-z0-9؀-ۿ]+', ' ', text)
+    text = re.sub(r'([a-z])\1+', r'\1', text)
+    return text.strip()
+
+
+def name_terms(text):
+    words = fold(text).split()
+    joined = [a + b for a, b in zip(words, words[1:])]
+    if len(words) > 2:
+        joined.append(''.join(words))
+    return words + joined
+
+
+def phone_terms(*phones):
+    terms = []
+    for phone in phones:
+        digits = re.sub(r'\D', '', phone or '')
+        if not digits:
+            continue
+        terms.append(digits)
+        local = re.sub(r'^(00)?212', '', digits).lstrip('0')
+        if local and local != digits:
+            terms.extend([local, '0' + local])
+    return list(dict.fromkeys(terms))
+
+
+def create_student_fts(apps, schema_editor):
+    """Table virtuelle FTS5 de recherche des élèves (SQLite uniquement), puis indexation initiale."""
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "name, parent_name, phones, "
+                "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')"
+            )
+        except Exception:
+            # SQLite compilé sans FTS5 : la recherche retombe sur icontains
+            return
+
+        Student = apps.get_model('core', 'Student')
+        rows = Student.objects.order_by('pk').values_list('pk', 'name', 'parent_name', 'parent_contact', 'phone')
+        batch = []
+        for pk, name, parent_name, parent_contact, phone in rows.iterator(chunk_size=BATCH_SIZE):
+            batch.append((
+                pk,
+                ' '.join(name_terms(name)),
+                ' '.join(name_terms(parent_name)),
+                ' '.join(phone_terms(parent_contact, phone)),
+            ))
+            if len(batch) >= BATCH_SIZE:
+                cursor.executemany(f"INSERT INTO {FTS_TABLE} (rowid, name, parent_name, phones) VALUES (%s, %s, %s, %s)", batch)
+                batch = []
+        if batch:
+            cursor.executemany(f"INSERT INTO {FTS_TABLE} (rowid, name, parent_name, phones) VALUES (%s, %s, %s, %s)", batch)
+
+
+def drop_student_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_kpisnapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_student_fts, drop_student_fts),
+    ]
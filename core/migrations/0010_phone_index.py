@@ -0,0 +1,100 @@
+# Generated by Django 6.0 on 2026-10-19 08:42
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+PHONE_FIELDS = {
+    'Student': ('phone', 'parent_contact'),
+    'Teacher': ('phone',),
+}
+
+
+# Copie figée de core.phones.normalize_phone au moment de la migration :
+# la migration ne doit pas dépendre du code courant de l'application.
+
+def normalize_phone(raw):
+    raw = (raw or '').strip()
+    digits = re.sub(r'\D', '', raw)
+    if len(digits) < 6:
+        return ''
+
+    country = getattr(settings, 'PHONE_DEFAULT_COUNTRY_CODE', '212')
+    if raw.startswith('+'):
+        e164 = '+' + digits
+    elif digits.startswith('00'):
+        e164 = '+' + digits[2:]
+    elif digits.startswith('0'):
+        e164 = '+' + country + digits[1:]
+    elif digits.startswith(country) and len(digits) > 9:
+        e164 = '+' + digits
+    else:
+        e164 = '+' + country + digits
+    # E.164 : 15 chiffres au plus
+    return e164 if len(e164) <= 16 else ''
+
+
+def backfill_phone_columns(apps, schema_editor):
+    """Normalise les téléphones existants des élèves et professeurs, par lots."""
+    for model_name, fields in PHONE_FIELDS.items():
+        Model = apps.get_model('core', model_name)
+        last_pk = 0
+        while True:
+            batch = list(
+                Model.objects.filter(pk__gt=last_pk)
+                .only('pk', *fields)
+                .order_by('pk')[:BATCH_SIZE]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            for obj in batch:
+                for field in fields:
+                    e164 = normalize_phone(getattr(obj, field))
+                    setattr(obj, f'{field}_e164', e164)
+                    setattr(obj, f'{field}_rev', e164.lstrip('+')[::-1])
+            Model.objects.bulk_update(batch, [f'{field}_{suffix}' for field in fields for suffix in ('e164', 'rev')])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_student_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='parent_contact_e164',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=16),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='parent_contact_rev',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=16),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='phone_e164',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=16),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='phone_rev',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=16),
+        ),
+        migrations.AddField(
+            model_name='teacher',
+            name='phone_e164',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=16),
+        ),
+        migrations.AddField(
+            model_name='teacher',
+            name='phone_rev',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=16),
+        ),
+        migrations.RunPython(backfill_phone_columns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-19 08:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
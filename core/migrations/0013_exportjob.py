@@ -0,0 +1,39 @@
+# Generated by Django 6.0 on 2026-10-19 08:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_fragment_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_label', models.CharField(max_length=100, verbose_name='Données')),
+                ('resource_path', models.CharField(max_length=200, verbose_name='Ressource')),
+                ('file_format', models.CharField(choices=[('csv', 'CSV'), ('xlsx', 'Excel (XLSX)')], max_length=4, verbose_name='Format')),
+                ('params', models.JSONField(blank=True, default=dict, editable=False)),
+                ('pks', models.JSONField(blank=True, default=list, editable=False)),
+                ('export_fields', models.JSONField(blank=True, default=list, verbose_name='Colonnes')),
+                ('status', models.CharField(choices=[('PENDING', 'En attente'), ('RUNNING', 'En cours'), ('DONE', 'Terminé'), ('FAILED', 'Échec')], db_index=True, default='PENDING', max_length=10, verbose_name='Statut')),
+                ('total_rows', models.PositiveIntegerField(default=0, verbose_name='Lignes')),
+                ('processed_rows', models.PositiveIntegerField(default=0, verbose_name='Lignes écrites')),
+                ('file', models.FileField(blank=True, upload_to='exports/', verbose_name='Fichier')),
+                ('error', models.TextField(blank=True, verbose_name='Erreur')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.CharField(blank=True, max_length=100, verbose_name='Demandé par')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Commencé le')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Terminé le')),
+            ],
+            options={
+                'verbose_name': 'Export en arrière-plan',
+                'verbose_name_plural': 'Exports en arrière-plan',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-19 09:02
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_exportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboundMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(choices=[('WHATSAPP', 'WhatsApp'), ('SMS', 'SMS')], default='WHATSAPP', max_length=10, verbose_name='Canal')),
+                ('kind', models.CharField(choices=[('PAYMENT_REMINDER', 'Rappel de paiement'), ('ABSENCE', "Notification d'absence"), ('SESSION_REMINDER', 'Rappel de séance'), ('ANNOUNCEMENT', 'Annonce'), ('OTHER', 'Autre')], default='OTHER', max_length=20, verbose_name='Type')),
+                ('to', models.CharField(max_length=16, verbose_name='Destinataire')),
+                ('body', models.TextField(verbose_name='Message')),
+                ('dedupe_key', models.CharField(blank=True, editable=False, max_length=100, null=True, unique=True)),
+                ('status', models.CharField(choices=[('QUEUED', 'En attente'), ('SENDING', "En cours d'envoi"), ('SENT', 'Envoyé'), ('FAILED', 'Échec'), ('CANCELLED', 'Annulé')], default='QUEUED', max_length=10, verbose_name='Statut')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Tentatives')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Prochain essai')),
+                ('last_error', models.TextField(blank=True, verbose_name='Dernière erreur')),
+                ('provider_id', models.CharField(blank=True, max_length=100, verbose_name='Référence passerelle')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Créé le')),
+                ('claimed_at', models.DateTimeField(blank=True, editable=False, null=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Envoyé le')),
+                ('student', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='outbound_messages', to='core.student', verbose_name='Élève')),
+            ],
+            options={
+                'verbose_name': 'Message sortant',
+                'verbose_name_plural': 'Messages sortants',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx')],
+            },
+        ),
+    ]
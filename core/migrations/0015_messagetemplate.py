@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_outboundmessage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='message_language',
+            field=models.CharField(choices=[('fr', 'Français'), ('ar', 'العربية'), ('en', 'English')], default='fr', max_length=5, verbose_name='Langue des messages'),
+        ),
+        migrations.CreateModel(
+            name='MessageTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(choices=[('payment_reminder', 'Rappel de paiement (WhatsApp)'), ('payment_reminder_sms', 'Rappel de paiement (SMS)'), ('payment_confirmation', 'Confirmation de paiement'), ('absence', "Notification d'absence"), ('session_reminder', 'Rappel de séance')], max_length=30, verbose_name='Message')),
+                ('language', models.CharField(choices=[('fr', 'Français'), ('ar', 'العربية'), ('en', 'English')], default='fr', max_length=5, verbose_name='Langue')),
+                ('body', models.TextField(verbose_name='Texte')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Actif')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Modifié le')),
+            ],
+            options={
+                'verbose_name': 'Modèle de message',
+                'verbose_name_plural': 'Modèles de messages',
+                'ordering': ['code', 'language'],
+                'constraints': [models.UniqueConstraint(fields=('code', 'language'), name='unique_message_template_language')],
+            },
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 6.0 on 2026-10-19 09:13
+
+from django.db import migrations
+
+# Textes de départ, modifiables ensuite dans l'admin (« Modèles de messages »)
+TEMPLATES = {
+    ('payment_reminder', 'fr'): (
+        "Bonjour {name},\n\n"
+        "Nous vous rappelons qu'un montant de {amount} DH reste à régler pour {student_name} ({month}).\n"
+        "Référence : {reference}\n\n"
+        "Merci de régulariser auprès de l'accueil.\n\n"
+        "Cordialement,\n{school_name}"
+    ),
+    ('payment_reminder', 'ar'): (
+        "السلام عليكم {name}،\n\n"
+        "نذكركم بأن مبلغ {amount} درهم لا يزال مستحقا عن {student_name} ({month}).\n"
+        "المرجع: {reference}\n\n"
+        "شكرا لتسوية الوضعية لدى الاستقبال.\n\n"
+        "مع التحية،\n{school_name}"
+    ),
+    ('payment_reminder_sms', 'fr'): (
+        "Bonjour,\n"
+        "Rappel : Un montant de {amount} DH reste à régler pour {student_name}.\n"
+        "{school_name}"
+    ),
+    ('payment_confirmation', 'fr'): (
+        "Bonjour {name},\n\n"
+        "Nous confirmons la réception de votre paiement:\n\n"
+        "Montant: {amount} DH\n"
+        "Date: {date}\n"
+        "Reçu N°: {receipt_number}\n"
+        "Pour le mois de: {month}\n\n"
+        "Merci pour votre confiance!\n\n"
+        "Cordialement,\nL'équipe administrative"
+    ),
+    ('absence', 'fr'): (
+        "Bonjour {name},\n\n"
+        "Nous vous informons que {student_name} était absent(e) au cours de {course_name} le {date}.\n\n"
+        "Si vous avez des questions, n'hésitez pas à nous contacter.\n\n"
+        "Cordialement,\nL'équipe pédagogique"
+    ),
+    ('absence', 'ar'): (
+        "السلام عليكم {name}،\n\n"
+        "نخبركم بأن {student_name} تغيب(ت) عن حصة {course_name} يوم {date}.\n\n"
+        "لأي استفسار، لا تترددوا في الاتصال بنا.\n\n"
+        "مع التحية،\nالفريق التربوي"
+    ),
+    ('session_reminder', 'fr'): (
+        "Bonjour {name},\n\n"
+        "Rappel : {student_name} a cours de {course_name} le {date} à {time}, salle {room}.\n\n"
+        "Cordialement,\n{school_name}"
+    ),
+    ('session_reminder', 'ar'): (
+        "السلام عليكم {name}،\n\n"
+        "تذكير: لدى {student_name} حصة {course_name} يوم {date} على الساعة {time}، القاعة {room}.\n\n"
+        "مع التحية،\n{school_name}"
+    ),
+}
+
+
+def create_templates(apps, schema_editor):
+    MessageTemplate = apps.get_model('core', 'MessageTemplate')
+    for (code, language), body in TEMPLATES.items():
+        MessageTemplate.objects.get_or_create(code=code, language=language, defaults={'body': body})
+
+
+def delete_templates(apps, schema_editor):
+    MessageTemplate = apps.get_model('core', 'MessageTemplate')
+    for code, language in TEMPLATES:
+        MessageTemplate.objects.filter(code=code, language=language).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_messagetemplate'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_templates, delete_templates),
+    ]
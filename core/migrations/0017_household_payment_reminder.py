@@ -0,0 +1,53 @@
+# Generated by Django 6.0 on 2026-10-19 09:18
+
+from django.db import migrations, models
+
+# Rappel groupé des frères et sœurs (même numéro de parent, voir core.households)
+TEMPLATES = {
+    ('household_payment_reminder', 'fr'): (
+        "Bonjour {name},\n\n"
+        "Nous vous rappelons les montants restant à régler pour {month} :\n"
+        "{children}\n\n"
+        "Total : {amount} DH\n"
+        "Référence : {reference}\n\n"
+        "Merci de régulariser auprès de l'accueil.\n\n"
+        "Cordialement,\n{school_name}"
+    ),
+    ('household_payment_reminder', 'ar'): (
+        "السلام عليكم {name}،\n\n"
+        "نذكركم بالمبالغ التي لا تزال مستحقة عن {month}:\n"
+        "{children}\n\n"
+        "المجموع: {amount} درهم\n"
+        "المرجع: {reference}\n\n"
+        "شكرا لتسوية الوضعية لدى الاستقبال.\n\n"
+        "مع التحية،\n{school_name}"
+    ),
+}
+
+
+def create_templates(apps, schema_editor):
+    MessageTemplate = apps.get_model('core', 'MessageTemplate')
+    for (code, language), body in TEMPLATES.items():
+        MessageTemplate.objects.get_or_create(code=code, language=language, defaults={'body': body})
+
+
+def delete_templates(apps, schema_editor):
+    MessageTemplate = apps.get_model('core', 'MessageTemplate')
+    for code, language in TEMPLATES:
+        MessageTemplate.objects.filter(code=code, language=language).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_default_message_templates'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='messagetemplate',
+            name='code',
+            field=models.CharField(choices=[('payment_reminder', 'Rappel de paiement (WhatsApp)'), ('household_payment_reminder', 'Rappel de paiement groupé (fratrie)'), ('payment_reminder_sms', 'Rappel de paiement (SMS)'), ('payment_confirmation', 'Confirmation de paiement'), ('absence', "Notification d'absence"), ('session_reminder', 'Rappel de séance')], max_length=30, verbose_name='Message'),
+        ),
+        migrations.RunPython(create_templates, delete_templates),
+    ]
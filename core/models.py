@@ -5,6 +5,153 @@ from django.utils import timezone
 from django.db.models import Sum
 from django.core.exceptions import ValidationError
 
+from .message_templates import TEMPLATE_CODE_CHOICES, validate_template
+from .phones import derived_phone_fields, sync_phone_columns
+
+# Langues des messages aux parents (core.message_templates)
+LANGUAGE_CHOICES = [
+    ('fr', 'Français'),
+    ('ar', 'العربية'),
+    ('en', 'English'),
+]
+
+
+def minutes_between(start_time, end_time) -> int:
+    """Durée en minutes entre deux heures d'une même journée"""
+    if start_time is None or end_time is None:
+        return 0
+    return max(0, (end_time.hour * 60 + end_time.minute) - (start_time.hour * 60 + start_time.minute))
+
+
+class DurationQuerySet(models.QuerySet):
+    """Maintient `duration_minutes` aussi pour bulk_create / bulk_update,
+    qui ne passent pas par save()."""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.duration_minutes = minutes_between(obj.start_time, obj.end_time)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        fields = list(fields)
+        if {'start_time', 'end_time'} & set(fields):
+            for obj in objs:
+                obj.duration_minutes = minutes_between(obj.start_time, obj.end_time)
+            if 'duration_minutes' not in fields:
+                fields.append('duration_minutes')
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+
+class PhoneQuerySet(models.QuerySet):
+    """Maintient les colonnes téléphone dérivées (`_e164`, `_rev`) aussi pour
+    bulk_create / bulk_update."""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            sync_phone_columns(obj, self.model.PHONE_FIELDS)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        fields = list(fields)
+        changed = [f for f in self.model.PHONE_FIELDS if f in fields]
+        if changed:
+            for obj in objs:
+                sync_phone_columns(obj, changed)
+            fields += [f for f in derived_phone_fields(changed) if f not in fields]
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+
+class StudentQuerySet(PhoneQuerySet):
+
+    def with_row_data(self, month=None):
+        """
+        Annote les données d'une ligne de liste, en SQL (sous-requêtes corrélées,
+        sans multiplier les lignes) :
+
+        - `monthly_fees` : total des groupes actifs
+        - `month_paid` : payé (PAID) pour le mois
+        - `active_enrollment_count`
+        - `row_status` : 'OK' | 'PARTIAL' | 'UNPAID', même règle que payment_status()
+
+        et précharge les inscriptions actives avec leur groupe dans `active_enrollments`.
+        """
+        from django.db.models import (
+            Case, Count, DecimalField, IntegerField, OuterRef, Prefetch, Q, Subquery, Value, When,
+        )
+        from django.db.models.functions import Coalesce
+
+        if month is None:
+            month = timezone.now().date().replace(day=1)
+        money = DecimalField(max_digits=10, decimal_places=2)
+        zero = Value(Decimal('0.00'), output_field=money)
+
+        active = Enrollment.objects.filter(student=OuterRef('pk'), is_active=True).order_by().values('student')
+        fees = active.annotate(total=Sum('course_group__monthly_price')).values('total')
+        count = active.annotate(n=Count('pk')).values('n')
+        paid = (
+            Payment.objects.filter(student=OuterRef('pk'), month_covered=month, status='PAID')
+            .order_by().values('student')
+            .annotate(total=Sum('amount')).values('total')
+        )
+
+        return self.annotate(
+            monthly_fees=Coalesce(Subquery(fees, output_field=money), zero),
+            month_paid=Coalesce(Subquery(paid, output_field=money), zero),
+            active_enrollment_count=Coalesce(Subquery(count, output_field=IntegerField()), Value(0)),
+        ).annotate(
+            row_status=Case(
+                When(Q(monthly_fees__lte=0) | Q(month_paid__gte=models.F('monthly_fees')), then=Value('OK')),
+                When(month_paid__gt=0, then=Value('PARTIAL')),
+                default=Value('UNPAID'),
+                output_field=models.CharField(),
+            ),
+        ).prefetch_related(
+            Prefetch(
+                'enrollment_set',
+                queryset=Enrollment.objects.filter(is_active=True)
+                .select_related('course_group')
+                .only('student_id', 'course_group', 'course_group__name', 'course_group__subject')
+                .order_by('course_group__name'),
+                to_attr='active_enrollments',
+            )
+        )
+
+
+def _save_with_version(obj, save, args, kwargs):
+    """
+    save() d'une ligne versionnée (clé du cache de fragments) : la version est
+    incrémentée en SQL (version = version + 1) puis relue, au lieu de réécrire
+    la valeur en mémoire, qui peut être périmée.
+    """
+    if obj._state.adding:
+        return save(*args, **kwargs)
+    previous = obj.version
+    obj.version = models.F('version') + 1
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None:
+        kwargs['update_fields'] = set(update_fields) | {'version'}
+    try:
+        save(*args, **kwargs)
+    except Exception:
+        obj.version = previous
+        raise
+    obj.refresh_from_db(fields=['version'])
+
+
+def _save_with_phone_columns(obj, kwargs):
+    """Recalcule les colonnes dérivées avant save() et les ajoute à update_fields."""
+    sync_phone_columns(obj, obj.PHONE_FIELDS)
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None:
+        changed = [f for f in obj.PHONE_FIELDS if f in set(update_fields)]
+        if changed:
+            kwargs['update_fields'] = set(update_fields) | set(derived_phone_fields(changed))
+
+
 class Room(models.Model):
     """Salle de classe"""
     name = models.CharField(max_length=50, unique=True, verbose_name="Nom de la salle")
@@ -27,6 +174,9 @@ class Teacher(models.Model):
     """Professeur"""
     name = models.CharField(max_length=100, verbose_name="Nom complet")
     phone = models.CharField(max_length=20, verbose_name="Téléphone")
+    # Colonnes dérivées de `phone` (voir core.phones)
+    phone_e164 = models.CharField(max_length=16, blank=True, db_index=True, editable=False)
+    phone_rev = models.CharField(max_length=16, blank=True, db_index=True, editable=False)
     email = models.EmailField(blank=True, verbose_name="Email")
     hourly_rate = models.DecimalField(
         max_digits=8,
@@ -36,6 +186,10 @@ class Teacher(models.Model):
     )
     is_active = models.BooleanField(default=True, verbose_name="Actif")
     created_at = models.DateTimeField(auto_now_add=True)
+
+    PHONE_FIELDS = ('phone',)
+
+    objects = PhoneQuerySet.as_manager()
     
     class Meta:
         verbose_name = "Professeur"
@@ -45,6 +199,10 @@ class Teacher(models.Model):
     def __str__(self):
         return f"{self.name} ({self.hourly_rate} DH/h)"
 
+    def save(self, *args, **kwargs):
+        _save_with_phone_columns(self, kwargs)
+        super().save(*args, **kwargs)
+
 
 class CourseGroup(models.Model):
     """Groupe de cours"""
@@ -91,10 +249,13 @@ class CourseGroup(models.Model):
     )
     start_time = models.TimeField(verbose_name="Heure de début")
     end_time = models.TimeField(verbose_name="Heure de fin")
+    duration_minutes = models.PositiveIntegerField(default=0, editable=False, verbose_name="Durée (minutes)")
     
     is_active = models.BooleanField(default=True, verbose_name="Actif")
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = DurationQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Groupe de cours"
         verbose_name_plural = "Groupes de cours"
@@ -105,13 +266,16 @@ class CourseGroup(models.Model):
     def __str__(self):
         return f"{self.name} - {self.get_schedule_day_display()} {self.start_time.strftime('%H:%M')}"
     
+    def save(self, *args, **kwargs):
+        self.duration_minutes = minutes_between(self.start_time, self.end_time)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'start_time', 'end_time'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'duration_minutes'}
+        super().save(*args, **kwargs)
+    
     def duration_hours(self):
         """Calcule la durée en heures"""
-        from datetime import datetime, timedelta
-        start = datetime.combine(datetime.today(), self.start_time)
-        end = datetime.combine(datetime.today(), self.end_time)
-        duration = end - start
-        return duration.total_seconds() / 3600
+        return self.duration_minutes / 60
     
     def check_room_conflict(self):
         """Vérifie s'il y a un conflit de salle"""
@@ -134,7 +298,15 @@ class Student(models.Model):
     name = models.CharField(max_length=100, verbose_name="Nom complet")
     phone = models.CharField(max_length=20, blank=True, verbose_name="Téléphone élève")
     parent_contact = models.CharField(max_length=20, verbose_name="Téléphone parent")
+    # Colonnes dérivées des téléphones (voir core.phones)
+    phone_e164 = models.CharField(max_length=16, blank=True, db_index=True, editable=False)
+    phone_rev = models.CharField(max_length=16, blank=True, db_index=True, editable=False)
+    parent_contact_e164 = models.CharField(max_length=16, blank=True, db_index=True, editable=False)
+    parent_contact_rev = models.CharField(max_length=16, blank=True, db_index=True, editable=False)
     parent_name = models.CharField(max_length=100, blank=True, verbose_name="Nom du parent")
+    message_language = models.CharField(
+        max_length=5, choices=LANGUAGE_CHOICES, default='fr', verbose_name="Langue des messages"
+    )
     
     address = models.TextField(blank=True, verbose_name="Adresse")
     date_of_birth = models.DateField(null=True, blank=True, verbose_name="Date de naissance")
@@ -150,14 +322,28 @@ class Student(models.Model):
     is_active = models.BooleanField(default=True, verbose_name="Actif")
     created_at = models.DateTimeField(auto_now_add=True)
     notes = models.TextField(blank=True, verbose_name="Notes")
+    # Incrémentée par save() et par les signaux (inscriptions, paiements) : clé du cache de fragments
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    PHONE_FIELDS = ('phone', 'parent_contact')
+
+    objects = StudentQuerySet.as_manager()
     
     class Meta:
         verbose_name = "Élève"
         verbose_name_plural = "Élèves"
         ordering = ['name']
+        indexes = [
+            # Pagination par clé (core.pagination) de la liste des élèves
+            models.Index(fields=['name', 'id'], name='student_name_id_idx'),
+        ]
     
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        _save_with_phone_columns(self, kwargs)
+        _save_with_version(self, super().save, args, kwargs)
     
     def total_monthly_fees(self):
         """Calcule le total des frais mensuels"""
@@ -205,6 +391,29 @@ class Enrollment(models.Model):
         return f"{self.student.name} → {self.course_group.name}"
 
 
+def receipt_numbers(year=None):
+    """
+    Numéros de reçu libres de l'année, à la suite du dernier attribué :
+    REC{année}{n° sur 4 chiffres au moins}. Une seule requête pour toute la
+    série (imports en masse).
+    """
+    from django.db.models.functions import Length
+
+    prefix = f"REC{year or timezone.now().year}"
+    # Tri par longueur puis valeur : REC202610000 vient après REC20269999
+    last = (
+        Payment.objects.filter(receipt_number__startswith=prefix)
+        .order_by(Length('receipt_number').desc(), '-receipt_number')
+        .values_list('receipt_number', flat=True)
+        .first()
+    )
+    suffix = last[len(prefix):] if last else ''
+    number = int(suffix) if suffix.isdigit() else 0
+    while True:
+        number += 1
+        yield f"{prefix}{number:04d}"
+
+
 class Payment(models.Model):
     """Paiement"""
     STATUS_CHOICES = [
@@ -270,6 +479,10 @@ class Payment(models.Model):
         verbose_name = "Paiement"
         verbose_name_plural = "Paiements"
         ordering = ['-payment_date', '-created_at']
+        indexes = [
+            # Historique d'un élève, pagination par clé (core.pagination)
+            models.Index(fields=['student', '-payment_date', '-created_at', '-id'], name='payment_history_idx'),
+        ]
     
     def __str__(self):
         return f"Reçu {self.receipt_number} - {self.student.name} - {self.amount} DH"
@@ -280,18 +493,7 @@ class Payment(models.Model):
             self.month_covered = self.month_covered.replace(day=1)
 
         if not self.receipt_number:
-            year = timezone.now().year
-            last_payment = Payment.objects.filter(
-                receipt_number__startswith=f"REC{year}"
-            ).order_by('-receipt_number').first()
-            
-            if last_payment:
-                last_num = int(last_payment.receipt_number[-4:])
-                new_num = last_num + 1
-            else:
-                new_num = 1
-            
-            self.receipt_number = f"REC{year}{new_num:04d}"
+            self.receipt_number = next(receipt_numbers())
         
         super().save(*args, **kwargs)
 
@@ -300,20 +502,53 @@ class Attendance(models.Model):
     """Présence aux cours"""
     student = models.ForeignKey(Student, on_delete=models.CASCADE, verbose_name="Élève")
     course_group = models.ForeignKey(CourseGroup, on_delete=models.CASCADE, verbose_name="Groupe")
+    # Séance précise (lever l'ambiguïté des séances déplacées ou supplémentaires
+    # le même jour). `course_group` et `date` restent dénormalisés pour l'historique.
+    session = models.ForeignKey(
+        'Session',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='attendances',
+        verbose_name="Séance"
+    )
     date = models.DateField(verbose_name="Date")
     is_present = models.BooleanField(default=True, verbose_name="Présent")
     notes = models.TextField(blank=True, verbose_name="Notes")
+
+    # Synchronisation hors-ligne : horodatage de la saisie côté tablette
+    # (last-writer-wins) et date de dernière modification côté serveur.
+    client_timestamp = models.DateTimeField(null=True, blank=True, verbose_name="Horodatage client")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         verbose_name = "Présence"
         verbose_name_plural = "Présences"
-        unique_together = [['student', 'course_group', 'date']]
         ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['student', 'session'],
+                name='unique_attendance_per_session'
+            ),
+            # Anciennes saisies sans séance : une seule par élève/groupe/jour
+            models.UniqueConstraint(
+                fields=['student', 'course_group', 'date'],
+                condition=models.Q(session__isnull=True),
+                name='unique_attendance_per_day_without_session'
+            ),
+        ]
     
     def __str__(self):
         status = "✓" if self.is_present else "✗"
         return f"{status} {self.student.name} - {self.course_group.name} - {self.date}"
 
+    def save(self, *args, **kwargs):
+        # Garder groupe et date cohérents avec la séance
+        if self.session_id:
+            self.course_group_id = self.session.group_id
+            self.date = self.session.date
+        super().save(*args, **kwargs)
+
 
 class Session(models.Model):
     """Instance of a group meeting (used for scheduling & payroll)
@@ -342,9 +577,15 @@ class Session(models.Model):
     )
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PLANNED')
     notes = models.TextField(blank=True)
+    # Dénormalisé depuis start/end pour pouvoir faire Sum('duration_minutes') en SQL
+    duration_minutes = models.PositiveIntegerField(default=0, editable=False, verbose_name='Durée (minutes)')
+    # Incrémentée en SQL à chaque save() : clé du cache de fragments
+    version = models.PositiveIntegerField(default=1, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = DurationQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Session'
         verbose_name_plural = 'Sessions'
@@ -380,13 +621,14 @@ class Session(models.Model):
     def save(self, *args, **kwargs):
         # run full_clean to enforce clean() on save
         self.full_clean()
-        super().save(*args, **kwargs)
+        self.duration_minutes = minutes_between(self.start_time, self.end_time)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'start_time', 'end_time'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'duration_minutes'}
+        _save_with_version(self, super().save, args, kwargs)
 
     def duration_hours(self):
-        from datetime import datetime
-        start = datetime.combine(datetime.today(), self.start_time)
-        end = datetime.combine(datetime.today(), self.end_time)
-        return (end - start).total_seconds() / 3600
+        return self.duration_minutes / 60
 
 
 class SessionException(models.Model):
@@ -425,4 +667,299 @@ class SessionException(models.Model):
         return self.override_start_time or self.course_group.start_time
 
     def effective_end(self):
-        return self.override_end_time or self.course_group.end_time
\ No newline at end of file
+        return self.override_end_time or self.course_group.end_time
+
+class PayrollRunQuerySet(models.QuerySet):
+
+    def delete(self):
+        """Suppression en masse (action « supprimer » de l'admin) : refusée si une paie est validée."""
+        if self.filter(status='APPROVED').exists():
+            raise ValidationError("La sélection contient une paie validée, qui ne peut pas être supprimée.")
+        return super().delete()
+
+
+class PayrollLineQuerySet(models.QuerySet):
+
+    def delete(self):
+        if self.filter(run__status='APPROVED').exists():
+            raise ValidationError("Lignes d'une paie validée : suppression impossible.")
+        return super().delete()
+
+
+class PayrollRun(models.Model):
+    """Paie mensuelle de tous les professeurs (instantané figé une fois validé)"""
+    STATUS_CHOICES = [
+        ('DRAFT', 'Brouillon'),
+        ('APPROVED', 'Validée'),
+    ]
+
+    month = models.DateField(
+        unique=True,
+        verbose_name="Mois",
+        help_text="Premier jour du mois payé"
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='DRAFT', verbose_name="Statut")
+
+    total_minutes = models.PositiveIntegerField(default=0, verbose_name="Total minutes")
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'), verbose_name="Total (DH)")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    created_by = models.CharField(max_length=100, blank=True, verbose_name="Créé par")
+    computed_at = models.DateTimeField(null=True, blank=True, verbose_name="Calculée le")
+    approved_at = models.DateTimeField(null=True, blank=True, verbose_name="Validée le")
+    approved_by = models.CharField(max_length=100, blank=True, verbose_name="Validée par")
+
+    objects = PayrollRunQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Paie mensuelle"
+        verbose_name_plural = "Paies mensuelles"
+        ordering = ['-month']
+
+    def __str__(self):
+        return f"Paie {self.month.strftime('%m/%Y')} ({self.get_status_display()})"
+
+    @property
+    def is_approved(self):
+        return self.status == 'APPROVED'
+
+    @property
+    def total_hours(self):
+        return (Decimal(self.total_minutes) / 60).quantize(Decimal('0.01'))
+
+    def _stored_is_approved(self):
+        return bool(self.pk) and PayrollRun.objects.filter(pk=self.pk, status='APPROVED').exists()
+
+    def save(self, *args, **kwargs):
+        if self.month:
+            self.month = self.month.replace(day=1)
+        # Une paie validée ne peut plus être modifiée
+        if self._stored_is_approved():
+            raise ValidationError("Cette paie est validée et ne peut plus être modifiée.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        if self._stored_is_approved():
+            raise ValidationError("Cette paie est validée et ne peut pas être supprimée.")
+        return super().delete(*args, **kwargs)
+
+
+class PayrollLine(models.Model):
+    """Ligne de paie d'un professeur pour une paie mensuelle"""
+    run = models.ForeignKey(PayrollRun, on_delete=models.CASCADE, related_name='lines', verbose_name="Paie")
+    teacher = models.ForeignKey(Teacher, on_delete=models.PROTECT, related_name='payroll_lines', verbose_name="Professeur")
+
+    sessions_count = models.PositiveIntegerField(default=0, verbose_name="Séances")
+    minutes = models.PositiveIntegerField(default=0, verbose_name="Minutes")
+    # Tarif copié au moment du calcul : une hausse ultérieure ne change pas la paie
+    hourly_rate = models.DecimalField(max_digits=8, decimal_places=2, verbose_name="Tarif horaire (DH)")
+    amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Montant (DH)")
+
+    objects = PayrollLineQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Ligne de paie"
+        verbose_name_plural = "Lignes de paie"
+        unique_together = [['run', 'teacher']]
+        ordering = ['teacher__name']
+
+    def __str__(self):
+        return f"{self.teacher.name} - {self.amount} DH"
+
+    @property
+    def hours(self):
+        return (Decimal(self.minutes) / 60).quantize(Decimal('0.01'))
+
+    def save(self, *args, **kwargs):
+        if self.run.is_approved:
+            raise ValidationError("Cette paie est validée et ne peut plus être modifiée.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        if self.run.is_approved:
+            raise ValidationError("Cette paie est validée et ne peut pas être modifiée.")
+        return super().delete(*args, **kwargs)
+
+
+class KpiSnapshot(models.Model):
+    """Indicateurs du jour (une ligne par date) pour les courbes de tendance"""
+    date = models.DateField(unique=True, verbose_name="Date")
+
+    active_students = models.PositiveIntegerField(default=0, verbose_name="Élèves actifs")
+    active_enrollments = models.PositiveIntegerField(default=0, verbose_name="Inscriptions actives")
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'), verbose_name="Recette du jour (DH)")
+    unpaid_amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name="Impayés du mois (DH)",
+        help_text="Reste dû pour le mois en cours à cette date"
+    )
+    attendance_count = models.PositiveIntegerField(default=0, verbose_name="Présences saisies")
+    attendance_rate = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name="Taux de présence (%)"
+    )
+
+    computed_at = models.DateTimeField(auto_now=True, verbose_name="Calculé le")
+
+    class Meta:
+        verbose_name = "Indicateurs du jour"
+        verbose_name_plural = "Indicateurs journaliers"
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"KPI {self.date.strftime('%d/%m/%Y')}"
+
+
+class ExportJob(models.Model):
+    """Export de l'admin préparé en arrière-plan (commande run_export_jobs)"""
+    STATUS_CHOICES = [
+        ('PENDING', 'En attente'),
+        ('RUNNING', 'En cours'),
+        ('DONE', 'Terminé'),
+        ('FAILED', 'Échec'),
+    ]
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('xlsx', 'Excel (XLSX)'),
+    ]
+
+    model_label = models.CharField(max_length=100, verbose_name="Données")
+    resource_path = models.CharField(max_length=200, verbose_name="Ressource")
+    file_format = models.CharField(max_length=4, choices=FORMAT_CHOICES, verbose_name="Format")
+    # Paramètres GET de la liste de l'admin (filtres, recherche, tri), rejoués
+    # par le ModelAdmin au traitement ; `pks` : éléments cochés (action « Exporter »)
+    params = models.JSONField(default=dict, blank=True, editable=False)
+    pks = models.JSONField(default=list, blank=True, editable=False)
+    export_fields = models.JSONField(default=list, blank=True, verbose_name="Colonnes")
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING', db_index=True, verbose_name="Statut")
+    total_rows = models.PositiveIntegerField(default=0, verbose_name="Lignes")
+    processed_rows = models.PositiveIntegerField(default=0, verbose_name="Lignes écrites")
+    file = models.FileField(upload_to='exports/', blank=True, verbose_name="Fichier")
+    error = models.TextField(blank=True, verbose_name="Erreur")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    created_by = models.CharField(max_length=100, blank=True, verbose_name="Demandé par")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Commencé le")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Terminé le")
+
+    class Meta:
+        verbose_name = "Export en arrière-plan"
+        verbose_name_plural = "Exports en arrière-plan"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Export {self.model_label} n°{self.pk} ({self.get_status_display()})"
+
+    @property
+    def progress(self):
+        """Avancement en % (None tant que le total n'est pas connu)."""
+        if self.status == 'DONE':
+            return 100
+        if not self.total_rows:
+            return None
+        return min(100, int(self.processed_rows * 100 / self.total_rows))
+
+    @property
+    def is_finished(self):
+        return self.status in ('DONE', 'FAILED')
+
+
+class OutboundMessage(models.Model):
+    """
+    Message sortant en file d'attente (boîte d'envoi)
+
+    Les rappels, notifications et annonces sont enregistrés ici puis envoyés
+    par la commande `run_outbox` via la passerelle OUTBOX_GATEWAY
+    (voir core.outbox) : débit limité, envoi par lots, nouvelles tentatives
+    espacées en cas d'échec.
+    """
+    CHANNEL_CHOICES = [
+        ('WHATSAPP', 'WhatsApp'),
+        ('SMS', 'SMS'),
+    ]
+
+    KIND_CHOICES = [
+        ('PAYMENT_REMINDER', 'Rappel de paiement'),
+        ('ABSENCE', "Notification d'absence"),
+        ('SESSION_REMINDER', 'Rappel de séance'),
+        ('ANNOUNCEMENT', 'Annonce'),
+        ('OTHER', 'Autre'),
+    ]
+
+    STATUS_CHOICES = [
+        ('QUEUED', 'En attente'),
+        ('SENDING', "En cours d'envoi"),
+        ('SENT', 'Envoyé'),
+        ('FAILED', 'Échec'),
+        ('CANCELLED', 'Annulé'),
+    ]
+
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES, default='WHATSAPP', verbose_name="Canal")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='OTHER', verbose_name="Type")
+    to = models.CharField(max_length=16, verbose_name="Destinataire")
+    body = models.TextField(verbose_name="Message")
+    student = models.ForeignKey(
+        Student, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='outbound_messages', verbose_name="Élève"
+    )
+    # Évite d'envoyer deux fois le même rappel (ex. « payment_reminder:12:202501 »)
+    dedupe_key = models.CharField(max_length=100, unique=True, null=True, blank=True, editable=False)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='QUEUED', verbose_name="Statut")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Tentatives")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Prochain essai")
+    last_error = models.TextField(blank=True, verbose_name="Dernière erreur")
+    provider_id = models.CharField(max_length=100, blank=True, verbose_name="Référence passerelle")
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Créé le")
+    claimed_at = models.DateTimeField(null=True, blank=True, editable=False)
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Envoyé le")
+
+    class Meta:
+        verbose_name = "Message sortant"
+        verbose_name_plural = "Messages sortants"
+        ordering = ['-created_at']
+        indexes = [
+            # Messages à envoyer : status = 'QUEUED' ORDER BY next_attempt_at
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} → {self.to} ({self.get_status_display()})"
+
+
+class MessageTemplate(models.Model):
+    """
+    Texte d'un message aux parents, par code et par langue
+    (variables autorisées : core.message_templates.PLACEHOLDERS)
+    """
+    code = models.CharField(max_length=30, choices=TEMPLATE_CODE_CHOICES, verbose_name="Message")
+    language = models.CharField(max_length=5, choices=LANGUAGE_CHOICES, default='fr', verbose_name="Langue")
+    body = models.TextField(verbose_name="Texte")
+    is_active = models.BooleanField(default=True, verbose_name="Actif")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Modifié le")
+
+    class Meta:
+        verbose_name = "Modèle de message"
+        verbose_name_plural = "Modèles de messages"
+        ordering = ['code', 'language']
+        constraints = [
+            models.UniqueConstraint(fields=['code', 'language'], name='unique_message_template_language'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_code_display()} ({self.get_language_display()})"
+
+    def clean(self):
+        super().clean()
+        if self.code and self.body:
+            try:
+                validate_template(self.code, self.body)
+            except ValidationError as e:
+                raise ValidationError({'body': e.messages})
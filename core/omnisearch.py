@@ -0,0 +1,380 @@
+"""
+Recherche globale (élèves, professeurs, groupes, salles, reçus)
+
+Chaque type d'entité a son index de préfixes :
+
+- élèves : index plein texte FTS5 (core.search), téléphones indexés ;
+- professeurs, groupes, salles : petites tables, indexées en mémoire sous
+  forme de liste triée de mots normalisés (recherche par bisection),
+  reconstruite quand leur version change ou au plus tard après
+  OMNISEARCH_INDEX_MAX_AGE secondes (écritures faites dans un autre
+  processus, dont le cache local ne voit pas la version) ;
+- reçus : intervalle sur l'index unique de `Payment.receipt_number`.
+
+Les index en mémoire sont (re)construits et interrogés dans le thread de la
+requête, hors budget : un démarrage à froid ne les fait pas manquer. Les
+types servis par la base (élèves, reçus) sont interrogés en parallèle dans un
+pool de threads partagé par le processus ; seuls ceux qui répondent dans le
+budget (OMNISEARCH_BUDGET_MS) figurent dans la réponse, les autres sont
+listés dans `skipped`. Les K meilleurs résultats de chaque type sont
+fusionnés par score.
+
+Les réponses complètes sont gardées dans un cache LRU en mémoire, quelques
+secondes, pour les frappes répétées ; la clé inclut les versions des index,
+incrémentées par les signaux à chaque écriture (core.signals).
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connection
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlencode
+
+from .search import fold
+
+ENTITY_TYPES = ('student', 'teacher', 'group', 'room', 'receipt')
+TYPE_LABELS = {
+    'student': 'Élève',
+    'teacher': 'Professeur',
+    'group': 'Groupe',
+    'room': 'Salle',
+    'receipt': 'Reçu',
+}
+VERSION_KEY = 'omnisearch:version:{}'
+
+
+def _budget() -> float:
+    return getattr(settings, 'OMNISEARCH_BUDGET_MS', 50) / 1000
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Pool partagé par toutes les requêtes du processus, créé au premier usage."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'OMNISEARCH_WORKERS', 8),
+                    thread_name_prefix='omnisearch',
+                )
+    return _executor
+
+
+# ==================== VERSIONS ====================
+
+def get_versions() -> Tuple:
+    keys = [VERSION_KEY.format(t) for t in ENTITY_TYPES]
+    values = cache.get_many(keys)
+    return tuple(values.get(k, 0) for k in keys)
+
+
+def bump_version(entity_type: str):
+    key = VERSION_KEY.format(entity_type)
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+# ==================== SCORE ====================
+
+def score(query: str, label: str) -> float:
+    """
+    Pertinence entre 0 et 1 d'un libellé pour une saisie (déjà normalisés).
+
+    Égalité 1.0, libellé commençant par la saisie 0.8, chaque mot de la
+    saisie préfixe d'un mot du libellé 0.6, sinon 0.4 (correspondance
+    trouvée par l'index sur un autre champ : parent, téléphone...).
+    """
+    if not query:
+        return 0.0
+    if label == query:
+        return 1.0
+    if label.startswith(query):
+        return 0.8
+    words = label.split()
+    if all(any(w.startswith(q) for w in words) for q in query.split()):
+        return 0.6
+    return 0.4
+
+
+# ==================== INDEX EN MÉMOIRE ====================
+
+class PrefixIndex:
+    """Liste triée (mot, id) : les mots commençant par un préfixe sont contigus."""
+
+    def __init__(self, entries: List[Dict]):
+        self.entries = {e['id']: e for e in entries}
+        self.terms = sorted(
+            (term, e['id']) for e in entries for term in set(fold(e['terms']).split())
+        )
+        self._keys = [t for t, _ in self.terms]
+
+    def _ids_for_prefix(self, prefix: str) -> set:
+        ids = set()
+        i = bisect_left(self._keys, prefix)
+        while i < len(self._keys) and self._keys[i].startswith(prefix):
+            ids.add(self.terms[i][1])
+            i += 1
+        return ids
+
+    def search(self, query: str) -> List[Dict]:
+        words = query.split()
+        if not words:
+            return []
+        ids = self._ids_for_prefix(words[0])
+        for word in words[1:]:
+            ids &= self._ids_for_prefix(word)
+        return [self.entries[pk] for pk in ids]
+
+
+def _teacher_entries():
+    from .models import Teacher
+
+    return [
+        {'id': pk, 'label': name, 'terms': name,
+         'url': reverse('core:teachers_list') + '?' + urlencode({'name': name})}
+        for pk, name in Teacher.objects.filter(is_active=True).values_list('pk', 'name')
+    ]
+
+
+def _group_entries():
+    from .models import CourseGroup
+
+    return [
+        {'id': pk, 'label': f"{name} — {subject} {level}", 'terms': f"{name} {subject} {level}",
+         'url': reverse('core:courses_list') + '?' + urlencode({'name': name})}
+        for pk, name, subject, level in CourseGroup.objects.filter(is_active=True).values_list(
+            'pk', 'name', 'subject', 'level'
+        )
+    ]
+
+
+def _room_entries():
+    from .models import Room
+
+    return [
+        {'id': pk, 'label': name, 'terms': name,
+         'url': reverse('core:rooms_list') + '?' + urlencode({'name': name})}
+        for pk, name in Room.objects.filter(is_active=True).values_list('pk', 'name')
+    ]
+
+
+MEMORY_INDEXES = {
+    'teacher': _teacher_entries,
+    'group': _group_entries,
+    'room': _room_entries,
+}
+
+# type -> (version, construit à (monotonic), index)
+_indexes: Dict[str, Tuple[int, float, PrefixIndex]] = {}
+_indexes_lock = threading.Lock()
+
+
+def _index_max_age() -> float:
+    return getattr(settings, 'OMNISEARCH_INDEX_MAX_AGE', 60)
+
+
+def _is_current(entry, version) -> bool:
+    return entry is not None and entry[0] == version and time.monotonic() - entry[1] < _index_max_age()
+
+
+def get_memory_index(entity_type: str, version: Optional[int] = None) -> PrefixIndex:
+    if version is None:
+        version = cache.get(VERSION_KEY.format(entity_type), 0)
+    current = _indexes.get(entity_type)
+    if not _is_current(current, version):
+        with _indexes_lock:
+            current = _indexes.get(entity_type)
+            if not _is_current(current, version):
+                current = (version, time.monotonic(), PrefixIndex(MEMORY_INDEXES[entity_type]()))
+                _indexes[entity_type] = current
+    return current[2]
+
+
+# ==================== RECHERCHE PAR TYPE ====================
+
+def _search_memory(entity_type: str, query: str, limit: int, index: Optional[PrefixIndex] = None) -> List[Dict]:
+    folded = fold(query)
+    index = index or get_memory_index(entity_type)
+    hits = [
+        {'id': e['id'], 'text': e['label'], 'url': e['url'], 'score': score(folded, fold(e['label']))}
+        for e in index.search(folded)
+    ]
+    hits.sort(key=lambda h: (-h['score'], h['text']))
+    return hits[:limit]
+
+
+def _search_students(query: str, limit: int) -> List[Dict]:
+    from .search import search_students
+
+    folded = fold(query)
+    hits = [
+        {
+            'id': s.pk,
+            'text': f"{s.name} ({s.parent_name or s.parent_contact})",
+            'url': reverse('core:student_page', args=[s.pk]),
+            'score': score(folded, fold(s.name)),
+        }
+        for s in search_students(query, limit=limit)
+    ]
+    # Tri stable : à score égal, l'ordre bm25 est conservé
+    hits.sort(key=lambda h: -h['score'])
+    return hits
+
+
+def _search_receipts(query: str, limit: int) -> List[Dict]:
+    from .models import Payment
+
+    prefix = query.replace(' ', '').upper()
+    guessed = False
+    if prefix.isdigit():
+        if len(prefix) <= 4:
+            # « 42 » : reçu n° 42 de l'année en cours (REC{année}{n° sur 4 chiffres})
+            prefix = f"REC{timezone.now().year}{prefix.zfill(4)}"
+            guessed = True
+        else:
+            prefix = 'REC' + prefix
+    if len(prefix) < 4 or not prefix.startswith('REC'):
+        return []
+    payments = (
+        Payment.objects.filter(receipt_number__gte=prefix, receipt_number__lt=prefix + '\uffff')
+        .select_related('student')
+        .order_by('-receipt_number')[:limit]
+    )
+    return [
+        {
+            'id': p.pk,
+            'text': f"{p.receipt_number} — {p.student.name} ({p.amount} DH)",
+            'url': reverse('core:student_page', args=[p.student_id]),
+            'score': 0.6 if guessed else (1.0 if p.receipt_number == prefix else 0.8),
+        }
+        for p in payments
+    ]
+
+
+def search_entity(entity_type: str, query: str, limit: int) -> List[Dict]:
+    if entity_type == 'student':
+        return _search_students(query, limit)
+    if entity_type == 'receipt':
+        return _search_receipts(query, limit)
+    return _search_memory(entity_type, query, limit)
+
+
+def _search_entity_in_thread(entity_type: str, query: str, limit: int) -> List[Dict]:
+    close_old_connections()
+    try:
+        return search_entity(entity_type, query, limit)
+    finally:
+        connection.close()
+
+
+# ==================== CACHE DE RÉSULTATS ====================
+
+class ResultCache:
+    """LRU en mémoire du processus, avec expiration."""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+result_cache = ResultCache()
+
+
+# ==================== POINT D'ENTRÉE ====================
+
+def omnisearch(query: str, types: Optional[List[str]] = None, limit: int = 5,
+               budget: Optional[float] = None) -> Dict:
+    """
+    Recherche globale.
+
+    Returns:
+        {'results': [{type, type_label, id, text, url, score}, ...] triés par score,
+         'partial': bool, 'skipped': [types hors budget],
+         'skipped_labels': [libellés des types hors budget], 'cached': bool}
+    """
+    query = (query or '').strip()
+    types = [t for t in (types or ENTITY_TYPES) if t in ENTITY_TYPES]
+    if not query or not types:
+        return {'results': [], 'partial': False, 'skipped': [], 'skipped_labels': [], 'cached': False}
+
+    versions = get_versions()
+    key = (fold(query), query.replace(' ', '').upper(), tuple(types), limit, versions)
+    cached = result_cache.get(key)
+    if cached is not None:
+        return dict(cached, cached=True)
+
+    # Types servis par la base : en parallèle, dans le budget
+    futures = {
+        get_executor().submit(_search_entity_in_thread, t, query, limit): t
+        for t in types if t not in MEMORY_INDEXES
+    }
+
+    # Index en mémoire : construits si besoin et interrogés ici, hors budget
+    found = {}
+    for entity_type in types:
+        if entity_type in MEMORY_INDEXES:
+            index = get_memory_index(entity_type, versions[ENTITY_TYPES.index(entity_type)])
+            found[entity_type] = _search_memory(entity_type, query, limit, index)
+
+    # Les types en retard sont abandonnés (ils finissent en arrière-plan)
+    done, _ = wait(futures, timeout=budget if budget is not None else _budget())
+    for future in done:
+        if future.exception() is None:
+            found[futures[future]] = future.result()
+
+    results = [
+        dict(hit, type=entity_type, type_label=TYPE_LABELS[entity_type])
+        for entity_type, hits in found.items() for hit in hits
+    ]
+    order = {t: i for i, t in enumerate(ENTITY_TYPES)}
+    results.sort(key=lambda h: (-h['score'], order[h['type']]))
+    skipped = [t for t in types if t not in found]
+    response = {
+        'results': results,
+        'partial': bool(skipped),
+        'skipped': skipped,
+        'skipped_labels': [TYPE_LABELS[t] for t in skipped],
+        'cached': False,
+    }
+    if not skipped:
+        result_cache.set(key, response)
+    return response
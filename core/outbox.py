@@ -0,0 +1,324 @@
+"""
+Boîte d'envoi : messages sortants (WhatsApp, SMS) en file d'attente
+
+Les pages et actions qui préviennent les parents (rappels de paiement,
+absences, rappels de séance, annonces) ne contactent plus la passerelle
+pendant la requête : elles enregistrent des OutboundMessage avec
+`enqueue_message()` / `enqueue_messages()`. La commande `run_outbox` les
+envoie ensuite sans surveillance :
+
+- débit limité par un seau à jetons (OUTBOX_RATE_PER_SECOND, rafale
+  OUTBOX_BURST) pour rester sous le quota de la passerelle ;
+- envoi par lots de OUTBOX_BATCH_SIZE messages, réservés en une requête
+  (plusieurs workers peuvent tourner en parallèle) ;
+- en cas d'échec temporaire, nouvel essai après un délai doublé à chaque
+  tentative (OUTBOX_RETRY_BASE_SECONDS, plafonné à OUTBOX_RETRY_MAX_SECONDS),
+  abandon après OUTBOX_MAX_ATTEMPTS tentatives ;
+- statut, nombre de tentatives, dernière erreur et référence de la
+  passerelle enregistrés sur chaque message (visibles dans l'admin).
+
+La passerelle est une classe (OUTBOX_GATEWAY) qui implémente
+`Gateway.send_batch()`. `FakeGateway`, la passerelle par défaut, n'envoie
+rien : elle garde les messages en mémoire (tests, développement).
+"""
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import timedelta
+from typing import Callable, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .phones import normalize_phone
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+# ==================== PASSERELLES ====================
+
+class Gateway:
+    """
+    Interface d'une passerelle d'envoi.
+
+    `send_batch()` reçoit une liste d'OutboundMessage et renvoie, dans le même
+    ordre, un dict par message :
+
+        {'ok': True, 'provider_id': '...'}
+        {'ok': False, 'error': '...', 'retry': True}   # échec temporaire
+        {'ok': False, 'error': '...', 'retry': False}  # numéro invalide...
+
+    Une exception levée par send_batch() compte comme un échec temporaire
+    de tout le lot.
+    """
+
+    def __init__(self, **options):
+        self.options = options
+
+    def send_batch(self, messages: List) -> List[Dict]:
+        raise NotImplementedError
+
+
+class FakeGateway(Gateway):
+    """
+    Passerelle locale : n'envoie rien, garde les derniers messages « envoyés »
+    dans `FakeGateway.outbox`.
+
+    Options :
+        fail_numbers: numéros (E.164) toujours refusés, sans nouvel essai
+        flaky_rate: proportion d'échecs temporaires simulés (0 à 1)
+    """
+
+    outbox = deque(maxlen=10000)
+    _lock = threading.Lock()
+
+    def send_batch(self, messages):
+        fail_numbers = set(self.options.get('fail_numbers', ()))
+        flaky_rate = self.options.get('flaky_rate', 0)
+        results = []
+        for message in messages:
+            if message.to in fail_numbers:
+                results.append({'ok': False, 'error': 'Numéro refusé', 'retry': False})
+            elif flaky_rate and random.random() < flaky_rate:
+                results.append({'ok': False, 'error': 'Passerelle indisponible', 'retry': True})
+            else:
+                provider_id = uuid.uuid4().hex
+                with self._lock:
+                    self.outbox.append({
+                        'id': message.pk, 'channel': message.channel, 'to': message.to,
+                        'body': message.body, 'provider_id': provider_id,
+                    })
+                results.append({'ok': True, 'provider_id': provider_id})
+        return results
+
+
+def get_gateway() -> Gateway:
+    gateway_class = import_string(_setting('OUTBOX_GATEWAY', 'core.outbox.FakeGateway'))
+    return gateway_class(**_setting('OUTBOX_GATEWAY_OPTIONS', {}))
+
+
+# ==================== DÉBIT ====================
+
+class TokenBucket:
+    """
+    Seau à jetons : `rate` jetons par seconde, au plus `capacity` en réserve.
+    Un message envoyé consomme un jeton.
+    """
+
+    def __init__(self, rate: float, capacity: float, clock: Callable = time.monotonic,
+                 sleep: Callable = time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self._updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self, wanted: int) -> int:
+        """Attend au moins un jeton, puis en prend jusqu'à `wanted` ; renvoie le nombre pris."""
+        self._refill()
+        if self.tokens < 1:
+            self.sleep((1 - self.tokens) / self.rate)
+            self._refill()
+        # Arrondi : après l'attente, le seau peut contenir 0,999... jeton
+        taken = max(1, min(int(self.tokens + 1e-9), wanted))
+        self.tokens -= taken
+        return taken
+
+    def give_back(self, count: int):
+        """Jetons pris mais inutilisés (moins de messages que prévu)."""
+        self.tokens = min(self.capacity, self.tokens + count)
+
+
+def default_bucket() -> TokenBucket:
+    rate = _setting('OUTBOX_RATE_PER_SECOND', 5)
+    return TokenBucket(rate, max(1, _setting('OUTBOX_BURST', 20)))
+
+
+# ==================== MISE EN FILE ====================
+
+def enqueue_message(to: str, body: str, kind: str = 'OTHER', student=None,
+                    dedupe_key: Optional[str] = None, channel: str = 'WHATSAPP'):
+    """
+    Met un message en file. Renvoie le message créé, ou None si le numéro est
+    vide ou si un message avec la même `dedupe_key` existe déjà.
+    """
+    from .models import OutboundMessage
+
+    phone = normalize_phone(to)
+    if not phone or not body:
+        return None
+    if dedupe_key and OutboundMessage.objects.filter(dedupe_key=dedupe_key).exists():
+        return None
+    try:
+        with transaction.atomic():
+            return OutboundMessage.objects.create(
+                channel=channel, kind=kind, to=phone, body=body,
+                student=student, dedupe_key=dedupe_key,
+            )
+    except IntegrityError:
+        # Même clé enregistrée entre-temps (double clic, autre worker)
+        return None
+
+
+def enqueue_messages(items: Iterable[Dict], kind: str = 'OTHER', channel: str = 'WHATSAPP',
+                     batch_size: int = 500) -> int:
+    """
+    Met en file plusieurs messages en quelques requêtes.
+
+    `items` : dicts avec 'to', 'body' et, optionnels, 'student' (ou
+    'student_id') et 'dedupe_key'. Les numéros vides et les clés déjà en file
+    sont ignorés. Renvoie le nombre de messages ajoutés.
+    """
+    from .models import OutboundMessage
+
+    messages, keys = [], set()
+    for item in items:
+        phone = normalize_phone(item.get('to'))
+        key = item.get('dedupe_key')
+        if not phone or not item.get('body') or (key and key in keys):
+            continue
+        if key:
+            keys.add(key)
+        student = item.get('student')
+        messages.append(OutboundMessage(
+            channel=item.get('channel', channel), kind=item.get('kind', kind), to=phone,
+            body=item['body'], dedupe_key=key,
+            student_id=student.pk if student is not None else item.get('student_id'),
+        ))
+
+    existing = set()
+    key_list = list(keys)
+    for start in range(0, len(key_list), batch_size):
+        existing.update(OutboundMessage.objects.filter(
+            dedupe_key__in=key_list[start:start + batch_size]
+        ).values_list('dedupe_key', flat=True))
+    messages = [m for m in messages if m.dedupe_key not in existing]
+
+    # ignore_conflicts : clé ajoutée par une autre requête depuis la vérification
+    OutboundMessage.objects.bulk_create(messages, batch_size=batch_size, ignore_conflicts=True)
+    return len(messages)
+
+
+# ==================== ENVOI ====================
+
+def retry_delay(attempts: int) -> timedelta:
+    """Délai avant la tentative suivante : base × 2^(n-1), plafonné, ±10 % d'aléa."""
+    base = _setting('OUTBOX_RETRY_BASE_SECONDS', 30)
+    ceiling = _setting('OUTBOX_RETRY_MAX_SECONDS', 3600)
+    delay = min(ceiling, base * 2 ** max(0, attempts - 1))
+    return timedelta(seconds=delay * random.uniform(0.9, 1.1))
+
+
+def claim_batch(size: int) -> List:
+    """
+    Réserve jusqu'à `size` messages dus (QUEUED, next_attempt_at passé) en
+    les passant SENDING ; un autre worker ne peut plus les prendre.
+    """
+    from .models import OutboundMessage
+
+    now = timezone.now()
+    due = list(
+        OutboundMessage.objects.filter(status='QUEUED', next_attempt_at__lte=now)
+        .order_by('next_attempt_at', 'pk').values_list('pk', flat=True)[:size]
+    )
+    if not due:
+        return []
+    OutboundMessage.objects.filter(pk__in=due, status='QUEUED').update(status='SENDING', claimed_at=now)
+    # Seulement ceux que cette réservation a obtenus
+    return list(OutboundMessage.objects.filter(pk__in=due, status='SENDING', claimed_at=now).order_by('pk'))
+
+
+def deliver(messages: List, gateway: Gateway) -> Dict[str, int]:
+    """Envoie un lot réservé et enregistre le résultat de chaque message."""
+    from .models import OutboundMessage
+
+    try:
+        results = gateway.send_batch(messages)
+        if len(results) != len(messages):
+            raise ValueError(f"{len(results)} résultats pour {len(messages)} messages")
+    except Exception as e:
+        results = [{'ok': False, 'error': f'{type(e).__name__}: {e}', 'retry': True}] * len(messages)
+
+    max_attempts = _setting('OUTBOX_MAX_ATTEMPTS', 6)
+    now = timezone.now()
+    stats = {'sent': 0, 'retried': 0, 'failed': 0}
+    for message, result in zip(messages, results):
+        message.attempts += 1
+        if result.get('ok'):
+            message.status = 'SENT'
+            message.sent_at = now
+            message.provider_id = str(result.get('provider_id') or '')[:100]
+            message.last_error = ''
+            stats['sent'] += 1
+        elif result.get('retry', True) and message.attempts < max_attempts:
+            message.status = 'QUEUED'
+            message.next_attempt_at = now + retry_delay(message.attempts)
+            message.last_error = result.get('error', '')
+            stats['retried'] += 1
+        else:
+            message.status = 'FAILED'
+            message.last_error = result.get('error', '')
+            stats['failed'] += 1
+
+    OutboundMessage.objects.bulk_update(
+        messages, ['status', 'attempts', 'sent_at', 'provider_id', 'last_error', 'next_attempt_at']
+    )
+    return stats
+
+
+def release_stale_messages(minutes: Optional[int] = None) -> int:
+    """
+    Remet en file les messages restés SENDING (worker arrêté pendant un lot).
+    Ils peuvent avoir été remis : la passerelle doit tolérer un doublon rare.
+    """
+    from .models import OutboundMessage
+
+    if minutes is None:
+        minutes = _setting('OUTBOX_STALE_MINUTES', 15)
+    return OutboundMessage.objects.filter(
+        status='SENDING', claimed_at__lt=timezone.now() - timedelta(minutes=minutes)
+    ).update(status='QUEUED')
+
+
+def process_outbox(gateway: Optional[Gateway] = None, bucket: Optional[TokenBucket] = None,
+                   batch_size: Optional[int] = None, limit: Optional[int] = None,
+                   progress: Optional[Callable] = None) -> Dict[str, int]:
+    """
+    Envoie les messages dus, lot par lot, au débit du seau à jetons, jusqu'à
+    ce qu'il n'y en ait plus (ou `limit` messages traités).
+
+    Returns:
+        {'sent': n, 'retried': n, 'failed': n}
+    """
+    gateway = gateway or get_gateway()
+    bucket = bucket or default_bucket()
+    batch_size = batch_size or _setting('OUTBOX_BATCH_SIZE', 20)
+    totals = {'sent': 0, 'retried': 0, 'failed': 0}
+    processed = 0
+
+    while limit is None or processed < limit:
+        wanted = batch_size if limit is None else min(batch_size, limit - processed)
+        tokens = bucket.take(wanted)
+        messages = claim_batch(tokens)
+        bucket.give_back(tokens - len(messages))
+        if not messages:
+            break
+        stats = deliver(messages, gateway)
+        for key, value in stats.items():
+            totals[key] += value
+        processed += len(messages)
+        if progress:
+            progress(totals)
+    return totals
@@ -0,0 +1,109 @@
+"""
+Pagination par clé (« seek »)
+
+Au lieu d'un OFFSET, chaque page reprend après la dernière ligne de la page
+précédente : WHERE (name, id) > (:name, :id) ORDER BY name, id LIMIT n.
+Avec un index sur les colonnes de tri, la page 200 coûte autant que la
+page 1. Le curseur transmis au client est signé (opaque et non falsifiable).
+
+Le total exact n'est plus calculé à chaque page : `approximate_count()` garde
+un COUNT en cache quelques minutes (PAGINATION_COUNT_TTL).
+"""
+import hashlib
+from typing import List, Optional, Sequence
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+CURSOR_SALT = 'core.pagination'
+
+
+class KeysetPage:
+    """Une page : ses lignes et le curseur de la suivante (None en fin de liste)."""
+
+    def __init__(self, object_list: List, next_cursor: Optional[str]):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+def _split(ordering: Sequence[str]):
+    return [(f.lstrip('-'), f.startswith('-')) for f in ordering]
+
+
+def encode_cursor(obj, ordering: Sequence[str]) -> str:
+    values = [getattr(obj, field) for field, _ in _split(ordering)]
+    return signing.dumps([v.isoformat() if hasattr(v, 'isoformat') else v for v in values], salt=CURSOR_SALT)
+
+
+def decode_cursor(token: str, model, ordering: Sequence[str]) -> Optional[list]:
+    """Valeurs du curseur, ou None s'il est absent, altéré ou incompatible."""
+    if not token:
+        return None
+    try:
+        raw = signing.loads(token, salt=CURSOR_SALT)
+        fields = _split(ordering)
+        if len(raw) != len(fields):
+            return None
+        return [model._meta.get_field(field).to_python(value) for (field, _), value in zip(fields, raw)]
+    except (signing.BadSignature, ValidationError, ValueError, TypeError):
+        return None
+
+
+def seek_q(ordering: Sequence[str], values: list) -> Q:
+    """
+    Lignes strictement après `values` dans l'ordre `ordering`.
+
+    (a, b, c) après (x, y, z) :  a > x  OU  (a = x ET b > y)  OU  (a = x ET b = y ET c > z)
+    (« < » pour les colonnes décroissantes)
+    """
+    fields = _split(ordering)
+    condition = Q(pk__in=[])
+    for i, (field, descending) in enumerate(fields):
+        step = Q(**{f'{field}__{"lt" if descending else "gt"}': values[i]})
+        for j, (prev_field, _) in enumerate(fields[:i]):
+            step &= Q(**{prev_field: values[j]})
+        condition |= step
+    return condition
+
+
+def keyset_paginate(queryset, ordering: Sequence[str], cursor: Optional[str] = None,
+                    per_page: int = 25) -> KeysetPage:
+    """
+    Page de `queryset` trié par `ordering`, qui doit se terminer par une clé
+    unique (id) pour que l'ordre soit total.
+    """
+    values = decode_cursor(cursor, queryset.model, ordering)
+    qs = queryset.order_by(*ordering)
+    if values is not None:
+        qs = qs.filter(seek_q(ordering, values))
+
+    rows = list(qs[:per_page + 1])
+    next_cursor = encode_cursor(rows[per_page - 1], ordering) if len(rows) > per_page else None
+    return KeysetPage(rows[:per_page], next_cursor)
+
+
+def approximate_count(queryset, ttl: Optional[int] = None) -> int:
+    """COUNT mis en cache, clé dérivée du SQL : exact au plus `ttl` secondes près."""
+    sql, params = queryset.order_by().query.sql_with_params()
+    key = 'count:' + hashlib.sha1(f'{sql}|{params!r}'.encode('utf-8')).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, ttl if ttl is not None else getattr(settings, 'PAGINATION_COUNT_TTL', 300))
+    return count
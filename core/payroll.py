@@ -0,0 +1,190 @@
+"""
+Paie des professeurs : calcul groupé des heures et instantanés mensuels
+"""
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Iterable, Optional
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q, Sum
+from django.db.models.functions import Coalesce, ExtractMonth
+from django.utils import timezone
+
+from .models import PayrollLine, PayrollRun, Session, SessionException, Teacher
+from .utils import get_month_period
+
+CENTS = Decimal('0.01')
+
+def minutes_to_amount(minutes: int, hourly_rate: Decimal) -> Decimal:
+    """Montant exact au centime : minutes × tarif / 60"""
+    return (Decimal(minutes) * hourly_rate / 60).quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+def _hours_queryset(start_date: date, end_date: date, teacher_ids: Optional[Iterable[int]] = None):
+    """Séances planifiées de la période : hors séances annulées et hors dates
+    annulées par une SessionException (les déplacements sont déjà portés par
+    les horaires de la séance)."""
+    cancelled_exception = SessionException.objects.filter(
+        course_group=OuterRef('group'),
+        date=OuterRef('date'),
+        cancelled=True,
+    )
+    qs = (
+        Session.objects
+        .filter(date__range=[start_date, end_date])
+        .exclude(status='CANCELLED')
+        .exclude(Exists(cancelled_exception))
+    )
+    if teacher_ids is not None:
+        qs = qs.filter(group__teacher_id__in=list(teacher_ids))
+    return qs
+
+
+HOURS_AGGREGATES = {
+    'scheduled_sessions': Count('id'),
+    'scheduled_minutes': Coalesce(Sum('duration_minutes'), 0),
+    'taught_sessions': Count('id', filter=Q(status='DONE')),
+    'taught_minutes': Coalesce(Sum('duration_minutes', filter=Q(status='DONE')), 0),
+    'courses': Count('group', distinct=True),
+}
+
+
+def _hours_row(row) -> Dict:
+    return {
+        'scheduled_sessions': row['scheduled_sessions'],
+        'scheduled_minutes': row['scheduled_minutes'],
+        'taught_sessions': row['taught_sessions'],
+        'taught_minutes': row['taught_minutes'],
+        'courses': row['courses'],
+    }
+
+
+EMPTY_HOURS = {
+    'scheduled_sessions': 0,
+    'scheduled_minutes': 0,
+    'taught_sessions': 0,
+    'taught_minutes': 0,
+    'courses': 0,
+}
+
+
+def minutes_to_hours(minutes: int) -> Decimal:
+    return (Decimal(minutes) / 60).quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+def compute_teacher_hours(start_date: date, end_date: date,
+                          teacher_ids: Optional[Iterable[int]] = None) -> Dict[int, Dict]:
+    """
+    Heures prévues et données pour un ou plusieurs professeurs, en une requête.
+
+    - prévues : séances non annulées de la période (exceptions appliquées)
+    - données : séances terminées (DONE, posé à l'enregistrement des présences)
+
+    Les durées sont des minutes entières : aucun arrondi flottant.
+
+    Returns:
+        {teacher_id: {'scheduled_sessions', 'scheduled_minutes',
+                      'taught_sessions', 'taught_minutes', 'courses'}}
+    """
+    rows = (
+        _hours_queryset(start_date, end_date, teacher_ids)
+        .values('group__teacher')
+        .annotate(**HOURS_AGGREGATES)
+        .order_by()
+    )
+    return {row['group__teacher']: _hours_row(row) for row in rows}
+
+
+def compute_teacher_hours_by_month(year: int,
+                                   teacher_ids: Optional[Iterable[int]] = None) -> Dict[int, Dict[int, Dict]]:
+    """
+    Mode annuel « tous les professeurs × tous les mois » en une seule requête
+    groupée par (professeur, mois). Les mois sans séance valent zéro.
+
+    Returns:
+        {teacher_id: {1: {...}, 2: {...}, ..., 12: {...}}}
+    """
+    rows = (
+        _hours_queryset(date(year, 1, 1), date(year, 12, 31), teacher_ids)
+        .annotate(month=ExtractMonth('date'))
+        .values('group__teacher', 'month')
+        .annotate(**HOURS_AGGREGATES)
+        .order_by()
+    )
+    matrix: Dict[int, Dict[int, Dict]] = {}
+    for row in rows:
+        months = matrix.setdefault(
+            row['group__teacher'], {m: dict(EMPTY_HOURS) for m in range(1, 13)}
+        )
+        months[row['month']] = _hours_row(row)
+    return matrix
+
+
+def parse_month(value: str) -> Optional[date]:
+    """'2025-12' ou '2025-12-01' -> date(2025, 12, 1)"""
+    from datetime import datetime
+
+    for fmt in ('%Y-%m', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt).date().replace(day=1)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def compute_payroll_run(month: date, created_by: str = '') -> PayrollRun:
+    """
+    Calcule (ou recalcule) la paie du mois pour tous les professeurs.
+
+    Une requête agrégée pour les heures (séances DONE), une pour les tarifs, puis un
+    bulk_create des lignes. Refuse de toucher une paie déjà validée.
+    """
+    month = month.replace(day=1)
+    first_day, last_day = get_month_period(month.year, month.month)
+
+    with transaction.atomic():
+        run = PayrollRun.objects.select_for_update().filter(month=month).first()
+        if run is None:
+            run = PayrollRun(month=month, created_by=created_by)
+        elif run.is_approved:
+            raise ValidationError("La paie de ce mois est déjà validée.")
+
+        totals = compute_teacher_hours(first_day, last_day)
+        teachers = Teacher.objects.in_bulk(list(totals))
+
+        lines = []
+        for teacher_id, data in totals.items():
+            if not data['taught_sessions']:
+                continue
+            teacher = teachers[teacher_id]
+            lines.append(PayrollLine(
+                teacher=teacher,
+                sessions_count=data['taught_sessions'],
+                minutes=data['taught_minutes'],
+                hourly_rate=teacher.hourly_rate,
+                amount=minutes_to_amount(data['taught_minutes'], teacher.hourly_rate),
+            ))
+
+        run.total_minutes = sum(line.minutes for line in lines)
+        run.total_amount = sum((line.amount for line in lines), Decimal('0.00'))
+        run.computed_at = timezone.now()
+        run.save()
+
+        run.lines.all().delete()
+        for line in lines:
+            line.run = run
+        PayrollLine.objects.bulk_create(lines)
+
+    return run
+
+
+def approve_payroll_run(run: PayrollRun, approved_by: str = '') -> PayrollRun:
+    """Valide la paie : l'instantané devient immuable."""
+    if run.is_approved:
+        return run
+    run.status = 'APPROVED'
+    run.approved_at = timezone.now()
+    run.approved_by = approved_by
+    run.save()
+    return run
@@ -0,0 +1,272 @@
+"""
+Fiches de paie des professeurs : génération groupée (PDF unique ou ZIP)
+
+Les données d'un mois sont chargées en quelques requêtes puis converties en
+dictionnaires simples (chaînes uniquement) : ils se sérialisent vers les
+processus de rendu et servent aussi d'empreinte pour le cache. Tant que les
+séances, le tarif ou l'instantané de paie d'un professeur ne changent pas, sa
+fiche est relue depuis le cache au lieu d'être redessinée.
+
+Le PDF unique est l'assemblage (pypdf) des fiches individuelles : il profite
+du même cache. Le pool de processus n'est créé que par la commande
+`generate_payslips` (`payslip_pool`) ; une requête web rend les fiches
+manquantes dans son propre processus, sans dupliquer le worker.
+"""
+import hashlib
+import json
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from io import BytesIO
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from pypdf import PdfWriter
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+from .models import PayrollRun, Session, Teacher
+from .payroll import compute_teacher_hours, minutes_to_amount, minutes_to_hours
+from .utils import get_month_period, month_name_fr
+
+CACHE_PREFIX = 'payslip'
+CACHE_TIMEOUT = getattr(settings, 'PAYSLIP_CACHE_TIMEOUT', 60 * 60 * 24 * 7)
+# En dessous de ce nombre de fiches, le démarrage d'un pool coûte plus qu'il ne rapporte
+POOL_MIN_ITEMS = 4
+
+
+# ==================== DONNÉES ====================
+
+def collect_payslip_data(month: date) -> List[Dict]:
+    """
+    Données de toutes les fiches du mois, triées par nom de professeur.
+
+    Requêtes : heures groupées, professeurs, paie validée éventuelle, détail
+    des séances DONE. Si la paie du mois est validée, les montants viennent
+    de l'instantané et non d'un recalcul.
+    """
+    month = month.replace(day=1)
+    first_day, last_day = get_month_period(month.year, month.month)
+
+    hours = compute_teacher_hours(first_day, last_day)
+
+    run = PayrollRun.objects.filter(month=month, status='APPROVED').first()
+    snapshot = {line.teacher_id: line for line in run.lines.all()} if run else {}
+
+    teachers = Teacher.objects.in_bulk(set(hours) | set(snapshot))
+
+    sessions_by_teacher: Dict[int, List] = {}
+    done_sessions = (
+        Session.objects
+        .filter(date__range=[first_day, last_day], status='DONE')
+        .order_by('date', 'start_time')
+        .values_list('group__teacher_id', 'date', 'start_time', 'end_time', 'group__name', 'duration_minutes')
+    )
+    for teacher_id, day, start, end, group_name, minutes in done_sessions:
+        sessions_by_teacher.setdefault(teacher_id, []).append([
+            day.strftime('%d/%m'),
+            group_name,
+            f"{start.strftime('%H:%M')}-{end.strftime('%H:%M')}",
+            str(minutes_to_hours(minutes)),
+        ])
+
+    school = {
+        'name': getattr(settings, 'SCHOOL_NAME', ''),
+        'address': getattr(settings, 'SCHOOL_ADDRESS', ''),
+        'phone': getattr(settings, 'SCHOOL_PHONE', ''),
+    }
+    month_label = f"{month_name_fr(month.month)} {month.year}"
+    period = f"{first_day.strftime('%d/%m/%Y')} - {last_day.strftime('%d/%m/%Y')}"
+
+    payloads = []
+    for teacher_id, teacher in teachers.items():
+        data = hours.get(teacher_id, {})
+        line = snapshot.get(teacher_id)
+        if line is not None:
+            taught_minutes, sessions_count = line.minutes, line.sessions_count
+            hourly_rate, amount = line.hourly_rate, line.amount
+        else:
+            taught_minutes, sessions_count = data.get('taught_minutes', 0), data.get('taught_sessions', 0)
+            hourly_rate = teacher.hourly_rate
+            amount = minutes_to_amount(taught_minutes, hourly_rate)
+
+        payloads.append({
+            'teacher_id': teacher_id,
+            'teacher_name': teacher.name,
+            'teacher_phone': teacher.phone,
+            'month': month.strftime('%Y-%m'),
+            'month_label': month_label,
+            'period': period,
+            'school': school,
+            'approved': line is not None,
+            'hourly_rate': str(hourly_rate),
+            'scheduled_hours': str(minutes_to_hours(data.get('scheduled_minutes', 0))),
+            'taught_hours': str(minutes_to_hours(taught_minutes)),
+            'sessions_count': sessions_count,
+            'amount': str(amount),
+            'sessions': sessions_by_teacher.get(teacher_id, []),
+        })
+
+    payloads.sort(key=lambda p: p['teacher_name'])
+    return payloads
+
+
+def payslip_fingerprint(payload: Dict) -> str:
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _cache_key(payload: Dict) -> str:
+    return f"{CACHE_PREFIX}:{payload['teacher_id']}:{payload['month']}:{payslip_fingerprint(payload)}"
+
+
+# ==================== RENDU ====================
+
+def _draw_payslip(p, data: Dict):
+    """Dessine la fiche d'un professeur (une page, plus si le détail déborde)."""
+    width, height = A4
+
+    def header():
+        p.setFont("Helvetica-Bold", 14)
+        p.drawString(40, height - 50, data['school']['name'])
+        p.setFont("Helvetica", 9)
+        p.drawString(40, height - 64, data['school']['address'])
+        p.drawString(40, height - 76, data['school']['phone'])
+        p.setFont("Helvetica-Bold", 16)
+        p.drawRightString(width - 40, height - 50, "FICHE DE PAIE")
+        p.setFont("Helvetica", 10)
+        p.drawRightString(width - 40, height - 66, data['month_label'])
+        p.line(40, height - 90, width - 40, height - 90)
+
+    header()
+
+    y = height - 115
+    p.setFont("Helvetica-Bold", 11)
+    p.drawString(40, y, "PROFESSEUR :")
+    p.setFont("Helvetica", 10)
+    p.drawString(140, y, data['teacher_name'])
+    y -= 15
+    p.drawString(140, y, f"Tél. : {data['teacher_phone']}")
+    y -= 15
+    p.drawString(140, y, f"Période : {data['period']}")
+    y -= 15
+    p.drawString(140, y, f"Tarif horaire : {data['hourly_rate']} DH")
+
+    y -= 30
+    p.setFont("Helvetica-Bold", 10)
+    p.drawString(40, y, "Date")
+    p.drawString(100, y, "Groupe")
+    p.drawString(360, y, "Horaire")
+    p.drawRightString(width - 40, y, "Heures")
+    y -= 5
+    p.line(40, y, width - 40, y)
+
+    p.setFont("Helvetica", 9)
+    for day, group_name, slot, hours in data['sessions']:
+        y -= 14
+        if y < 120:
+            p.showPage()
+            header()
+            y = height - 115
+            p.setFont("Helvetica", 9)
+        p.drawString(40, y, day)
+        p.drawString(100, y, group_name[:45])
+        p.drawString(360, y, slot)
+        p.drawRightString(width - 40, y, hours)
+
+    y -= 20
+    p.line(40, y, width - 40, y)
+    y -= 20
+    p.setFont("Helvetica", 10)
+    p.drawString(40, y, f"Séances données : {data['sessions_count']}")
+    p.drawString(250, y, f"Heures prévues : {data['scheduled_hours']} h")
+    p.drawRightString(width - 40, y, f"Heures données : {data['taught_hours']} h")
+    y -= 30
+    p.setFont("Helvetica-Bold", 14)
+    p.drawString(40, y, "NET À PAYER :")
+    p.drawRightString(width - 40, y, f"{data['amount']} DH")
+
+    p.setFont("Helvetica-Oblique", 8)
+    if data['approved']:
+        p.drawCentredString(width / 2, 40, "Paie validée")
+    else:
+        p.drawCentredString(width / 2, 40, "Brouillon - paie non validée")
+    p.showPage()
+
+
+def render_payslip_pdf(data: Dict) -> bytes:
+    """PDF d'une seule fiche. Fonction de module : exécutable dans un processus du pool."""
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer, pagesize=A4)
+    p.setTitle(f"Fiche de paie {data['teacher_name']} {data['month']}")
+    _draw_payslip(p, data)
+    p.save()
+    return buffer.getvalue()
+
+
+def _workers() -> int:
+    return getattr(settings, 'PAYSLIP_WORKERS', None) or os.cpu_count() or 1
+
+
+def payslip_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Pool de rendu pour la commande generate_payslips (None sur une seule CPU).
+
+    À ne pas créer dans une requête web : le pool duplique le worker WSGI.
+    """
+    workers = _workers()
+    return ProcessPoolExecutor(max_workers=workers) if workers >= 2 else None
+
+
+def _render_many(payloads: List[Dict], executor: Optional[ProcessPoolExecutor] = None) -> List[bytes]:
+    if executor is None or len(payloads) < POOL_MIN_ITEMS:
+        return [render_payslip_pdf(p) for p in payloads]
+    chunksize = max(1, len(payloads) // (_workers() * 4))
+    return list(executor.map(render_payslip_pdf, payloads, chunksize=chunksize))
+
+
+def render_payslips(payloads: List[Dict], executor: Optional[ProcessPoolExecutor] = None) -> List[bytes]:
+    """
+    PDF de chaque fiche, dans l'ordre des payloads.
+
+    Les fiches en cache sont relues, seules les autres sont rendues (dans
+    `executor` s'il est fourni, sinon dans le processus courant).
+    """
+    keys = [_cache_key(p) for p in payloads]
+    cached = cache.get_many(keys)
+
+    missing = [(key, p) for key, p in zip(keys, payloads) if key not in cached]
+    if missing:
+        rendered = _render_many([p for _, p in missing], executor)
+        fresh = {key: pdf for (key, _), pdf in zip(missing, rendered)}
+        cache.set_many(fresh, CACHE_TIMEOUT)
+        cached.update(fresh)
+
+    return [cached[key] for key in keys]
+
+
+def build_payslips_pdf(payloads: List[Dict], executor: Optional[ProcessPoolExecutor] = None) -> bytes:
+    """
+    Toutes les fiches dans un seul PDF : les fiches individuelles (cache puis
+    rendu des manquantes) sont assemblées dans l'ordre des payloads.
+    """
+    month = payloads[0]['month'] if payloads else ''
+    writer = PdfWriter()
+    for pdf in render_payslips(payloads, executor):
+        writer.append(BytesIO(pdf))
+    writer.add_metadata({'/Title': f"Fiches de paie {month}"})
+
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def build_payslips_zip(payloads: List[Dict], executor: Optional[ProcessPoolExecutor] = None) -> bytes:
+    """Une fiche PDF par professeur dans une archive ZIP."""
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for data, pdf in zip(payloads, render_payslips(payloads, executor)):
+            slug = ''.join(c if c.isalnum() else '_' for c in data['teacher_name']).strip('_')
+            archive.writestr(f"fiche_paie_{data['month']}_{slug}.pdf", pdf)
+    return buffer.getvalue()
@@ -0,0 +1,163 @@
+"""
+Numéros de téléphone normalisés
+
+Les téléphones sont saisis librement (« 06 12-34 56 78 », « +212612345678 »).
+Chaque champ téléphone a deux colonnes dérivées, indexées et tenues à jour à
+l'enregistrement :
+
+- `<champ>_e164` : format E.164 (« +212612345678 »), pour l'égalité exacte,
+  la recherche par le début du numéro et les regroupements (fratries
+  partageant le numéro du parent) ;
+- `<champ>_rev`  : chiffres E.164 inversés (« 876543216212 »), pour chercher
+  par les derniers chiffres avec un simple intervalle sur l'index.
+"""
+import re
+from typing import Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Q
+
+MIN_SUFFIX_DIGITS = 4
+# Un numéro complet (indicatif compris) compte au moins 11 chiffres au Maroc
+MIN_FULL_DIGITS = 11
+# E.164 : 15 chiffres au plus (colonnes `_e164` / `_rev` de 16 caractères)
+MAX_E164_DIGITS = 15
+
+
+def default_country_code() -> str:
+    return getattr(settings, 'PHONE_DEFAULT_COUNTRY_CODE', '212')
+
+
+def normalize_phone(raw: Optional[str]) -> str:
+    """
+    Format E.164, ou '' si le texte ne contient pas de numéro exploitable
+    (trop court, ou trop long : deux numéros dans le même champ...).
+
+    >>> normalize_phone('06 12-34 56 78')
+    '+212612345678'
+    >>> normalize_phone('00212 612345678')
+    '+212612345678'
+    >>> normalize_phone('0612345678 / 0698765432')
+    ''
+    """
+    raw = (raw or '').strip()
+    digits = re.sub(r'\D', '', raw)
+    if len(digits) < 6:
+        return ''
+
+    country = default_country_code()
+    if raw.startswith('+'):
+        e164 = '+' + digits
+    elif digits.startswith('00'):
+        e164 = '+' + digits[2:]
+    elif digits.startswith('0'):
+        e164 = '+' + country + digits[1:]
+    elif digits.startswith(country) and len(digits) > 9:
+        e164 = '+' + digits
+    else:
+        e164 = '+' + country + digits
+    return e164 if len(e164) - 1 <= MAX_E164_DIGITS else ''
+
+
+def reversed_digits(e164: str) -> str:
+    return e164.lstrip('+')[::-1]
+
+
+def phone_index_values(raw: Optional[str]) -> Tuple[str, str]:
+    """(e164, chiffres inversés) pour les colonnes dérivées."""
+    e164 = normalize_phone(raw)
+    return e164, reversed_digits(e164)
+
+
+def sync_phone_columns(obj, fields: Iterable[str]):
+    """Recalcule `<champ>_e164` / `<champ>_rev` de l'objet pour chaque champ téléphone."""
+    for field in fields:
+        e164, rev = phone_index_values(getattr(obj, field))
+        setattr(obj, f'{field}_e164', e164)
+        setattr(obj, f'{field}_rev', rev)
+
+
+def derived_phone_fields(fields: Iterable[str]) -> list:
+    return [f'{field}_{suffix}' for field in fields for suffix in ('e164', 'rev')]
+
+
+def looks_like_phone(query: str) -> bool:
+    """Saisie composée (presque) uniquement de chiffres : au moins 4 chiffres."""
+    query = (query or '').strip()
+    digits = re.sub(r'\D', '', query)
+    return len(digits) >= MIN_SUFFIX_DIGITS and not re.search(r'[^\d\s+\-./()]', query)
+
+
+def phone_prefixes(query: str) -> List[str]:
+    """
+    Débuts possibles du numéro E.164 pour une saisie partielle tapée depuis
+    le début (« 0612 » -> « +212612 »). Sans 0 ni + en tête, les chiffres
+    peuvent être le numéro national (« 6123 ») ou commencer par l'indicatif.
+
+    >>> phone_prefixes('06 12')
+    ['+212612']
+    """
+    query = (query or '').strip()
+    digits = re.sub(r'\D', '', query)
+    if not digits:
+        return []
+    country = default_country_code()
+    if query.startswith('+'):
+        return ['+' + digits]
+    if digits.startswith('00'):
+        return ['+' + digits[2:]] if len(digits) > 2 else []
+    if digits.startswith('0'):
+        return ['+' + country + digits[1:]]
+    prefixes = ['+' + country + digits]
+    if digits.startswith(country):
+        prefixes.append('+' + digits)
+    return prefixes
+
+
+def phone_lookup_q(query: str, fields: Iterable[str] = ('parent_contact', 'phone')) -> Q:
+    """
+    Condition indexée sur les colonnes dérivées.
+
+    Numéro complet -> égalité sur `_e164`. Sinon, les chiffres saisis peuvent
+    être le début du numéro : intervalle [préfixe, préfixe + ':') sur `_e164`
+    (':' suit '9' en ASCII) ; ou sa fin : même intervalle sur `_rev` avec les
+    chiffres inversés. Les deux utilisent l'index B-tree (LIKE 'x%' non).
+    """
+    digits = re.sub(r'\D', '', query or '')
+    condition = Q(pk__in=[])
+    if len(digits) < MIN_SUFFIX_DIGITS:
+        return condition
+
+    e164 = normalize_phone(query)
+    full = len(e164) - 1 >= MIN_FULL_DIGITS and (query.strip().startswith(('+', '0')) or len(digits) >= MIN_FULL_DIGITS)
+    prefixes = [] if full else phone_prefixes(query)
+    for field in fields:
+        if full:
+            condition |= Q(**{f'{field}_e164': e164})
+            continue
+        rev = digits[::-1]
+        condition |= Q(**{f'{field}_rev__gte': rev, f'{field}_rev__lt': rev + ':'})
+        for prefix in prefixes:
+            condition |= Q(**{f'{field}_e164__gte': prefix, f'{field}_e164__lt': prefix + ':'})
+    return condition
+
+
+def duplicate_parent_contacts(queryset=None):
+    """
+    Numéros de parent partagés par plusieurs élèves (fratries), en un GROUP BY.
+
+    Returns:
+        QuerySet de dicts {'parent_contact_e164', 'students'} triés par nombre d'élèves
+    """
+    from django.db.models import Count
+    from .models import Student
+
+    if queryset is None:
+        queryset = Student.objects.filter(is_active=True)
+    return (
+        queryset.exclude(parent_contact_e164='')
+        .values('parent_contact_e164')
+        .annotate(students=Count('id'))
+        .filter(students__gt=1)
+        .order_by('-students', 'parent_contact_e164')
+    )
@@ -0,0 +1,157 @@
+"""
+Rappels de séance programmés
+
+La page « Rappel de séance » prépare les messages d'une séance à la fois.
+`schedule_session_reminders()` traite d'un coup toutes les séances prévues
+dans les SESSION_REMINDER_HOURS prochaines heures :
+
+1. une requête pour les séances de la fenêtre (groupe, salle, professeur) ;
+2. une requête pour les inscriptions actives de tous leurs groupes, avec
+   l'élève ;
+3. messages rendus avec le modèle 'session_reminder' (langue du parent) ;
+4. rappels déjà en file écartés par leur clé
+   (« session_reminder:<séance>:<élève> », la même que la page), puis mise en
+   file dans la boîte d'envoi (core.outbox).
+
+Lancé périodiquement par `manage.py send_session_reminders` (cron, toutes les
+heures) : une séance est rappelée une seule fois, au premier passage qui la
+trouve dans la fenêtre.
+"""
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+
+from .message_templates import message_renderer
+
+
+def reminder_hours() -> int:
+    return getattr(settings, 'SESSION_REMINDER_HOURS', 24)
+
+
+def session_reminder_key(session_id: int, student_id: int) -> str:
+    return f"session_reminder:{session_id}:{student_id}"
+
+
+def _window(start: datetime, end: datetime) -> Q:
+    """Séances dont (date, start_time) est dans [start, end[ (date et heure séparées en base)."""
+    if start.date() == end.date():
+        return Q(date=start.date(), start_time__gte=start.time(), start_time__lt=end.time())
+    return (
+        Q(date=start.date(), start_time__gte=start.time())
+        | Q(date__gt=start.date(), date__lt=end.date())
+        | Q(date=end.date(), start_time__lt=end.time())
+    )
+
+
+def active_enrollments_prefetch() -> Prefetch:
+    """Inscriptions actives d'élèves actifs joignables, dans `group.active_enrollments`."""
+    from .models import Enrollment
+
+    return Prefetch(
+        'group__enrollment_set',
+        queryset=(
+            Enrollment.objects.filter(is_active=True, student__is_active=True)
+            .exclude(student__parent_contact='')
+            .select_related('student')
+            .order_by('student__name')
+        ),
+        to_attr='active_enrollments',
+    )
+
+
+def upcoming_sessions(hours: Optional[int] = None, now: Optional[datetime] = None):
+    """Séances prévues (PLANNED) qui commencent dans les `hours` prochaines heures."""
+    from .models import Session
+
+    now = now or timezone.now()
+    if timezone.is_aware(now):
+        now = timezone.localtime(now)
+    end = now + timedelta(hours=hours if hours is not None else reminder_hours())
+    return (
+        Session.objects.filter(_window(now, end), status='PLANNED')
+        .select_related('group', 'group__teacher', 'group__room', 'room')
+        .prefetch_related(active_enrollments_prefetch())
+        .order_by('date', 'start_time', 'pk')
+    )
+
+
+def session_reminder_contacts(session, render: Optional[Callable] = None) -> List[Dict]:
+    """
+    Un contact par élève actif du groupe : variables du modèle
+    'session_reminder', 'phone', 'student' et 'message'.
+
+    Utilise `group.active_enrollments` s'il a été préchargé (upcoming_sessions),
+    sinon fait une requête.
+    """
+    group = session.group
+    enrollments = getattr(group, 'active_enrollments', None)
+    if enrollments is None:
+        enrollments = active_enrollments_prefetch().queryset.filter(course_group=group)
+    render = render or message_renderer('session_reminder')
+    room = session.room or group.room
+
+    contacts = []
+    for enrollment in enrollments:
+        student = enrollment.student
+        contact = {
+            'phone': student.parent_contact,
+            'name': student.parent_name or 'Parent',
+            'student_name': student.name,
+            'course_name': group.name,
+            'date': session.date.strftime('%d/%m/%Y'),
+            'time': session.start_time.strftime('%H:%M'),
+            'room': room.name,
+            'teacher': group.teacher.name,
+        }
+        contact['message'] = render(contact, student.message_language)
+        contact['student'] = student
+        contacts.append(contact)
+    return contacts
+
+
+def schedule_session_reminders(hours: Optional[int] = None, now: Optional[datetime] = None,
+                               dry_run: bool = False, batch_size: int = 500) -> Dict[str, int]:
+    """
+    Met en file les rappels des séances des `hours` prochaines heures qui ne
+    l'ont pas déjà été.
+
+    Returns:
+        {'sessions': n, 'reminders': n, 'already_queued': n, 'queued': n}
+        (`queued` reste à 0 avec dry_run)
+    """
+    from .models import OutboundMessage
+    from .outbox import enqueue_messages
+
+    render = message_renderer('session_reminder')
+    sessions = list(upcoming_sessions(hours, now))
+
+    items = []
+    for session in sessions:
+        for contact in session_reminder_contacts(session, render):
+            items.append({
+                'to': contact['phone'],
+                'body': contact['message'],
+                'student': contact['student'],
+                'dedupe_key': session_reminder_key(session.pk, contact['student'].pk),
+            })
+
+    keys = [item['dedupe_key'] for item in items]
+    existing = set()
+    for start in range(0, len(keys), batch_size):
+        existing.update(OutboundMessage.objects.filter(
+            dedupe_key__in=keys[start:start + batch_size]
+        ).values_list('dedupe_key', flat=True))
+    pending = [item for item in items if item['dedupe_key'] not in existing]
+
+    queued = 0
+    if not dry_run and pending:
+        queued = enqueue_messages(pending, kind='SESSION_REMINDER', batch_size=batch_size)
+    return {
+        'sessions': len(sessions),
+        'reminders': len(items),
+        'already_queued': len(items) - len(pending),
+        'queued': queued,
+    }
@@ -0,0 +1,232 @@
+"""
+Recherche plein texte des élèves (SQLite FTS5)
+
+La table virtuelle `core_student_fts` (rowid = id de l'élève) contient le nom,
+le nom du parent et les téléphones sous forme normalisée :
+
+- accents retirés et minuscules : « Aïcha » -> « aicha »
+- lettres doublées réduites : « Mohammed » -> « mohamed »
+- noms composés aussi indexés collés : « El Amrani » -> « el amrani elamrani »
+- téléphones en chiffres, avec et sans indicatif / zéro initial
+
+La requête subit la même normalisation et chaque mot est cherché en préfixe ;
+les résultats sont classés par bm25 (le nom pèse plus que le parent).
+
+Une saisie qui ressemble à un numéro (chiffres, espaces, +, tirets) passe
+par les colonnes téléphone indexées (core.phones) : numéro complet ou
+derniers chiffres, sur tout moteur de base de données.
+
+La table est tenue à jour par les signaux de Student (core.signals) ; les
+écritures en masse se rattrapent avec `manage.py rebuild_student_search`.
+Hors SQLite (ou sans FTS5), la recherche retombe sur des icontains.
+"""
+import re
+import unicodedata
+from typing import List, Optional
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .phones import looks_like_phone, phone_lookup_q
+
+FTS_TABLE = 'core_student_fts'
+# Poids bm25 par colonne : name, parent_name, phones
+FTS_WEIGHTS = (10.0, 3.0, 1.0)
+
+_available: Optional[bool] = None
+
+
+# ==================== NORMALISATION ====================
+
+def fold(text: str) -> str:
+    """Minuscules sans accents, ponctuation remplacée par des espaces."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    text = re.sub(r'[^a-z0-9؀-ۿ]+', ' ', text)
+    # Variantes de transcription les plus courantes : lettres doublées
+    text = re.sub(r'([a-z])\1+', r'\1', text)
+    return text.strip()
+
+
+def name_terms(text: str) -> List[str]:
+    """Mots du nom, plus chaque paire de mots voisins collée (« el amrani » -> « elamrani »)."""
+    words = fold(text).split()
+    joined = [a + b for a, b in zip(words, words[1:])]
+    if len(words) > 2:
+        joined.append(''.join(words))
+    return words + joined
+
+
+def phone_terms(*phones: str) -> List[str]:
+    """Chiffres du numéro, avec et sans indicatif 212 / zéro initial."""
+    terms = []
+    for phone in phones:
+        digits = re.sub(r'\D', '', phone or '')
+        if not digits:
+            continue
+        terms.append(digits)
+        local = re.sub(r'^(00)?212', '', digits).lstrip('0')
+        if local and local != digits:
+            terms.extend([local, '0' + local])
+    return list(dict.fromkeys(terms))
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """
+    Expression MATCH FTS5 : tous les mots en préfixe, OU la requête collée.
+
+    « El Amrani » -> (el* AND amrani*) OR elamrani*
+    """
+    words = fold(query).split()
+    if not words:
+        return None
+
+    terms = ' AND '.join(f'"{w}"*' for w in words)
+    if len(words) > 1:
+        return f'({terms}) OR "{"".join(words)}"*'
+    return terms
+
+
+# ==================== INDEX ====================
+
+def reset_fts_available():
+    global _available
+    _available = None
+
+
+def fts_available() -> bool:
+    global _available
+    if _available is None:
+        if connection.vendor != 'sqlite':
+            _available = False
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+                _available = cursor.fetchone() is not None
+    return _available
+
+
+def _row(student):
+    return (
+        student.pk,
+        ' '.join(name_terms(student.name)),
+        ' '.join(name_terms(student.parent_name)),
+        ' '.join(phone_terms(student.parent_contact, student.phone)),
+    )
+
+
+def index_student(student):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [student.pk])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, parent_name, phones) VALUES (%s, %s, %s, %s)",
+            _row(student),
+        )
+
+
+def unindex_student(student_id: int):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [student_id])
+
+
+def rebuild_index(students=None, batch_size: int = 2000) -> int:
+    """Réindexe tous les élèves (ou ceux donnés). Retourne le nombre de lignes."""
+    from .models import Student
+
+    if not fts_available():
+        return 0
+    if students is None:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        students = Student.objects.only('pk', 'name', 'parent_name', 'parent_contact', 'phone').order_by('pk')
+        rows_iter = students.iterator(chunk_size=batch_size)
+    else:
+        students = list(students)
+        rows_iter = iter(students)
+        with connection.cursor() as cursor:
+            ids = [s.pk for s in students]
+            for i in range(0, len(ids), batch_size):
+                chunk = ids[i:i + batch_size]
+                cursor.execute(
+                    f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(chunk))})", chunk
+                )
+
+    count = 0
+    batch = []
+    with connection.cursor() as cursor:
+        for student in rows_iter:
+            batch.append(_row(student))
+            if len(batch) >= batch_size:
+                cursor.executemany(
+                    f"INSERT INTO {FTS_TABLE} (rowid, name, parent_name, phones) VALUES (%s, %s, %s, %s)", batch
+                )
+                count += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, parent_name, phones) VALUES (%s, %s, %s, %s)", batch
+            )
+            count += len(batch)
+    return count
+
+
+# ==================== RECHERCHE ====================
+
+def _fallback_q(query: str) -> Q:
+    return (
+        Q(name__icontains=query) |
+        Q(parent_contact__icontains=query) |
+        Q(parent_name__icontains=query) |
+        Q(phone__icontains=query)
+    )
+
+
+def filter_students(queryset, query: str):
+    """Restreint un queryset d'élèves à la recherche (ordre du queryset conservé)."""
+    query = (query or '').strip()
+    if not query:
+        return queryset
+    if looks_like_phone(query):
+        return queryset.filter(phone_lookup_q(query))
+    match = build_match_query(query) if fts_available() else None
+    if match is None:
+        return queryset.filter(_fallback_q(query))
+    return queryset.filter(
+        pk__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+    )
+
+
+def search_students(query: str, queryset=None, limit: int = 20) -> List:
+    """Élèves les plus pertinents pour une saisie au clavier, classés par bm25."""
+    from .models import Student
+
+    if queryset is None:
+        queryset = Student.objects.all()
+    query = (query or '').strip()
+    if not query:
+        return list(queryset[:limit])
+    if looks_like_phone(query):
+        # Cas le plus courant en caisse : le téléphone du parent
+        return list(queryset.filter(phone_lookup_q(query))[:limit])
+
+    match = build_match_query(query) if fts_available() else None
+    if match is None:
+        return list(queryset.filter(_fallback_q(query))[:limit])
+
+    # Sur-échantillonner : le queryset peut encore filtrer (élèves inactifs...)
+    weights = ', '.join(str(w) for w in FTS_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s",
+            [match, limit * 5],
+        )
+        ranked_ids = [row[0] for row in cursor.fetchall()]
+
+    students = queryset.in_bulk(ranked_ids)
+    return [students[pk] for pk in ranked_ids if pk in students][:limit]
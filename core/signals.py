@@ -0,0 +1,155 @@
+"""
+Invalidation du cache du tableau de bord, des fragments de template, des
+index de recherche et des textes de messages compilés sur écriture ;
+suppression des fichiers d'export
+
+L'invalidation est différée à la validation de la transaction : sinon une
+requête concurrente pourrait recalculer (et remettre en cache) l'état d'avant.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_migrate, post_save
+
+from .caching import bump_fragment_generation, invalidate_sections
+from .message_templates import bump_templates_version
+from .omnisearch import bump_version
+from .search import index_student, rebuild_index, reset_fts_available, unindex_student
+from .models import CourseGroup, Enrollment, ExportJob, MessageTemplate, Payment, Room, Session, Student, Teacher
+
+# Sections du tableau de bord dépendant de chaque modèle
+DASHBOARD_DEPENDENCIES = {
+    Payment: ('revenue', 'unpaid'),
+    Enrollment: ('unpaid',),
+    CourseGroup: ('counts', 'unpaid', 'conflicts', 'today'),
+    Student: ('counts', 'unpaid'),
+    Teacher: ('counts',),
+    Room: ('counts', 'conflicts'),
+    Session: ('today',),
+}
+
+# Type de la recherche globale (core.omnisearch) touché par chaque modèle
+OMNISEARCH_DEPENDENCIES = {
+    Student: 'student',
+    Teacher: 'teacher',
+    CourseGroup: 'group',
+    Room: 'room',
+    Payment: 'receipt',
+}
+
+
+def invalidate_dashboard(sender, **kwargs):
+    sections = DASHBOARD_DEPENDENCIES.get(sender)
+    if sections:
+        transaction.on_commit(lambda: invalidate_sections(sections))
+
+
+# Fragments de template : ligne affichée (modèle, champ) dont la version change
+ROW_VERSION_DEPENDENCIES = {
+    Student: (Student, 'pk'),
+    Enrollment: (Student, 'student_id'),
+    Payment: (Student, 'student_id'),
+    Session: (Session, 'pk'),
+}
+
+# Objets partagés par de nombreuses lignes : périmer tout le type de fragment
+FRAGMENT_DEPENDENCIES = {
+    CourseGroup: ('student_card', 'student_row', 'schedule_cell'),
+    Teacher: ('schedule_cell',),
+    Room: ('schedule_cell',),
+    Enrollment: ('schedule_cell',),
+}
+
+
+def bump_row_version(sender, instance, **kwargs):
+    model, attr = ROW_VERSION_DEPENDENCIES[sender]
+    model.objects.filter(pk=getattr(instance, attr)).update(version=F('version') + 1)
+
+
+def invalidate_fragments(sender, **kwargs):
+    kinds = FRAGMENT_DEPENDENCIES.get(sender)
+    if kinds:
+        transaction.on_commit(lambda: bump_fragment_generation(kinds))
+
+
+def invalidate_omnisearch(sender, **kwargs):
+    entity_type = OMNISEARCH_DEPENDENCIES.get(sender)
+    if entity_type:
+        transaction.on_commit(lambda: bump_version(entity_type))
+
+
+def update_student_search(sender, instance, **kwargs):
+    index_student(instance)
+
+
+def remove_student_search(sender, instance, **kwargs):
+    unindex_student(instance.pk)
+
+
+def reset_student_search(sender, **kwargs):
+    # La migration 0009 crée (ou non) la table FTS : revérifier sa présence
+    reset_fts_available()
+
+
+def invalidate_message_templates(sender, **kwargs):
+    transaction.on_commit(bump_templates_version)
+
+
+def delete_export_file(sender, instance, **kwargs):
+    if instance.file:
+        transaction.on_commit(lambda: instance.file.delete(save=False))
+
+
+def refresh_after_bulk_write(model, instances, batch_size: int = 2000):
+    """
+    Équivalent des signaux pour une écriture en masse (bulk_create /
+    bulk_update n'en émettent pas) : caches, versions de lignes et index
+    plein texte, en quelques requêtes pour tout le lot.
+    """
+    instances = list(instances)
+    if not instances:
+        return
+    invalidate_dashboard(model)
+    invalidate_omnisearch(model)
+    invalidate_fragments(model)
+
+    if model in ROW_VERSION_DEPENDENCIES:
+        target, attr = ROW_VERSION_DEPENDENCIES[model]
+        ids = sorted({getattr(obj, attr) for obj in instances})
+        for i in range(0, len(ids), batch_size):
+            target.objects.filter(pk__in=ids[i:i + batch_size]).update(version=F('version') + 1)
+
+    if model is Student:
+        rebuild_index(instances, batch_size=batch_size)
+
+
+def connect_signals():
+    for model in DASHBOARD_DEPENDENCIES:
+        post_save.connect(invalidate_dashboard, sender=model, dispatch_uid=f'dashboard_save_{model.__name__}')
+        post_delete.connect(invalidate_dashboard, sender=model, dispatch_uid=f'dashboard_delete_{model.__name__}')
+
+    for model in OMNISEARCH_DEPENDENCIES:
+        post_save.connect(invalidate_omnisearch, sender=model, dispatch_uid=f'omnisearch_save_{model.__name__}')
+        post_delete.connect(invalidate_omnisearch, sender=model, dispatch_uid=f'omnisearch_delete_{model.__name__}')
+
+    for model, (target, _) in ROW_VERSION_DEPENDENCIES.items():
+        # Student et Session incrémentent leur propre version dans save()
+        if target is model:
+            continue
+        post_save.connect(bump_row_version, sender=model, dispatch_uid=f'row_version_save_{model.__name__}')
+        post_delete.connect(bump_row_version, sender=model, dispatch_uid=f'row_version_delete_{model.__name__}')
+
+    for model in FRAGMENT_DEPENDENCIES:
+        post_save.connect(invalidate_fragments, sender=model, dispatch_uid=f'fragments_save_{model.__name__}')
+        post_delete.connect(invalidate_fragments, sender=model, dispatch_uid=f'fragments_delete_{model.__name__}')
+
+    # Index plein texte des élèves (core.search)
+    post_save.connect(update_student_search, sender=Student, dispatch_uid='student_search_save')
+    post_delete.connect(remove_student_search, sender=Student, dispatch_uid='student_search_delete')
+    post_migrate.connect(reset_student_search, dispatch_uid='student_search_migrate')
+
+    # Textes compilés des messages (core.message_templates)
+    post_save.connect(invalidate_message_templates, sender=MessageTemplate, dispatch_uid='message_templates_save')
+    post_delete.connect(invalidate_message_templates, sender=MessageTemplate, dispatch_uid='message_templates_delete')
+
+    # Fichier d'un export en arrière-plan (core.exports), aussi en suppression groupée
+    post_delete.connect(delete_export_file, sender=ExportJob, dispatch_uid='export_job_file_delete')
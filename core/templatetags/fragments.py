@@ -0,0 +1,60 @@
+from django import template
+
+from core.caching import cached_fragment, fragment_key, get_fragment_generation
+
+register = template.Library()
+
+
+def _get(obj, name):
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+class VersionedCacheNode(template.Node):
+    def __init__(self, nodelist, kind, obj, vary):
+        self.nodelist = nodelist
+        self.kind = kind
+        self.obj = obj
+        self.vary = vary
+
+    def render(self, context):
+        kind = self.kind.resolve(context)
+        obj = self.obj.resolve(context)
+        vary = [v.resolve(context) for v in self.vary]
+
+        # Une lecture de génération par type et par rendu de page
+        generations = context.render_context.setdefault(self, {})
+        if kind not in generations:
+            generations[kind] = get_fragment_generation(kind)
+
+        key = fragment_key(kind, generations[kind], _get(obj, 'id'), _get(obj, 'version'), vary)
+        return cached_fragment(kind, key, lambda: self.nodelist.render(context))
+
+
+@register.tag
+def versioned_cache(parser, token):
+    """
+    Met en cache le rendu d'une ligne tant que sa version ne change pas.
+
+    Usage:
+        {% load fragments %}
+        {% versioned_cache 'student_card' student %}...{% endversioned_cache %}
+        {% versioned_cache 'schedule_cell' session view_mode %}...{% endversioned_cache %}
+
+    `student` / `session` : objet ou dict avec `id` et `version` ; les
+    arguments suivants s'ajoutent à la clé.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' tag requires a fragment type and an object with id and version."
+        )
+    nodelist = parser.parse(('endversioned_cache',))
+    parser.delete_first_token()
+    return VersionedCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        parser.compile_filter(bits[2]),
+        [parser.compile_filter(b) for b in bits[3:]],
+    )
@@ -1,3 +1,489 @@
+from datetime import time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import CourseGroup, Enrollment, Payment, Room, Session, Student, Teacher
+
+
+class AdminChangelistQueryCountTests(TestCase):
+    """Les listes de l'admin ne font pas de requête par ligne."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pass')
+        teacher = Teacher.objects.create(name='Prof Test', phone='0612345678', hourly_rate=Decimal('100'))
+        room = Room.objects.create(name='Salle 1', capacity=30)
+        cls.groups = [
+            CourseGroup.objects.create(
+                name=f'Groupe {i}', subject='Maths', level='2BAC', monthly_price=Decimal('200'),
+                teacher=teacher, room=room, schedule_day=CourseGroup.DAYS_CHOICES[i][0],
+                start_time=time(8 + 2 * i, 0), end_time=time(9 + 2 * i, 0),
+            )
+            for i in range(4)
+        ]
+        cls.month = timezone.now().date().replace(day=1)
+
+    def create_rows(self, count):
+        offset = Student.objects.count()
+        students = Student.objects.bulk_create([
+            Student(name=f'Élève {offset + i:03}', parent_contact=f'0661{i:06}') for i in range(count)
+        ])
+        Enrollment.objects.bulk_create([
+            Enrollment(student=student, course_group=group)
+            for i, student in enumerate(students)
+            for group in self.groups[:1 + i % 4]
+        ])
+        Payment.objects.bulk_create([
+            Payment(student=student, amount=Decimal('200'), payment_date=self.month,
+                    month_covered=self.month, receipt_number=f'RECTEST{student.pk:05}', status='PAID')
+            for i, student in enumerate(students) if i % 3
+        ])
+        group = self.groups[0]
+        Session.objects.bulk_create([
+            Session(group=group, date=self.month.replace(day=1 + i % 28),
+                    start_time=time(8, 0), end_time=time(9, 0))
+            for i in range(count)
+        ])
+
+    def changelist_queries(self, model_name):
+        self.client.force_login(self.admin_user)
+        url = reverse(f'admin:core_{model_name}_changelist')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_changelists_constant_query_count(self):
+        models = ('student', 'payment', 'session', 'coursegroup', 'teacher', 'room')
+        self.create_rows(10)
+        small = {name: self.changelist_queries(name) for name in models}
+        self.create_rows(90)
+        for name, expected in small.items():
+            with self.subTest(changelist=name):
+                self.assertEqual(self.changelist_queries(name), expected)
+
+    def test_student_changelist_100_rows(self):
+        self.create_rows(100)
+        queries = self.changelist_queries('student')
+        # Session, utilisateur, comptes, filtres, page, préchargement des inscriptions
+        self.assertLess(queries, 20)
+
+    def test_payment_status_filter(self):
+        self.create_rows(12)
+        self.client.force_login(self.admin_user)
+        url = reverse('admin:core_student_changelist')
+        expected = {
+            'ok': Student.objects.with_row_data().filter(row_status='OK').count(),
+            'unpaid': Student.objects.with_row_data().filter(row_status='UNPAID').count(),
+        }
+        for value, count in expected.items():
+            with self.subTest(payment_status=value):
+                response = self.client.get(url, {'payment_status': value})
+                self.assertEqual(response.context['cl'].result_count, count)
+
+
+class EventStreamTests(TestCase):
+    """Sous WSGI, le flux SSE n'est pas ouvert (il bloquerait un thread)."""
+
+    def test_wsgi_answers_204_and_pages_poll(self):
+        user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pass')
+        self.client.force_login(user)
+        response = self.client.get(reverse('core:event_stream'))
+        self.assertEqual(response.status_code, 204)
+        for name in ('core:cockpit', 'core:sessions_today'):
+            with self.subTest(page=name):
+                response = self.client.get(reverse(name))
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.context['live_updates'])
+                self.assertNotContains(response, 'new EventSource')
+
+
+class RowVersionTests(TestCase):
+    """La version d'une ligne (clé du cache de fragments) avance à chaque écriture."""
+
+    def test_repeated_and_stale_saves_advance_version(self):
+        student = Student.objects.create(name='Élève', parent_contact='0661000000')
+        start = Student.objects.get(pk=student.pk).version
+        student.save()
+        student.save()
+        self.assertEqual(student.version, start + 2)
+        self.assertEqual(Student.objects.get(pk=student.pk).version, start + 2)
+
+        stale = Student.objects.get(pk=student.pk)
+        student.save()
+        stale.save(update_fields=['name'])
+        self.assertEqual(Student.objects.get(pk=student.pk).version, start + 4)
+
+    def test_related_writes_bump_student_version(self):
+        student = Student.objects.create(name='Élève', parent_contact='0661000000')
+        version = Student.objects.get(pk=student.pk).version
+        month = timezone.now().date().replace(day=1)
+        Payment.objects.create(student=student, amount=Decimal('100'), payment_date=month, month_covered=month)
+        self.assertEqual(Student.objects.get(pk=student.pk).version, version + 1)
+
+
+class PhoneSearchTests(TestCase):
+    """Recherche par téléphone : début, fin ou numéro complet."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.match = Student.objects.create(name='Yasmine Alaoui', parent_contact='06 12 34 56 78')
+        cls.other = Student.objects.create(name='Omar Idrissi', parent_contact='0798765432')
+
+    def test_partial_numbers_typed_from_the_start(self):
+        from .search import filter_students, search_students
+
+        for query in ('0612', '06 12 34', '061234', '06123456', '+2126123', '612345'):
+            with self.subTest(query=query):
+                self.assertEqual(search_students(query), [self.match])
+                self.assertEqual(list(filter_students(Student.objects.all(), query)), [self.match])
+
+    def test_suffix_and_full_number(self):
+        from .search import search_students
+
+        for query in ('5678', '56 78', '0612345678', '+212 612 345 678'):
+            with self.subTest(query=query):
+                self.assertEqual(search_students(query), [self.match])
+
+    def test_two_numbers_in_one_field_are_not_e164(self):
+        student = Student.objects.create(name='Sara Alaoui', parent_contact='0612345678 / 0698765432')
+        self.assertEqual((student.parent_contact_e164, student.parent_contact_rev), ('', ''))
+
+    def test_cashier_select2(self):
+        user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pass')
+        self.client.force_login(user)
+        response = self.client.get(reverse('core:student_search'), {'q': '0612'})
+        self.assertEqual([r['id'] for r in response.json()['results']], [self.match.pk])
+
+
+class AttendanceSyncCursorTests(TestCase):
+    """Pages de la synchronisation : aucune ligne perdue à horodatage égal."""
+
+    def test_rows_sharing_one_timestamp_span_pages(self):
+        from .models import Attendance
+        from .views import ATTENDANCE_SYNC_PAGE_SIZE
+
+        teacher = Teacher.objects.create(name='Prof', phone='0612345678', hourly_rate=Decimal('100'))
+        room = Room.objects.create(name='Salle', capacity=30)
+        group = CourseGroup.objects.create(
+            name='Groupe', subject='Maths', level='2BAC', monthly_price=Decimal('200'), teacher=teacher,
+            room=room, schedule_day=CourseGroup.DAYS_CHOICES[0][0], start_time=time(8, 0), end_time=time(9, 0),
+        )
+        day = timezone.now().date()
+        sessions = Session.objects.bulk_create([
+            Session(group=group, date=day, start_time=time(8, 0), end_time=time(9, 0)) for _ in range(52)
+        ])
+        students = Student.objects.bulk_create([
+            Student(name=f'Élève {i}', parent_contact='0661000000') for i in range(100)
+        ])
+        Attendance.objects.bulk_create([
+            Attendance(student=student, course_group=group, session=session, date=day)
+            for session in sessions for student in students
+        ], batch_size=1000)
+        total = Attendance.objects.count()
+        self.assertGreater(total, ATTENDANCE_SYNC_PAGE_SIZE)
+        # Une seule écriture groupée (bulk_update) : même horodatage pour tout le lot
+        stamp = timezone.now()
+        Attendance.objects.update(updated_at=stamp)
+
+        user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pass')
+        self.client.force_login(user)
+        url = reverse('core:attendance_sync')
+        seen, cursor, pages = set(), (stamp - timedelta(seconds=1)).isoformat(), 0
+        while True:
+            data = self.client.get(url, {'since': cursor}).json()
+            seen.update((row[0], row[1]) for row in data['rows'])
+            cursor, pages = data['cursor'], pages + 1
+            if not data['has_more']:
+                break
+        self.assertEqual(len(seen), total)
+        self.assertEqual(pages, 2)
+        # Rien de nouveau : même curseur, aucune ligne
+        data = self.client.get(url, {'since': cursor}).json()
+        self.assertEqual((data['rows'], data['cursor']), ([], cursor))
+
+    def test_tablet_posts_with_csrf_cookie_from_get(self):
+        import json
+        import warnings
+
+        from django.test import Client
+
+        from .models import Attendance
+
+        teacher = Teacher.objects.create(name='Prof', phone='0612345678', hourly_rate=Decimal('100'))
+        room = Room.objects.create(name='Salle', capacity=30)
+        group = CourseGroup.objects.create(
+            name='Groupe', subject='Maths', level='2BAC', monthly_price=Decimal('200'), teacher=teacher,
+            room=room, schedule_day=CourseGroup.DAYS_CHOICES[0][0], start_time=time(8, 0), end_time=time(9, 0),
+        )
+        session = Session.objects.create(group=group, date=timezone.now().date(), start_time=time(8, 0), end_time=time(9, 0))
+        student = Student.objects.create(name='Élève', parent_contact='0661000000')
+        Enrollment.objects.create(student=student, course_group=group)
+
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pass'))
+        url = reverse('core:attendance_sync')
+        with warnings.catch_warnings():
+            # Horodatage ISO sans fuseau : lu dans le fuseau de l'école, sans RuntimeWarning
+            warnings.simplefilter('error', RuntimeWarning)
+            response = client.get(url, {'since': '2020-01-01T00:00:00'})
+        self.assertEqual(response.status_code, 200)
+        token = response.cookies['csrftoken'].value
+
+        body = json.dumps({'records': [{
+            'session_id': session.pk, 'student_id': student.pk, 'is_present': True,
+            'client_timestamp': timezone.now().isoformat(),
+        }]})
+        self.assertEqual(client.post(url, body, content_type='application/json').status_code, 403)
+        response = client.post(url, body, content_type='application/json', HTTP_X_CSRFTOKEN=token)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Attendance.objects.filter(session=session, student=student, is_present=True).exists())
+
+
+class PayrollRunDeleteTests(TestCase):
+    """Une paie validée (et ses lignes) ne se supprime pas, même en masse."""
+
+    def test_bulk_delete_refuses_approved_runs(self):
+        from django.contrib.admin import helpers
+        from django.core.exceptions import ValidationError
+        from .models import PayrollLine, PayrollRun
+
+        teacher = Teacher.objects.create(name='Prof', phone='0612345678', hourly_rate=Decimal('100'))
+        approved = PayrollRun.objects.create(month=timezone.now().date().replace(day=1))
+        PayrollLine.objects.create(run=approved, teacher=teacher, hourly_rate=Decimal('100'), amount=Decimal('100'))
+        PayrollRun.objects.filter(pk=approved.pk).update(status='APPROVED')
+        draft = PayrollRun.objects.create(month=timezone.now().date().replace(day=1, year=2000))
+
+        user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pass')
+        self.client.force_login(user)
+        url = reverse('admin:core_payrollrun_changelist')
+        self.client.post(url, {
+            'action': 'delete_selected', 'post': 'yes',
+            helpers.ACTION_CHECKBOX_NAME: [approved.pk, draft.pk],
+        })
+        self.assertEqual(PayrollRun.objects.count(), 2)
+        self.assertEqual(PayrollLine.objects.count(), 1)
+
+        with self.assertRaises(ValidationError):
+            PayrollRun.objects.all().delete()
+        with self.assertRaises(ValidationError):
+            PayrollLine.objects.all().delete()
+
+        self.client.post(url, {'action': 'delete_selected', 'post': 'yes', helpers.ACTION_CHECKBOX_NAME: [draft.pk]})
+        self.assertFalse(PayrollRun.objects.filter(pk=draft.pk).exists())
+
+
+class PayrollAnnualYearTests(TestCase):
+    """Le rapport annuel refuse les années hors limites au lieu d'une erreur 500."""
+
+    def test_out_of_range_year_is_rejected(self):
+        user = get_user_model().objects.create_user('staff', 'staff@example.com', 'pass', is_staff=True)
+        self.client.force_login(user)
+        url = reverse('core:payroll_annual')
+        for year in ('0', '-5', '99999', 'abc'):
+            self.assertEqual(self.client.get(url, {'year': year}).status_code, 400, year)
+        self.assertEqual(self.client.get(url, {'year': timezone.now().year}).status_code, 200)
+
+
+class PayslipsPdfTests(TestCase):
+    """Le PDF unique assemble les fiches individuelles en cache, sans pool de processus."""
+
+    def test_single_pdf_merges_cached_payslips(self):
+        from io import BytesIO
+        from unittest import mock
+
+        from django.core.cache import cache
+        from pypdf import PdfReader
+
+        from . import payslips
+
+        cache.clear()
+        payload = {
+            'teacher_id': 0, 'teacher_name': '', 'teacher_phone': '', 'month': '2025-01',
+            'month_label': 'Janvier 2025', 'period': '01/01/2025 - 31/01/2025',
+            'school': {'name': 'École', 'address': '', 'phone': ''}, 'approved': False,
+            'hourly_rate': '100', 'scheduled_hours': '2', 'taught_hours': '2',
+            'sessions_count': 1, 'amount': '200', 'sessions': [['06/01', 'Maths', '08:00-10:00', '2']],
+        }
+        payloads = [dict(payload, teacher_id=i, teacher_name=f'Prof {i}') for i in range(5)]
+
+        with mock.patch.object(payslips, 'ProcessPoolExecutor') as pool:
+            pdf = payslips.build_payslips_pdf(payloads)
+        pool.assert_not_called()
+        self.assertEqual(len(PdfReader(BytesIO(pdf)).pages), 5)
+
+        with mock.patch.object(payslips, 'render_payslip_pdf') as render_one:
+            payslips.build_payslips_pdf(payloads[:3])
+        render_one.assert_not_called()
+
+
+class OmnisearchBudgetTests(TestCase):
+    """Les index en mémoire répondent même à froid ; les types hors budget sont signalés."""
+
+    def test_cold_memory_index_is_not_cut_off(self):
+        import time as _time
+        from unittest import mock
+
+        from . import omnisearch
+
+        Teacher.objects.create(name='Prof Benali', phone='0612345678', hourly_rate=Decimal('100'))
+        omnisearch._indexes.clear()
+        omnisearch.result_cache.clear()
+
+        def slow_search(entity_type, query, limit):
+            _time.sleep(0.2)
+            return []
+
+        with mock.patch.object(omnisearch, '_search_entity_in_thread', slow_search):
+            response = omnisearch.omnisearch('benali', types=['teacher', 'student'], budget=0)
+
+        self.assertEqual([r['text'] for r in response['results']], ['Prof Benali'])
+        self.assertEqual(response['skipped'], ['student'])
+        self.assertEqual(response['skipped_labels'], ['Élève'])
+        self.assertIs(omnisearch.get_executor(), omnisearch.get_executor())
+
+    def test_memory_index_expires_without_version_bump(self):
+        from django.test import override_settings
+
+        from . import omnisearch
+
+        teacher = Teacher.objects.create(name='Prof Benali', phone='0612345678', hourly_rate=Decimal('100'))
+        omnisearch._indexes.clear()
+        omnisearch.get_memory_index('teacher')
+        # Écriture d'un autre processus (bulk_import) : pas de signal, version inchangée ici
+        Teacher.objects.filter(pk=teacher.pk).update(name='Prof Haddad')
+
+        with override_settings(OMNISEARCH_INDEX_MAX_AGE=3600):
+            self.assertEqual(omnisearch.get_memory_index('teacher').search(omnisearch.fold('Haddad')), [])
+        with override_settings(OMNISEARCH_INDEX_MAX_AGE=0):
+            hits = omnisearch.get_memory_index('teacher').search(omnisearch.fold('Haddad'))
+        self.assertEqual([e['label'] for e in hits], ['Prof Haddad'])
+
+
+class ExportJobQuerysetTests(TestCase):
+    """Le job d'export garde les paramètres de la liste, pas une requête picklée."""
+
+    def test_job_rebuilds_filtered_changelist_queryset(self):
+        from django.http import QueryDict
+
+        from .admin import PaymentResource
+        from .exports import enqueue_export_job, job_queryset
+
+        user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pass')
+        student = Student.objects.create(name='Élève', parent_contact='0612345678')
+        for status in ('PAID', 'PAID', 'PENDING'):
+            Payment.objects.create(
+                student=student, amount=Decimal('100'), payment_date=timezone.now().date(),
+                month_covered=timezone.now().date().replace(day=1), status=status,
+            )
+
+        job = enqueue_export_job(Payment, PaymentResource, 'csv', created_by=user.username,
+                                 params=QueryDict('status__exact=PAID'))
+        self.assertEqual(job.params, {'status__exact': ['PAID']})
+        self.assertEqual(job_queryset(job).count(), 2)
+
+        first = Payment.objects.order_by('pk').first()
+        job = enqueue_export_job(Payment, PaymentResource, 'csv', created_by=user.username, pks=[first.pk])
+        self.assertEqual(list(job_queryset(job).values_list('pk', flat=True)), [first.pk])
+
+
+class MessageRendererTests(TestCase):
+    """Chaque code de modèle a un texte par défaut ; l'annonce n'en a pas."""
+
+    def test_renderer_for_each_code(self):
+        from .message_templates import TEMPLATE_CODE_CHOICES, message_renderer
+
+        for code, _ in TEMPLATE_CODE_CHOICES:
+            with self.subTest(code=code):
+                self.assertIsInstance(message_renderer(code)({'name': 'Parent'}), str)
+        with self.assertRaises(KeyError):
+            message_renderer('announcement')
+
+
+class BulkAnnouncementTests(TestCase):
+    """La page d'annonce ne charge pas les élèves ; la mise en file les lit par paquets."""
+
+    def test_compose_page_counts_and_queue_streams(self):
+        from .models import OutboundMessage
+
+        Student.objects.bulk_create([Student(name=f'Élève {i}', parent_contact=f'06123456{i:02d}') for i in range(30)])
+        Student.objects.create(name='Sans contact')
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pass'))
+        url = reverse('core:whatsapp_bulk_announcements')
+
+        response = self.client.get(url)
+        self.assertEqual(response.context['total_contacts'], 30)
+        self.assertNotIn('contacts', response.context)
+        self.assertNotContains(response, 'Élève 0')
+
+        self.client.post(url, {'message_template': 'Bonjour {name} ({student_name})', 'action': 'queue'})
+        self.assertEqual(OutboundMessage.objects.filter(kind='ANNOUNCEMENT').count(), 30)
+        self.assertTrue(OutboundMessage.objects.filter(body='Bonjour Parent (Élève 7)').exists())
+
+
+class HouseholdPaymentTests(TestCase):
+    """Paiement d'un foyer : répartition entre enfants, contrôle du foyer, reçus consécutifs."""
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher = Teacher.objects.create(name='Prof', phone='0612345678', hourly_rate=Decimal('100'))
+        room = Room.objects.create(name='Salle', capacity=30)
+        group = CourseGroup.objects.create(
+            name='Groupe', subject='Maths', level='2BAC', monthly_price=Decimal('200'), teacher=teacher,
+            room=room, schedule_day=CourseGroup.DAYS_CHOICES[0][0], start_time=time(8, 0), end_time=time(9, 0),
+        )
+        cls.amine = Student.objects.create(name='Amine', parent_contact='06 61 00 00 01')
+        cls.sara = Student.objects.create(name='Sara', parent_contact='0661000001')
+        cls.other = Student.objects.create(name='Omar', parent_contact='0661000002')
+        for student in (cls.amine, cls.sara, cls.other):
+            Enrollment.objects.create(student=student, course_group=group)
+        cls.month = timezone.now().date().replace(day=1)
+
+    def test_split_amount(self):
+        from .households import split_amount
+
+        dues = [Decimal('200'), Decimal('200')]
+        self.assertEqual(split_amount(Decimal('300'), dues), [Decimal('200'), Decimal('100')])
+        self.assertEqual(split_amount(Decimal('400'), dues), [Decimal('200'), Decimal('200')])
+        # Surplus au premier enfant
+        self.assertEqual(split_amount(Decimal('500'), dues), [Decimal('300'), Decimal('200')])
+        self.assertEqual(split_amount(Decimal('150'), dues), [Decimal('150'), Decimal('0')])
+
+    def test_zero_shares_are_dropped(self):
+        from .households import record_household_payment
+
+        payments = record_household_payment([(self.amine, Decimal('150')), (self.sara, Decimal('0'))], self.month)
+        self.assertEqual([(p.student, p.amount) for p in payments], [(self.amine, Decimal('150'))])
+
+    def test_children_of_different_households_are_rejected(self):
+        from django.core.exceptions import ValidationError
+
+        from .households import record_household_payment
+
+        with self.assertRaises(ValidationError):
+            record_household_payment([(self.amine, Decimal('200')), (self.other, Decimal('200'))], self.month)
+        self.assertFalse(Payment.objects.exists())
+
+    def test_cashier_post_creates_one_payment_per_child(self):
+        year = timezone.now().year
+        Payment.objects.create(
+            student=self.other, amount=Decimal('200'), payment_date=timezone.now().date(),
+            month_covered=self.month, status='PAID', receipt_number=f'REC{year}0007',
+        )
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pass'))
+        response = self.client.post(reverse('core:household_payment_create', args=[self.amine.pk]), {
+            'month_covered': self.month.isoformat(), 'total': '300', 'payment_method': 'CASH',
+        })
+        self.assertEqual(response['Content-Type'], 'application/pdf')
 
-# Create your tests here.
+        payments = Payment.objects.filter(student__in=[self.amine, self.sara]).order_by('receipt_number')
+        self.assertEqual(
+            [(p.student.name, p.amount, p.receipt_number) for p in payments],
+            [('Amine', Decimal('200'), f'REC{year}0008'), ('Sara', Decimal('100'), f'REC{year}0009')],
+        )
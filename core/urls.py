@@ -5,10 +5,12 @@ app_name = 'core'
 
 urlpatterns = [
     path('', views.cockpit, name='cockpit'),
+    path('dashboard/panels/<str:name>/', views.dashboard_panel, name='dashboard_panel'),
     
     # Student CRUD
     path('students/', views.students_list, name='students_list'),
     path('students/create/', views.student_create, name='student_create'),
+    path('students/export/', views.students_export, name='students_export'),
     path('students/<int:student_id>/', views.student_page, name='student_page'),
     path('students/<int:student_id>/edit/', views.student_edit, name='student_edit'),
     path('students/<int:student_id>/delete/', views.student_delete, name='student_delete'),
@@ -26,6 +28,7 @@ urlpatterns = [
     # Sessions
     path('schedule/', views.sessions_schedule, name='sessions_schedule'),
     path('sessions/today/', views.sessions_today, name='sessions_today'),
+    path('sessions/export/', views.sessions_export, name='sessions_export'),
     path('sessions/<int:session_id>/attendance/', views.session_attendance, name='session_attendance'),
     path('sessions/create/', views.session_create, name='session_create'),
     path('sessions/<int:session_id>/edit/', views.session_edit, name='session_edit'),
@@ -34,15 +37,26 @@ urlpatterns = [
     path('sessions/exceptions/', views.session_exceptions_list, name='session_exceptions_list'),
     path('sessions/<int:session_id>/quick-update/', views.session_quick_status_update, name='session_quick_status_update'),
     path('sessions/<int:session_id>/detail-ajax/', views.session_detail_ajax, name='session_detail_ajax'),
+    path('events/stream/', views.event_stream, name='event_stream'),
+    path('api/kpis/series/', views.kpi_series_api, name='kpi_series'),
+    path('api/cache/metrics/', views.cache_metrics, name='cache_metrics'),
+    path('search/', views.omnisearch, name='omnisearch'),
+    path('api/attendance/sync/', views.attendance_sync, name='attendance_sync'),
     
     # Cashier
     path('cashier/payment/create/', views.payment_create, name='payment_create'),
+    path('cashier/household/<int:student_id>/payment/', views.household_payment_create, name='household_payment_create'),
     path('cashier/student-search/', views.student_search, name='student_search'),
     path('cashier/student-unpaid-search/', views.student_unpaid_search, name='student_unpaid_search'),
     path('cashier/student-detail/', views.student_detail, name='student_detail'),
     
     # Payroll
     path('payroll/teacher/', views.teacher_payroll, name='teacher_payroll'),
+    path('payroll/runs/', views.payroll_runs, name='payroll_runs'),
+    path('payroll/runs/<int:run_id>/', views.payroll_run_detail, name='payroll_run_detail'),
+    path('payroll/runs/<int:run_id>/export/', views.payroll_run_export, name='payroll_run_export'),
+    path('payroll/payslips/', views.payroll_payslips, name='payroll_payslips'),
+    path('payroll/annual/', views.payroll_annual, name='payroll_annual'),
 
     # WhatsApp Integration
     
@@ -60,6 +74,17 @@ urlpatterns = [
     path('whatsapp/bulk-announcements/', 
          views.whatsapp_bulk_announcements, 
          name='whatsapp_bulk_announcements'),
+    path('whatsapp/bulk-announcements/results/',
+         views.whatsapp_bulk_results,
+         name='whatsapp_bulk_results'),
+    
+    # WhatsApp message of one row, built on demand (preview modal / chat link)
+    path('whatsapp/message/<str:kind>/<int:pk>/',
+         views.whatsapp_message_preview,
+         name='whatsapp_message_preview'),
+    path('whatsapp/message/<str:kind>/<int:pk>/open/',
+         views.whatsapp_message_open,
+         name='whatsapp_message_open'),
     
     # WhatsApp Payment Confirmation
     path('whatsapp/payment-confirmation/<int:payment_id>/', 
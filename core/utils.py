@@ -2,7 +2,7 @@
 Utilitaires pour le système de gestion d'école
 """
 from .models import Session, CourseGroup, SessionException  # Import necessary models
-from django.db.models import Sum
+from django.db.models import F, Sum
 from django.utils import timezone
 from django.conf import settings
 from decimal import Decimal
@@ -16,11 +16,6 @@ from .models import Student, Payment
 
 PAID_STATUSES = ('PAID', 'OK', 'CONFIRMED', 'COMPLETED', 'SETTLED')
 
-class SafeDict(dict):
-    def __missing__(self, key):
-        return f"{{{key}}}"
-
-
 # ==================== GESTION DES DATES ====================
 
 def get_current_month_period() -> Tuple[date, date]:
@@ -221,52 +216,49 @@ def get_unpaid_students(month_date: Optional[date] = None) -> List[dict]:
     return unpaid_students
 
 
+def build_student_rows(students, preview: int = 3) -> List[Dict]:
+    """
+    Lignes de la liste des élèves à partir d'un queryset `with_row_data()` :
+    valeurs déjà calculées, sans requête supplémentaire dans le template.
+    """
+    rows = []
+    for student in students:
+        enrollments = student.active_enrollments
+        rows.append({
+            'id': student.id,
+            'version': student.version,
+            'name': student.name,
+            'parent_name': student.parent_name,
+            'parent_contact': student.parent_contact,
+            'enrollment_count': student.active_enrollment_count,
+            'monthly_fees': student.monthly_fees,
+            'month_paid': student.month_paid,
+            'status': student.row_status,
+            'subjects': [e.course_group.subject for e in enrollments[:preview]],
+            'more_subjects': max(len(enrollments) - preview, 0),
+        })
+    return rows
+
+
 # ==================== CALCULS PROFESSEURS ====================
 
 def calculate_teacher_hours(teacher, start_date: date, end_date: date) -> Dict:
     """
     Calcule les heures travaillées par un professeur sur une période
-    Basé sur le planning et les présences effectives
+    Basé sur les séances planifiées (exceptions appliquées) et les séances terminées
     """
-    from .models import CourseGroup, Attendance
-    
-    # Récupérer tous les cours du professeur
-    courses = CourseGroup.objects.filter(
-        teacher=teacher,
-        is_active=True
-    )
-    
-    total_scheduled_hours = Decimal('0.00')
-    total_taught_hours = Decimal('0.00')
+    from .payroll import EMPTY_HOURS, compute_teacher_hours, minutes_to_amount, minutes_to_hours
     
-    # Compter les jours entre start_date et end_date
-    days_count = (end_date - start_date).days + 1
-    weeks_count = days_count / 7
-    
-    for course in courses:
-        # Heures prévues par semaine
-        hours_per_session = course.duration_hours()
-        scheduled = Decimal(str(hours_per_session)) * Decimal(str(weeks_count))
-        total_scheduled_hours += scheduled
-        
-        # Heures réellement données (basé sur présences)
-        sessions_count = Attendance.objects.filter(
-            course_group=course,
-            date__range=[start_date, end_date]
-        ).values('date').distinct().count()
-        
-        taught = Decimal(str(hours_per_session)) * Decimal(str(sessions_count))
-        total_taught_hours += taught
-    
-    salary_scheduled = total_scheduled_hours * teacher.hourly_rate
-    salary_taught = total_taught_hours * teacher.hourly_rate
+    data = compute_teacher_hours(start_date, end_date, [teacher.pk]).get(teacher.pk, EMPTY_HOURS)
     
     return {
-        'scheduled_hours': total_scheduled_hours,
-        'taught_hours': total_taught_hours,
-        'salary_scheduled': salary_scheduled,
-        'salary_taught': salary_taught,
-        'courses': courses.count()
+        'scheduled_hours': minutes_to_hours(data['scheduled_minutes']),
+        'taught_hours': minutes_to_hours(data['taught_minutes']),
+        'scheduled_minutes': data['scheduled_minutes'],
+        'taught_minutes': data['taught_minutes'],
+        'salary_scheduled': minutes_to_amount(data['scheduled_minutes'], teacher.hourly_rate),
+        'salary_taught': minutes_to_amount(data['taught_minutes'], teacher.hourly_rate),
+        'courses': data['courses']
     }
 
 
@@ -446,33 +438,46 @@ def generate_sessions_from_coursegroups(start_date: date, end_date: date, force:
 
 # ==================== GÉNÉRATION DE STATISTIQUES ====================
 
-def get_dashboard_stats() -> Dict:
-    """
-    Génère toutes les statistiques pour le dashboard principal
-    """
-    from .models import Student, Teacher, CourseGroup, Payment, Room
-    
-    today = timezone.now().date()
-    current_month = today.replace(day=1)
+def get_dashboard_counts() -> Dict:
+    """Effectifs actifs (élèves, professeurs, groupes, salles)"""
+    from .models import Student, Teacher, CourseGroup, Room
     
-    # Statistiques générales
-    active_students = Student.objects.filter(is_active=True).count()
-    active_teachers = Teacher.objects.filter(is_active=True).count()
-    active_courses = CourseGroup.objects.filter(is_active=True).count()
-    active_rooms = Room.objects.filter(is_active=True).count()
+    return {
+        'students': Student.objects.filter(is_active=True).count(),
+        'teachers': Teacher.objects.filter(is_active=True).count(),
+        'courses': CourseGroup.objects.filter(is_active=True).count(),
+        'rooms': Room.objects.filter(is_active=True).count()
+    }
+
+
+def get_dashboard_revenue(today: Optional[date] = None) -> Dict:
+    """Recettes du jour et du mois courant"""
+    if today is None:
+        today = timezone.now().date()
     
-    # Statistiques financières
-    today_revenue = get_daily_revenue(today)
-    month_revenue = get_monthly_revenue(today.year, today.month)
+    return {
+        'today': get_daily_revenue(today),
+        'month': get_monthly_revenue(today.year, today.month),
+    }
+
+
+def get_dashboard_unpaid(month_date: Optional[date] = None) -> Dict:
+    """Impayés du mois courant"""
+    unpaid = get_unpaid_students(month_date)
     
-    # Élèves impayés
-    unpaid = get_unpaid_students(current_month)
-    unpaid_count = len(unpaid)
-    unpaid_amount = sum([u['remaining'] for u in unpaid])
+    return {
+        'unpaid_count': len(unpaid),
+        'unpaid_amount': sum([u['remaining'] for u in unpaid]),
+        'unpaid_students': unpaid[:5]  # Top 5 pour affichage
+    }
+
+
+def get_dashboard_conflicts() -> List[Dict]:
+    """Conflits de planning entre groupes actifs"""
+    from .models import CourseGroup
     
-    # Conflits de planning
     conflicts = []
-    for course in CourseGroup.objects.filter(is_active=True):
+    for course in CourseGroup.objects.filter(is_active=True).select_related('room'):
         course_conflicts = check_schedule_conflicts(
             course.room,
             course.schedule_day,
@@ -485,23 +490,29 @@ def get_dashboard_stats() -> Dict:
                 'course': course,
                 'conflicts_with': course_conflicts
             })
+    return conflicts
+
+
+def get_dashboard_stats() -> Dict:
+    """
+    Génère toutes les statistiques pour le dashboard principal
+    Chaque section est mise en cache séparément (voir core.caching)
+    """
+    from .caching import cached_section
+    
+    counts = cached_section('counts', get_dashboard_counts)
+    revenue = cached_section('revenue', get_dashboard_revenue)
+    unpaid = cached_section('unpaid', get_dashboard_unpaid)
+    conflicts = cached_section('conflicts', get_dashboard_conflicts)
     
     return {
-        'counts': {
-            'students': active_students,
-            'teachers': active_teachers,
-            'courses': active_courses,
-            'rooms': active_rooms
-        },
-        'revenue': {
-            'today': today_revenue,
-            'month': month_revenue,
-        },
+        'counts': counts,
+        'revenue': revenue,
         'alerts': {
-            'unpaid_count': unpaid_count,
-            'unpaid_amount': unpaid_amount,
+            'unpaid_count': unpaid['unpaid_count'],
+            'unpaid_amount': unpaid['unpaid_amount'],
             'conflicts': conflicts,
-            'unpaid_students': unpaid[:5]  # Top 5 pour affichage
+            'unpaid_students': unpaid['unpaid_students']
         }
     }
 
@@ -512,10 +523,29 @@ def generate_receipt_pdf(payment) -> BytesIO:
     """
     Génère un reçu de paiement en format PDF (A5 ou thermique)
     """
+    return generate_receipts_pdf([payment])
+
+
+def generate_receipts_pdf(payments) -> BytesIO:
+    """
+    Reçus de plusieurs paiements (paiement d'une fratrie) dans un seul PDF,
+    une page A5 par reçu
+    """
     buffer = BytesIO()
     
     # Créer le PDF en format A5 (148 x 210 mm)
     p = canvas.Canvas(buffer, pagesize=A5)
+    for payment in payments:
+        _draw_receipt(p, payment)
+        p.showPage()
+    p.save()
+    
+    buffer.seek(0)
+    return buffer
+
+
+def _draw_receipt(p, payment):
+    """Dessine le reçu de `payment` sur la page courante"""
     width, height = A5
     
     # En-tête
@@ -582,13 +612,6 @@ def generate_receipt_pdf(payment) -> BytesIO:
     p.setFont("Helvetica-Oblique", 8)
     p.drawCentredString(width/2, 40, "Merci pour votre confiance")
     p.drawCentredString(width/2, 28, f"École de Soutien Scolaire - {settings.SCHOOL_NAME if hasattr(settings, 'SCHOOL_NAME') else ''}")
-    
-    # Finaliser
-    p.showPage()
-    p.save()
-    
-    buffer.seek(0)
-    return buffer
 
 
 def generate_thermal_receipt(payment) -> str:
@@ -636,18 +659,22 @@ Merci pour votre confiance!
 
 def send_payment_reminder_sms(student, amount: Decimal) -> bool:
     """
-    Envoie un SMS de rappel de paiement (à intégrer avec API SMS)
+    Met en file un SMS de rappel de paiement (envoyé par manage.py run_outbox)
     """
-    message = f"""
-Bonjour,
-Rappel : Un montant de {amount} DH reste à régler pour {student.name}.
-École de Soutien Scolaire
-    """.strip()
+    from .message_templates import render_message
+    from .outbox import enqueue_message
     
-    # TODO: Intégrer avec une API SMS (Twilio, etc.)
-    print(f"SMS envoyé à {student.parent_contact}: {message}")
+    message = render_message('payment_reminder_sms', {
+        'name': student.parent_name or 'Parent',
+        'student_name': student.name,
+        'amount': amount,
+    }, student.message_language)
     
-    return True
+    queued = enqueue_message(
+        student.parent_contact, message, kind='PAYMENT_REMINDER', student=student, channel='SMS'
+    )
+    
+    return queued is not None
 
 
 def generate_whatsapp_link(phone: str, receipt_text: str) -> str:
@@ -788,10 +815,171 @@ def _calculate_week_stats(sessions, dates):
             'done': day_sessions.filter(status='DONE').count(),
             'cancelled': day_sessions.filter(status='CANCELLED').count(),
         })
-    
+
     return stats
 
 
+# ==================== SYNCHRONISATION DES PRÉSENCES ====================
+
+def _parse_client_timestamp(value):
+    """Accepte un horodatage ISO 8601 ou un epoch en millisecondes (tablettes JS)."""
+    from datetime import datetime, timezone as dt_timezone
+    from django.utils.dateparse import parse_datetime
+
+    if isinstance(value, bool) or value in (None, ''):
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value / 1000, tz=dt_timezone.utc)
+    parsed = parse_datetime(str(value))
+    if parsed is None:
+        return None
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+def apply_attendance_sync(records: List[Dict]) -> Dict:
+    """Applique un lot de présences envoyé par une tablette (mode hors-ligne).
+
+    Chaque enregistrement contient `session_id`, `student_id`, `is_present` et
+    `client_timestamp`. Le lot peut couvrir plusieurs sessions ; il est appliqué
+    dans une seule transaction, de façon idempotente, avec la règle
+    « last-writer-wins » sur l'horodatage client.
+
+    Returns a summary dict:
+        {'received', 'applied', 'unchanged', 'stale', 'rejected', 'sessions', 'cursor'}
+    """
+    from django.db import transaction
+    from .models import Attendance, Enrollment
+
+    summary = {
+        'received': len(records),
+        'applied': 0,
+        'unchanged': 0,
+        'stale': 0,
+        'rejected': [],
+        'sessions': [],
+        'cursor': None,
+    }
+
+    # 1. Validation et dédoublonnage dans le lot (on garde l'écriture la plus récente)
+    latest = {}
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            summary['rejected'].append({'index': index, 'error': 'invalid record'})
+            continue
+        try:
+            session_id = int(record.get('session_id'))
+            student_id = int(record.get('student_id'))
+        except (TypeError, ValueError):
+            summary['rejected'].append({'index': index, 'error': 'invalid session_id/student_id'})
+            continue
+        is_present = record.get('is_present')
+        if not isinstance(is_present, bool):
+            summary['rejected'].append({'index': index, 'error': 'invalid is_present'})
+            continue
+        client_ts = _parse_client_timestamp(record.get('client_timestamp'))
+        if client_ts is None:
+            summary['rejected'].append({'index': index, 'error': 'invalid client_timestamp'})
+            continue
+
+        key = (session_id, student_id)
+        if key in latest and latest[key]['client_ts'] >= client_ts:
+            summary['stale'] += 1
+            continue
+        if key in latest:
+            summary['stale'] += 1
+        latest[key] = {'index': index, 'is_present': is_present, 'client_ts': client_ts}
+
+    if not latest:
+        return summary
+
+    # 2. Chargement groupé des sessions et des inscriptions concernées
+    sessions = Session.objects.in_bulk({session_id for session_id, _ in latest})
+    group_ids = {s.group_id for s in sessions.values()}
+    enrolled = set(
+        Enrollment.objects.filter(
+            course_group_id__in=group_ids,
+            student_id__in={student_id for _, student_id in latest},
+            is_active=True,
+        ).values_list('course_group_id', 'student_id')
+    )
+
+    valid = {}
+    for (session_id, student_id), item in latest.items():
+        session = sessions.get(session_id)
+        if session is None:
+            summary['rejected'].append({'index': item['index'], 'error': 'unknown session'})
+        elif session.status == 'CANCELLED':
+            summary['rejected'].append({'index': item['index'], 'error': 'session cancelled'})
+        elif (session.group_id, student_id) not in enrolled:
+            summary['rejected'].append({'index': item['index'], 'error': 'student not enrolled'})
+        else:
+            valid[(session_id, student_id)] = (session, item)
+
+    if not valid:
+        return summary
+
+    now = timezone.now()
+    with transaction.atomic():
+        existing = {
+            (a.session_id, a.student_id): a
+            for a in Attendance.objects.select_for_update().filter(
+                session_id__in={k[0] for k in valid},
+                student_id__in={k[1] for k in valid},
+            )
+        }
+
+        to_create, to_update, touched_sessions = [], [], set()
+        for key, (session, item) in valid.items():
+            touched_sessions.add(session.pk)
+            att = existing.get(key)
+            if att is None:
+                to_create.append(Attendance(
+                    student_id=key[1],
+                    session=session,
+                    course_group_id=session.group_id,
+                    date=session.date,
+                    is_present=item['is_present'],
+                    client_timestamp=item['client_ts'],
+                ))
+            elif att.client_timestamp and att.client_timestamp > item['client_ts']:
+                summary['stale'] += 1
+            elif att.is_present == item['is_present'] and att.client_timestamp == item['client_ts']:
+                summary['unchanged'] += 1
+            else:
+                att.is_present = item['is_present']
+                att.client_timestamp = item['client_ts']
+                att.updated_at = now
+                to_update.append(att)
+
+        Attendance.objects.bulk_create(to_create, batch_size=500)
+        Attendance.objects.bulk_update(
+            to_update, ['is_present', 'client_timestamp', 'updated_at'], batch_size=500
+        )
+
+        # Même règle que la saisie manuelle : une feuille enregistrée clôt la session
+        closed = list(
+            Session.objects.filter(pk__in=touched_sessions).exclude(status='DONE').values_list('pk', flat=True)
+        )
+        Session.objects.filter(pk__in=closed).update(status='DONE', version=F('version') + 1)
+
+        # update() ne déclenche pas les signaux : invalider et notifier ici
+        from .caching import invalidate_sections
+        from .events import ATTENDANCE_SAVED, SESSION_STATUS, publish_event
+        if closed:
+            transaction.on_commit(lambda: invalidate_sections(['today']))
+        for session_id in closed:
+            publish_event(SESSION_STATUS, session_id=session_id, status='DONE')
+        if to_create or to_update:
+            publish_event(ATTENDANCE_SAVED, sessions=sorted(touched_sessions), source='sync')
+
+    summary['applied'] = len(to_create) + len(to_update)
+    summary['sessions'] = sorted(touched_sessions)
+    summary['cursor'] = now.isoformat()
+    return summary
+
+
 """
 WhatsApp Click-to-Chat Automation Utilities
 ============================================
@@ -802,6 +990,9 @@ import urllib.parse
 from typing import Optional, Dict, List
 import re
 
+from .message_templates import compile_template
+from .phones import normalize_phone
+
 
 class WhatsAppUtils:
     """Utility class for WhatsApp Click-to-Chat automation."""
@@ -824,13 +1015,10 @@ class WhatsAppUtils:
             >>> WhatsAppUtils.clean_phone_number("+212 6 12 34 56 78")
             '212612345678'
         """
-        # Remove all non-digit characters
-        cleaned = re.sub(r'\D', '', phone)
+        # Format E.164 (indicatif par défaut pour les numéros locaux), sans le +
+        cleaned = normalize_phone(phone).lstrip('+')
         
-        # Remove leading zeros
-        cleaned = cleaned.lstrip('0')
-        
-        return cleaned
+        return cleaned or re.sub(r'\D', '', phone or '')
     
     @staticmethod
     def generate_chat_link(
@@ -902,18 +1090,22 @@ class WhatsAppUtils:
         
         Args:
             template: Message template with {variable} placeholders
-            variables: Dictionary of variable values
+            variables: Dictionary of variable values (missing ones stay as {name})
             
         Returns:
             Formatted message
             
+        Raises:
+            ValidationError: attribute/index access or format spec in a placeholder
+            
         Example:
             >>> template = "Hello {name}, your order #{order_id} is ready!"
             >>> variables = {"name": "John", "order_id": "12345"}
             >>> WhatsAppUtils.create_template_message(template, variables)
             'Hello John, your order #12345 is ready!'
         """
-        return template.format_map(SafeDict(variables))
+        # Texte analysé une seule fois (cache), puis rendu pour chaque contact
+        return compile_template(template)(variables)
     
     @staticmethod
     def generate_bulk_links(
@@ -930,7 +1122,7 @@ class WhatsAppUtils:
             use_web: Use WhatsApp Web links
             
         Returns:
-            List of contacts with added 'whatsapp_link' field
+            List of contacts with added 'whatsapp_link' and 'message' fields
             
         Example:
             >>> contacts = [
@@ -967,59 +1159,12 @@ class WhatsAppUtils:
             # Add link to contact info
             contact_with_link = contact.copy()
             contact_with_link['whatsapp_link'] = link
+            contact_with_link['message'] = message
             results.append(contact_with_link)
         
         return results
 
 
-class WhatsAppMessageTemplates:
-    """Pre-built message templates for common use cases."""
-    
-    # Customer service templates
-    CUSTOMER_SERVICE = {
-        'welcome': "Hello {name}! 👋 Welcome to {business_name}. How can we help you today?",
-        'order_confirmation': "Hi {name}, your order #{order_id} has been confirmed! Estimated delivery: {delivery_date}. Track your order: {tracking_url}",
-        'payment_reminder': "Hello {name}, this is a friendly reminder about your pending payment of {amount} for invoice #{invoice_id}. Please let us know if you have any questions.",
-        'appointment_reminder': "Hi {name}, this is a reminder of your appointment on {date} at {time}. Reply 'CONFIRM' to confirm or 'RESCHEDULE' to change.",
-    }
-    
-    # Marketing templates
-    MARKETING = {
-        'promotion': "🎉 Special offer for you, {name}! Get {discount}% off on {product}. Use code: {promo_code}. Valid until {expiry_date}.",
-        'new_product': "Hi {name}! 🚀 Check out our new {product_name}. You'll love it! {product_url}",
-        'abandoned_cart': "Hi {name}, you left {items_count} items in your cart. Complete your purchase now and get {discount}% off! {cart_url}",
-    }
-    
-    # Education templates
-    EDUCATION = {
-        'class_reminder': "Hi {student_name}, reminder: Your {subject} class is scheduled for {date} at {time} in {room}.",
-        'assignment_due': "Hello {student_name}, your {assignment_name} assignment is due on {due_date}. Don't forget to submit!",
-        'grade_notification': "Hi {student_name}, your grade for {subject} has been posted. Check your student portal for details.",
-    }
-    
-    # Healthcare templates
-    HEALTHCARE = {
-        'appointment_confirmation': "Hello {patient_name}, your appointment with Dr. {doctor_name} is confirmed for {date} at {time}. Location: {clinic_address}",
-        'prescription_ready': "Hi {patient_name}, your prescription is ready for pickup at {pharmacy_name}. Please bring your ID.",
-        'test_results': "Hello {patient_name}, your test results are ready. Please call us at {phone} to schedule a consultation with Dr. {doctor_name}.",
-    }
-    
-    @classmethod
-    def get_template(cls, category: str, template_name: str) -> str:
-        """
-        Get a specific message template.
-        
-        Args:
-            category: Template category (e.g., 'CUSTOMER_SERVICE')
-            template_name: Template name (e.g., 'welcome')
-            
-        Returns:
-            Message template string
-        """
-        category_templates = getattr(cls, category.upper(), {})
-        return category_templates.get(template_name, "")
-
-
 # Django Integration Example
 class DjangoWhatsAppMixin:
     """
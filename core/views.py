@@ -1,25 +1,35 @@
+import hashlib
+import json
+
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest
+from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest, Http404, StreamingHttpResponse
 from django.views.decorators.http import require_GET
 from django.utils import timezone
+from django.utils.formats import date_format
+from django.conf import settings
 from datetime import datetime
 from django.db.models import Q, Count, Sum
 from decimal import Decimal
 from datetime import timedelta
 
 from .models import Student, Payment, Enrollment, Room, Teacher
-from .utils import WhatsAppMessageTemplates, WhatsAppUtils, _build_room_schedule, _build_teacher_schedule, _calculate_week_stats, get_dashboard_stats, generate_receipt_pdf, calculate_student_monthly_total, generate_sessions_from_coursegroups
+from .utils import WhatsAppUtils, _build_room_schedule, _build_teacher_schedule, _calculate_week_stats, generate_receipt_pdf, generate_receipts_pdf, calculate_student_monthly_total, generate_sessions_from_coursegroups, apply_attendance_sync
+from .message_templates import allowed_placeholders, compile_template, message_renderer, render_message
+from .outbox import enqueue_messages
+from .reminders import session_reminder_contacts, session_reminder_key
+from .households import household_heads, household_key, household_members, record_household_payment, split_amount
+from .events import ATTENDANCE_SAVED, PAYMENT_RECORDED, SESSION_STATUS, publish_event, streaming_available
 from .forms import SessionForm, StudentForm, EnrollmentForm
-from django.core.paginator import Paginator
-from .models import CourseGroup, Session, Attendance, SessionException
+from .models import CourseGroup, Session, Attendance, SessionException, PayrollRun
 from django.views.decorators.http import require_http_methods
 from django.db import transaction
-from decimal import Decimal as D
 from collections import defaultdict
+from itertools import groupby
 from .filters import StudentFilter, CourseGroupFilter, TeacherFilter, RoomFilter, SessionFilter
 from django.contrib import messages
 from django.urls import reverse
 from django.views.decorators.http import require_POST
+from django.views.decorators.csrf import ensure_csrf_cookie
 
 
 def payment_create(request):
@@ -68,6 +78,14 @@ def payment_create(request):
             payment_method=payment_method,
             created_by=request.user.get_username() if hasattr(request, 'user') and request.user.is_authenticated else ''
         )
+        publish_event(
+            PAYMENT_RECORDED,
+            payment_id=payment.id,
+            student_id=student.id,
+            student=student.name,
+            amount=str(payment.amount),
+            month_covered=payment.month_covered.isoformat(),
+        )
 
         # Generate receipt PDF
         pdf_buffer = generate_receipt_pdf(payment)
@@ -90,15 +108,88 @@ def payment_create(request):
 
 
 
+def _household_due_rows(student, month):
+    """Active siblings of `student` (same parent phone) with what each still owes for `month`"""
+    members = household_members(student, Student.objects.filter(Q(is_active=True) | Q(pk=student.pk)))
+    children = list(members.with_row_data(month).order_by('name', 'id'))
+    for child in children:
+        child.due_amount = max(child.monthly_fees - child.month_paid, Decimal('0'))
+    return children
+
+
+@require_http_methods(["GET", "POST"])
+def household_payment_create(request, student_id):
+    """
+    Cashier: one payment from a parent, split across their children
+    (one receipt per child, recorded in a single transaction)
+    """
+    from django.core.exceptions import ValidationError
+    
+    student = get_object_or_404(Student, pk=student_id)
+    
+    month_param = request.POST.get('month_covered') or request.GET.get('month')
+    try:
+        month_covered = datetime.strptime(month_param, '%Y-%m-%d').date().replace(day=1)
+    except (TypeError, ValueError):
+        month_covered = timezone.now().date().replace(day=1)
+    
+    children = _household_due_rows(student, month_covered)
+    total_due = sum((c.due_amount for c in children), Decimal('0'))
+    
+    if request.method == 'POST':
+        payment_method = request.POST.get('payment_method', 'CASH')
+        try:
+            amounts = [Decimal(request.POST.get(f'amount_{c.id}') or '0') for c in children]
+            total = request.POST.get('total')
+            if total and not any(amounts):
+                # Only the amount received: split it child by child
+                amounts = split_amount(Decimal(total), [c.due_amount for c in children])
+            payments = record_household_payment(
+                list(zip(children, amounts)),
+                month_covered,
+                payment_method=payment_method,
+                created_by=request.user.get_username() if request.user.is_authenticated else '',
+            )
+        except ArithmeticError:
+            messages.error(request, 'Montant invalide.')
+        except ValidationError as e:
+            messages.error(request, ' '.join(e.messages))
+        else:
+            for payment in payments:
+                publish_event(
+                    PAYMENT_RECORDED,
+                    payment_id=payment.id,
+                    student_id=payment.student_id,
+                    student=payment.student.name,
+                    amount=str(payment.amount),
+                    month_covered=payment.month_covered.isoformat(),
+                )
+            
+            # One PDF, one page per receipt
+            pdf_buffer = generate_receipts_pdf(payments)
+            response = HttpResponse(pdf_buffer.read(), content_type='application/pdf')
+            response['Content-Disposition'] = (
+                f'attachment; filename="receipts_{payments[0].receipt_number}-{payments[-1].receipt_number}.pdf"'
+            )
+            return response
+    
+    return render(request, 'core/household_payment_create.html', {
+        'student': student,
+        'children': children,
+        'total_due': total_due,
+        'month_covered': month_covered,
+        'payment_methods': Payment.PAYMENT_METHOD_CHOICES,
+    })
+
+
 @require_GET
 def student_search(request):
 	"""AJAX endpoint for Select2 student search. Query param `q`."""
+	from .search import search_students
+
 	q = request.GET.get('q', '').strip()
 	results = []
-	if q:
-		students = Student.objects.filter(name__icontains=q)[:20]
-	else:
-		students = Student.objects.all()[:20]
+	students = search_students(q, limit=20)
 
 	for s in students:
 		results.append({
@@ -119,11 +210,9 @@ def student_unpaid_search(request):
 	# Get current month
 	current_month = timezone.now().date().replace(day=1)
 	
-	# Get all students or filter by name
-	if q:
-		students = Student.objects.filter(name__icontains=q, is_active=True)[:50]
-	else:
-		students = Student.objects.filter(is_active=True)[:50]
+	# Get all students or filter by name (full-text index)
+	from .search import search_students
+	students = search_students(q, queryset=Student.objects.filter(is_active=True), limit=50)
 	
 	# Filter to unpaid students only
 	unpaid_students = []
@@ -170,49 +259,155 @@ def student_detail(request):
 	for e in enrollments:
 		groups.append({'name': e.course_group.name, 'price': str(e.course_group.monthly_price)})
 
+	# Brothers and sisters (same parent phone): the cashier can take one payment for all
+	siblings = household_members(student, Student.objects.filter(is_active=True)).exclude(pk=student.pk).count()
+
 	data = {
 		'id': student.id,
 		'name': student.name,
 		'parent_contact': student.parent_contact,
 		'required': str(required),
-		'groups': groups
+		'groups': groups,
+		'siblings': siblings,
+		'household_url': reverse('core:household_payment_create', args=[student.id]) if siblings else '',
 	}
 
 	return JsonResponse(data)
 
 
 def cockpit(request):
-	"""Operational dashboard (cockpit) for director"""
-	stats = get_dashboard_stats()
+	"""Operational dashboard (cockpit) for director.
 
-	# Red list: students unpaid (use unpaid_students from utils)
-	red_list = stats.get('alerts', {}).get('unpaid_students', [])
+	Panels load as separate HTMX requests by default. With DASHBOARD_EAGER_PANELS
+	(or ?eager=1) they are computed concurrently and inlined; panels that miss
+	the timeout still fall back to HTMX.
+	"""
+	from django.conf import settings
+	from django.template.loader import render_to_string
+	from .dashboard import PANELS, compute_panels_concurrently
+
+	eager = request.GET.get('eager') == '1' or getattr(settings, 'DASHBOARD_EAGER_PANELS', False)
+	values = compute_panels_concurrently(list(PANELS)) if eager else {}
+
+	panels = {}
+	for name, panel in PANELS.items():
+		html = None
+		if name in values:
+			html = render_to_string(panel['template'], {'name': name, 'data': values[name]}, request=request)
+		panels[name] = {
+			'name': name,
+			'url': reverse('core:dashboard_panel', args=[name]),
+			'html': html,
+		}
 
-	context = {
-		'stats': stats,
-		'red_list': red_list,
-	}
+	return render(request, 'core/dashboard.html', {
+		'panels': panels,
+		'live_updates': streaming_available(request),
+		'poll_seconds': settings.DASHBOARD_POLL_SECONDS,
+	})
 
-	return render(request, 'core/dashboard.html', context)
+
+@require_GET
+def dashboard_panel(request, name):
+	"""HTMX partial for one cockpit panel (own cache and compute budget)."""
+	from .dashboard import PANELS, get_panel
+
+	panel = PANELS.get(name)
+	if panel is None:
+		raise Http404('Unknown panel')
+	return render(request, panel['template'], {'name': name, 'data': get_panel(name)})
+
+
+@require_GET
+async def event_stream(request):
+	"""Server-Sent Events: live domain events for the cockpit and sessions_today.
+
+	Optional ?types=payment.recorded,session.status filters the stream; reconnecting
+	clients resume after the Last-Event-ID header sent by EventSource.
+
+	Under WSGI the stream would never be sent (the whole async iterator is
+	consumed first) and would hold a worker thread: answer 204, which tells
+	EventSource not to reconnect.
+	"""
+	from .events import format_sse, get_broadcaster
+
+	if not streaming_available(request):
+		return HttpResponse(status=204)
+
+	wanted = {t for t in request.GET.get('types', '').split(',') if t}
+	last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_id')
+
+	async def stream():
+		yield 'retry: 3000\n\n'
+		async for event in get_broadcaster().subscribe(last_id):
+			if event is not None and wanted and event['type'] not in wanted:
+				continue
+			yield format_sse(event)
+
+	response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+	response['Cache-Control'] = 'no-cache'
+	response['X-Accel-Buffering'] = 'no'
+	return response
+
+
+@require_GET
+def kpi_series_api(request):
+	"""Downsampled KPI series: ?metric=revenue&start=YYYY-MM-DD&end=YYYY-MM-DD&points=120"""
+	from .kpis import KPI_METRICS, kpi_series
+
+	metric = request.GET.get('metric', 'revenue')
+	if metric not in KPI_METRICS:
+		return JsonResponse({'error': 'Unknown metric', 'metrics': list(KPI_METRICS)}, status=400)
+
+	today = timezone.now().date()
+	try:
+		end = datetime.strptime(request.GET['end'], '%Y-%m-%d').date() if request.GET.get('end') else today
+		start = datetime.strptime(request.GET['start'], '%Y-%m-%d').date() if request.GET.get('start') else end - timedelta(days=89)
+		points = min(max(int(request.GET.get('points', 120)), 1), 1000)
+	except ValueError:
+		return JsonResponse({'error': 'Invalid start, end or points'}, status=400)
+	if start > end:
+		return JsonResponse({'error': 'start is after end'}, status=400)
+
+	return JsonResponse(kpi_series(metric, start, end, points))
+
+
+@require_GET
+def cache_metrics(request):
+	"""Cache hit/miss counters: dashboard sections and template fragments (JSON)."""
+	from .caching import get_cache_metrics, get_fragment_metrics
+
+	return JsonResponse({'sections': get_cache_metrics(), 'fragments': get_fragment_metrics()})
+
+
+@require_GET
+def omnisearch(request):
+	"""Global search for the top bar (Select2): ?q=...&types=student,receipt&limit=5"""
+	from .omnisearch import ENTITY_TYPES, omnisearch as run_omnisearch
+
+	types = [t for t in request.GET.get('types', '').split(',') if t in ENTITY_TYPES] or None
+	try:
+		limit = min(max(int(request.GET.get('limit', 5)), 1), 20)
+	except ValueError:
+		limit = 5
+
+	return JsonResponse(run_omnisearch(request.GET.get('q', ''), types=types, limit=limit))
 
 
 def students_list(request):
-    """List all students with filtering and pagination"""
+    """List all students with filtering and keyset (infinite scroll) pagination"""
     
-    # Base queryset with optimizations
-    students_qs = Student.objects.filter(
-        is_active=True
-    ).prefetch_related(
-        'enrollment_set__course_group',
-        'payments'
-    ).select_related()
+    from .pagination import approximate_count, keyset_paginate
+    from .utils import build_student_rows
+
+    # Row data (fees, paid, status, enrollment count) is annotated in SQL
+    students_qs = Student.objects.filter(is_active=True).with_row_data()
     
     # Apply filters
     student_filter = StudentFilter(request.GET, queryset=students_qs)
-    filtered_qs = student_filter.qs.order_by('name')
+    filtered_qs = student_filter.qs
     
-    # Pagination
-    page = request.GET.get('page', 1)
+    # Pagination: seek on (name, id), no OFFSET
     per_page = request.GET.get('per_page', '25')
     
     try:
@@ -222,14 +417,23 @@ def students_list(request):
     except (ValueError, TypeError):
         per_page = 25
     
-    paginator = Paginator(filtered_qs, per_page)
-    students = paginator.get_page(page)
+    students = keyset_paginate(filtered_qs, ['name', 'id'], request.GET.get('cursor'), per_page)
+    students.object_list = build_student_rows(students.object_list)
     
-    # Build querystring for pagination (exclude 'page' parameter)
+    # Build querystring for the next-page links (exclude cursor / partial parameters)
     qs_dict = request.GET.copy()
-    qs_dict.pop('page', None)
+    qs_dict.pop('cursor', None)
+    qs_dict.pop('view', None)
     querystring = qs_dict.urlencode()
     
+    # Infinite scroll: next rows of the grid or the table only
+    view = request.GET.get('view')
+    if request.htmx and view in ('grid', 'table'):
+        return render(request, f'core/_students_{view}_rows.html', {
+            'students': students,
+            'querystring': querystring,
+        })
+    
     # Check if any filters are active
     filters_active = any([
         request.GET.get('q'),
@@ -244,13 +448,31 @@ def students_list(request):
         'per_page': per_page,
         'querystring': querystring,
         'filters_active': filters_active,
-        'total_students': students_qs.count(),
-        'filtered_count': filtered_qs.count(),
+        # Cached counts: exact to within PAGINATION_COUNT_TTL
+        'total_students': approximate_count(Student.objects.filter(is_active=True)),
+        'filtered_count': approximate_count(filtered_qs) if filters_active else None,
     }
     
     return render(request, 'core/students_list.html', context)
 
 
+@require_GET
+def students_export(request):
+    """Streaming CSV/XLSX export of the students list with the active filters (?format=xlsx)"""
+    from .exports import STUDENT_COLUMNS, streaming_export, student_export_rows
+
+    students_qs = Student.objects.filter(is_active=True).with_row_data()
+    filtered_qs = StudentFilter(request.GET, queryset=students_qs).qs.order_by('name', 'id')
+
+    return streaming_export(
+        request.GET.get('format', 'csv'),
+        f"eleves_{timezone.now().strftime('%Y_%m_%d')}",
+        'Élèves',
+        STUDENT_COLUMNS,
+        student_export_rows(filtered_qs),
+    )
+
+
 
 def student_page(request, student_id):
 	"""Student detail page with profile, enrollments, payments, attendance, and stats"""
@@ -259,6 +481,17 @@ def student_page(request, student_id):
 	
 	student = get_object_or_404(Student, pk=student_id)
 
+	# Payment history: seek on (payment_date, created_at, id), newest first
+	from .pagination import keyset_paginate
+	payments = keyset_paginate(
+		Payment.objects.filter(student=student),
+		['-payment_date', '-created_at', '-id'],
+		request.GET.get('cursor'),
+		10,
+	)
+	if request.htmx and request.GET.get('cursor'):
+		return render(request, 'core/_student_payment_rows.html', {'student': student, 'payments': payments})
+
 	# Enrollments
 	enrollments = student.enrollment_set.filter(is_active=True).select_related('course_group')
 	total_enrolled = enrollments.count()
@@ -267,12 +500,6 @@ def student_page(request, student_id):
 	current_month = timezone.now().date().replace(day=1)
 	payment_status = get_student_payment_status(student, current_month)
 	
-	# Payment history
-	payments_qs = Payment.objects.filter(student=student).order_by('-payment_date', '-created_at')
-	paginator = Paginator(payments_qs, 10)
-	page_number = request.GET.get('page')
-	payments = paginator.get_page(page_number)
-	
 	# Attendance stats (last 30 days)
 	from datetime import timedelta
 	from_date = timezone.now().date() - timedelta(days=30)
@@ -385,10 +612,37 @@ def sessions_today(request):
         'stats': stats,
         'filters_active': filters_active,
         'querystring': querystring,
+        'live_updates': streaming_available(request),
     }
     
     return render(request, 'core/sessions_today.html', context)
 
+
+@require_GET
+def sessions_export(request):
+    """Streaming CSV/XLSX export of sessions with the active SessionFilter (?format=xlsx).
+
+    Without a date range, exports the day shown by sessions_today (?date=YYYY-MM-DD, default today).
+    """
+    from .exports import SESSION_COLUMNS, session_export_rows, streaming_export
+
+    sessions_qs = Session.objects.all()
+    if not (request.GET.get('date_after') or request.GET.get('date_before')):
+        try:
+            view_date = datetime.strptime(request.GET.get('date', ''), '%Y-%m-%d').date()
+        except ValueError:
+            view_date = timezone.now().date()
+        sessions_qs = sessions_qs.filter(date=view_date)
+    sessions = SessionFilter(request.GET, queryset=sessions_qs).qs.order_by('date', 'start_time', 'id')
+
+    return streaming_export(
+        request.GET.get('format', 'csv'),
+        f"seances_{timezone.now().strftime('%Y_%m_%d')}",
+        'Séances',
+        SESSION_COLUMNS,
+        session_export_rows(sessions),
+    )
+
 @require_http_methods(['GET', 'POST'])
 def session_create(request):
 	"""Create a new session (class)"""
@@ -413,6 +667,7 @@ def session_create(request):
 def session_edit(request, session_id):
 	"""Edit an existing session"""
 	session = get_object_or_404(Session, pk=session_id)
+	previous_status = session.status
 	if request.method == 'POST':
 		form = SessionForm(request.POST, instance=session)
 		if form.is_valid():
@@ -423,6 +678,8 @@ def session_edit(request, session_id):
 			except Exception as e:
 				form.add_error(None, str(e))
 			else:
+				if s.status != previous_status:
+					publish_event(SESSION_STATUS, session_id=s.id, status=s.status)
 				return render(request, 'core/session_form_saved.html', {'session': s})
 	else:
 		form = SessionForm(instance=session)
@@ -447,9 +704,8 @@ def session_attendance(request, session_id):
 	students = session.group.students.filter(is_active=True)
 
 	if request.method == 'GET':
-		# prefill: check if Attendance exists for this date/group
-		existing = Attendance.objects.filter(course_group=session.group, date=session.date)
-		present_map = {a.student_id: a.is_present for a in existing}
+		# prefill: attendance already recorded for this session
+		present_map = dict(session.attendances.values_list('student_id', 'is_present'))
 		students_list = []
 		for s in students:
 			# default to True (present) when no record exists
@@ -469,18 +725,97 @@ def session_attendance(request, session_id):
 			is_present = key in request.POST
 			att, created = Attendance.objects.update_or_create(
 				student=student,
-				course_group=session.group,
-				date=session.date,
-				defaults={'is_present': is_present}
+				session=session,
+				defaults={
+					'course_group': session.group,
+					'date': session.date,
+					'is_present': is_present,
+					'client_timestamp': timezone.now(),
+				}
 			)
 
 	# mark session as DONE if attendance saved
+	previous_status = session.status
 	session.status = 'DONE'
 	session.save()
 
+	present = sum(1 for student in students if f'present_{student.id}' in request.POST)
+	publish_event(ATTENDANCE_SAVED, sessions=[session.id], present=present, absent=len(students) - present)
+	if previous_status != 'DONE':
+		publish_event(SESSION_STATUS, session_id=session.id, status='DONE')
+
 	return render(request, 'core/session_attendance_saved.html', {'session': session})
 
 
+# Rows per GET page of attendance_sync
+ATTENDANCE_SYNC_PAGE_SIZE = 5000
+
+
+@require_http_methods(['GET', 'POST'])
+@ensure_csrf_cookie
+def attendance_sync(request):
+	"""Batched attendance sync endpoint for offline classroom tablets.
+
+	POST a JSON body ``{"records": [{"session_id", "student_id", "is_present",
+	"client_timestamp"}, ...]}``; the batch is applied in one transaction with
+	last-writer-wins on ``client_timestamp`` and acknowledged with a sync cursor.
+
+	GET ``?since=<cursor>`` returns the rows changed on the server after the cursor
+	so a device can refresh its local rosters, ATTENDANCE_SYNC_PAGE_SIZE rows at a
+	time (``has_more``: call again with the returned cursor). The cursor is the
+	signed (updated_at, id) of the last row sent, so rows sharing a timestamp are
+	never skipped between pages; a plain ISO timestamp (the cursor of a POST) is
+	also accepted and resends the rows written at that exact instant (a naive one is
+	read in the school's time zone).
+
+	Devices authenticate with the staff session: every GET sets the ``csrftoken``
+	cookie, to be sent back in the ``X-CSRFToken`` header of each POST.
+	"""
+	from django.utils.dateparse import parse_datetime
+	from .pagination import decode_cursor, encode_cursor, seek_q
+
+	if request.method == 'GET':
+		ordering = ['updated_at', 'id']
+		token = request.GET.get('since', '')
+		position = decode_cursor(token, Attendance, ordering)
+		if position is None:
+			since = parse_datetime(token)
+			if since is None:
+				return JsonResponse({'error': 'Invalid or missing cursor'}, status=400)
+			if settings.USE_TZ and timezone.is_naive(since):
+				since = timezone.make_aware(since)
+			position = [since, 0]
+		changed = list(
+			Attendance.objects.filter(session__isnull=False)
+			.filter(seek_q(ordering, position))
+			.order_by(*ordering)[:ATTENDANCE_SYNC_PAGE_SIZE]
+		)
+		rows = [
+			[a.session_id, a.student_id, a.is_present,
+			 a.client_timestamp.isoformat() if a.client_timestamp else None]
+			for a in changed
+		]
+		return JsonResponse({
+			'fields': ['session_id', 'student_id', 'is_present', 'client_timestamp'],
+			'rows': rows,
+			# Nothing new: the same cursor is still the right place to resume from
+			'cursor': encode_cursor(changed[-1], ordering) if changed else token,
+			'has_more': len(changed) == ATTENDANCE_SYNC_PAGE_SIZE,
+		})
+
+	try:
+		payload = json.loads(request.body or b'{}')
+	except (ValueError, UnicodeDecodeError):
+		return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+	records = payload.get('records') if isinstance(payload, dict) else payload
+	if not isinstance(records, list):
+		return JsonResponse({'error': 'Expected a list of records'}, status=400)
+
+	summary = apply_attendance_sync(records)
+	return JsonResponse(summary)
+
+
 def teacher_payroll(request):
 	"""Calculate payroll for a teacher over a date range."""
 	teachers = CourseGroup.objects.values_list('teacher', flat=True).distinct()
@@ -498,31 +833,170 @@ def teacher_payroll(request):
 		start_d = datetime.strptime(start, '%Y-%m-%d').date()
 		end_d = datetime.strptime(end, '%Y-%m-%d').date()
 
+		from .payroll import minutes_to_amount
+
 		sessions = Session.objects.filter(
 			group__teacher=teacher,
 			status='DONE',
 			date__range=[start_d, end_d]
-		)
-
-		sessions_list = []
-		total_hours = 0.0
-		for s in sessions:
-			hrs = s.duration_hours()
-			total_hours += hrs
-			sessions_list.append({'session': s, 'hours': hrs})
+		).select_related('group')
 
-		total_pay = D(str(total_hours)) * teacher.hourly_rate
+		total_minutes = sessions.aggregate(total=Sum('duration_minutes'))['total'] or 0
+		sessions_list = [{'session': s, 'hours': s.duration_hours()} for s in sessions]
 
 		result = {
 			'teacher': teacher,
 			'sessions': sessions_list,
-			'total_hours': total_hours,
-			'total_pay': total_pay,
+			'total_hours': total_minutes / 60,
+			'total_pay': minutes_to_amount(total_minutes, teacher.hourly_rate),
 		}
 
 	return render(request, 'core/teacher_payroll.html', {'teacher_qs': teacher_qs, 'result': result})
 
 
+@require_http_methods(['GET', 'POST'])
+def payroll_runs(request):
+	"""Monthly payroll runs for all teachers: list snapshots and compute a month."""
+	from .payroll import compute_payroll_run, parse_month
+	from django.core.exceptions import ValidationError
+
+	if request.method == 'POST':
+		month = parse_month(request.POST.get('month'))
+		if month is None:
+			return HttpResponseBadRequest('Mois invalide')
+		try:
+			run = compute_payroll_run(month, created_by=request.user.get_username())
+		except ValidationError as e:
+			messages.error(request, e.messages[0])
+			return redirect('core:payroll_runs')
+		messages.success(request, f'Paie de {month.strftime("%m/%Y")} calculée ({run.lines.count()} professeurs).')
+		return redirect('core:payroll_run_detail', run_id=run.id)
+
+	runs = PayrollRun.objects.annotate(teacher_count=Count('lines'))
+	return render(request, 'core/payroll_runs.html', {
+		'runs': runs,
+		'default_month': timezone.now().date().replace(day=1),
+	})
+
+
+@require_http_methods(['GET', 'POST'])
+def payroll_run_detail(request, run_id):
+	"""Show a payroll snapshot; POST action=approve|recompute."""
+	from .payroll import approve_payroll_run, compute_payroll_run
+	from django.core.exceptions import ValidationError
+
+	run = get_object_or_404(PayrollRun, pk=run_id)
+
+	if request.method == 'POST':
+		action = request.POST.get('action')
+		try:
+			if action == 'approve':
+				approve_payroll_run(run, approved_by=request.user.get_username())
+				messages.success(request, 'Paie validée : elle ne peut plus être modifiée.')
+			elif action == 'recompute':
+				compute_payroll_run(run.month, created_by=run.created_by)
+				messages.success(request, 'Paie recalculée.')
+		except ValidationError as e:
+			messages.error(request, e.messages[0])
+		return redirect('core:payroll_run_detail', run_id=run.id)
+
+	lines = run.lines.select_related('teacher')
+	return render(request, 'core/payroll_run_detail.html', {'run': run, 'lines': lines})
+
+
+@require_GET
+def payroll_run_export(request, run_id):
+	"""CSV export of a payroll snapshot (no recomputation)."""
+	import csv
+
+	run = get_object_or_404(PayrollRun, pk=run_id)
+	response = HttpResponse(content_type='text/csv; charset=utf-8')
+	response['Content-Disposition'] = f'attachment; filename="paie_{run.month.strftime("%Y_%m")}.csv"'
+
+	writer = csv.writer(response)
+	writer.writerow(['Professeur', 'Séances', 'Heures', 'Tarif horaire (DH)', 'Montant (DH)'])
+	for line in run.lines.select_related('teacher'):
+		writer.writerow([line.teacher.name, line.sessions_count, line.hours, line.hourly_rate, line.amount])
+	writer.writerow(['TOTAL', '', run.total_hours, '', run.total_amount])
+	return response
+
+
+@require_GET
+def payroll_payslips(request):
+	"""Download every teacher's payslip for ?month=YYYY-MM as one PDF (default) or ?format=zip."""
+	from .payroll import parse_month
+	from .payslips import build_payslips_pdf, build_payslips_zip, collect_payslip_data
+
+	month = parse_month(request.GET.get('month'))
+	if month is None:
+		return HttpResponseBadRequest('Mois invalide')
+
+	payloads = collect_payslip_data(month)
+	if not payloads:
+		messages.warning(request, f'Aucune séance pour {month.strftime("%m/%Y")}.')
+		return redirect('core:payroll_runs')
+
+	if request.GET.get('format') == 'zip':
+		response = HttpResponse(build_payslips_zip(payloads), content_type='application/zip')
+		response['Content-Disposition'] = f'attachment; filename="fiches_paie_{month.strftime("%Y_%m")}.zip"'
+	else:
+		response = HttpResponse(build_payslips_pdf(payloads), content_type='application/pdf')
+		response['Content-Disposition'] = f'attachment; filename="fiches_paie_{month.strftime("%Y_%m")}.pdf"'
+	return response
+
+
+# First year offered by the annual payroll report
+PAYROLL_ANNUAL_FIRST_YEAR = 2000
+
+
+@require_GET
+def payroll_annual(request):
+	"""Annual report: scheduled vs taught hours for every teacher x month, one grouped query."""
+	from .models import Teacher
+	from .payroll import compute_teacher_hours_by_month, minutes_to_amount, minutes_to_hours
+
+	current_year = timezone.now().year
+	min_year, max_year = PAYROLL_ANNUAL_FIRST_YEAR, current_year + 1
+	try:
+		year = int(request.GET.get('year', current_year))
+	except ValueError:
+		return HttpResponseBadRequest('Année invalide')
+	# date(year, 1, 1) only accepts 1..9999; older or far-future years have no sessions anyway
+	if not min_year <= year <= max_year:
+		return HttpResponseBadRequest(f'Année hors limites ({min_year}-{max_year})')
+
+	matrix = compute_teacher_hours_by_month(year)
+	teachers = Teacher.objects.in_bulk(list(matrix))
+
+	rows = []
+	for teacher_id, months in matrix.items():
+		teacher = teachers[teacher_id]
+		taught_minutes = sum(m['taught_minutes'] for m in months.values())
+		scheduled_minutes = sum(m['scheduled_minutes'] for m in months.values())
+		rows.append({
+			'teacher': teacher,
+			'months': [
+				{
+					'scheduled_hours': minutes_to_hours(months[m]['scheduled_minutes']),
+					'taught_hours': minutes_to_hours(months[m]['taught_minutes']),
+				}
+				for m in range(1, 13)
+			],
+			'scheduled_hours': minutes_to_hours(scheduled_minutes),
+			'taught_hours': minutes_to_hours(taught_minutes),
+			'amount': minutes_to_amount(taught_minutes, teacher.hourly_rate),
+		})
+	rows.sort(key=lambda r: r['teacher'].name)
+
+	return render(request, 'core/payroll_annual.html', {
+		'year': year,
+		'has_previous': year > min_year,
+		'has_next': year < max_year,
+		'rows': rows,
+		'month_numbers': range(1, 13),
+	})
+
+
 def courses_list(request):
 	"""Display all course groups (classes) with summary info."""
 	from .models import CourseGroup
@@ -686,8 +1160,11 @@ def session_quick_status_update(request, session_id):
     if new_status not in ['PLANNED', 'DONE', 'CANCELLED']:
         return JsonResponse({'success': False, 'error': 'Invalid status'}, status=400)
     
+    previous_status = session.status
     session.status = new_status
     session.save()
+    if previous_status != new_status:
+        publish_event(SESSION_STATUS, session_id=session.id, status=new_status)
     
     return JsonResponse({
         'success': True,
@@ -713,14 +1190,8 @@ def session_detail_ajax(request, session_id):
     )
     
     # Get attendance if exists
-    from .models import Attendance
-    attendance = Attendance.objects.filter(
-        course_group=session.group,
-        date=session.date
-    ).select_related('student')
-    
     students = session.group.students.all()
-    attendance_dict = {a.student_id: a.is_present for a in attendance}
+    attendance_dict = dict(session.attendances.values_list('student_id', 'is_present'))
     
     student_list = []
     for student in students:
@@ -977,79 +1448,242 @@ def enrollment_remove(request, enrollment_id):
 
 ###############################  WHATSAPP INTEGRATION  #######################################
 
-@require_GET
-def whatsapp_payment_reminders(request):
-    """Generate WhatsApp links for payment reminders to unpaid students"""
-    from django.utils import timezone
+def _queue_whatsapp_contacts(request, contacts, kind, dedupe_key):
+    """Queue one outbox message per contact; `dedupe_key(contact)` stops double sends."""
+    queued = enqueue_messages(
+        (
+            {
+                'to': contact['phone'],
+                'body': contact['message'],
+                'student': contact.get('student'),
+                'dedupe_key': dedupe_key(contact),
+            }
+            for contact in contacts
+        ),
+        kind=kind,
+    )
+    skipped = len(contacts) - queued
+    if queued:
+        messages.success(request, f"{queued} message(s) ajouté(s) à la file d'envoi.")
+    if skipped:
+        messages.info(request, f"{skipped} message(s) déjà en file ou sans numéro valide, ignoré(s).")
+    return queued
+
+
+WHATSAPP_PAGE_SIZE = 50
+
+ANNOUNCEMENT_SESSION_KEY = 'whatsapp_announcement'
+
+
+def _payment_reminder_recipients(month):
+    """Active students with something left to pay for `month`, in one annotated query"""
+    return (
+        Student.objects.filter(is_active=True)
+        .exclude(parent_contact='')
+        .with_row_data(month)
+        .filter(row_status__in=['UNPAID', 'PARTIAL'])
+        .prefetch_related(None)
+    )
+
+
+def _payment_reminder_contact(student, month, render=None):
+    """Contact dict of a student annotated by with_row_data(); pass `render` when building a batch"""
+    due_amount = student.monthly_fees - student.month_paid
+    contact = {
+        'phone': student.parent_contact,
+        'name': student.parent_name or 'Parent',
+        'student_name': student.name,
+        'amount': due_amount,
+        'month': date_format(month, 'F Y'),
+        'reference': f"{student.id}-{month:%Y%m}",
+        'student': student,
+        'due_amount': due_amount,
+    }
     
-    current_month = timezone.now().date().replace(day=1)
+    # Personalized message (MessageTemplate 'payment_reminder', parent's language)
+    render = render or message_renderer('payment_reminder')
+    contact['message'] = render(contact, student.message_language)
+    return contact
+
+
+def _household_reminder_contact(students, month, render=None, render_household=None):
+    """
+    One reminder for siblings sharing the parent phone (core.households), annotated
+    by with_row_data(): a single child gets the usual reminder, several get one
+    message listing each child's dues. Pass the renderers when building a batch.
+    """
+    if len(students) == 1:
+        contact = _payment_reminder_contact(students[0], month, render)
+        contact['students'] = students
+        return contact
     
-    # Get all active students
-    students = Student.objects.filter(is_active=True)
+    for student in students:
+        student.due_amount = student.monthly_fees - student.month_paid
+    head = min(students, key=lambda s: s.pk)
+    due_amount = sum((s.due_amount for s in students), Decimal('0'))
+    student_names = ', '.join(s.name for s in students)
+    contact = {
+        'phone': head.parent_contact,
+        'name': next((s.parent_name for s in students if s.parent_name), 'Parent'),
+        'student_name': student_names,
+        'student_names': student_names,
+        'children': '\n'.join(f"- {s.name} : {s.due_amount} DH" for s in students),
+        'amount': due_amount,
+        'month': date_format(month, 'F Y'),
+        'reference': f"F{head.id}-{month:%Y%m}",
+        'student': head,
+        'students': students,
+        'due_amount': due_amount,
+    }
     
-    # Build list of unpaid students with WhatsApp links
-    unpaid_contacts = []
+    # MessageTemplate 'household_payment_reminder', language of the first child's parent
+    render_household = render_household or message_renderer('household_payment_reminder')
+    contact['message'] = render_household(contact, head.message_language)
+    return contact
+
+
+def _payment_reminder_households(recipients, month):
+    """Household reminder contacts of all recipients, siblings read together in one pass"""
+    render_reminder = message_renderer('payment_reminder')
+    render_household = message_renderer('household_payment_reminder')
+    students = recipients.order_by('parent_contact_e164', 'name', 'id').iterator(chunk_size=500)
+    # Ordered by phone: a household's children are consecutive
+    for _, siblings in groupby(students, key=household_key):
+        yield _household_reminder_contact(list(siblings), month, render_reminder, render_household)
+
+
+def _absence_recipients(target_date):
+    return Attendance.objects.filter(
+        date=target_date,
+        is_present=False
+    ).exclude(student__parent_contact='').select_related(
+        'student',
+        'course_group',
+        'session'
+    )
+
+
+def _absence_contact(absence, render=None):
+    student = absence.student
+    slot = absence.session or absence.course_group
+    contact = {
+        'phone': student.parent_contact,
+        'name': student.parent_name or 'Parent',
+        'student_name': student.name,
+        'course_name': absence.course_group.name,
+        'date': absence.date.strftime('%d/%m/%Y'),
+        'time': f"{slot.start_time:%H:%M} - {slot.end_time:%H:%M}",
+        'student': student,
+        'absence': absence,
+    }
     
-    for student in students:
-        required = calculate_student_monthly_total(student)
-        paid = Payment.objects.filter(
-            student=student,
-            month_covered=current_month,
-            status='PAID'
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
-        
-        due_amount = required - paid
-        
-        if due_amount > 0 and student.parent_contact:
-            # Prepare contact data
-            contact = {
-                'phone': student.parent_contact,
-                'name': student.parent_name or 'Parent',
-                'student_name': student.name,
-                'amount': str(due_amount),
-                'currency': 'DH',
-                'month': current_month.strftime('%B %Y'),
-            }
-            
-            # Generate personalized message
-            template = WhatsAppMessageTemplates.CUSTOMER_SERVICE['payment_reminder']
-            message = WhatsAppUtils.create_template_message(
-                template,
-                {
-                    'name': contact['name'],
-                    'amount': f"{contact['amount']} {contact['currency']}",
-                    'invoice_id': f"{student.id}-{current_month.strftime('%Y%m')}"
-                }
-            )
-            
-            # Generate WhatsApp link
-            whatsapp_link = WhatsAppUtils.generate_chat_link(
-                contact['phone'],
-                message
-            )
-            
-            contact['whatsapp_link'] = whatsapp_link
-            contact['message'] = message
-            contact['student'] = student
-            contact['due_amount'] = due_amount
-            
-            unpaid_contacts.append(contact)
+    # Message (MessageTemplate 'absence', parent's language)
+    render = render or message_renderer('absence')
+    contact['message'] = render(contact, student.message_language)
+    return contact
+
+
+def _announcement_recipients():
+    return Student.objects.filter(is_active=True).exclude(parent_contact='').only(
+        'id', 'name', 'parent_name', 'parent_contact'
+    )
+
+
+def _announcement_renderer(message_template):
+    """Compiled announcement text (raises ValidationError for unknown variables)"""
+    render = compile_template(message_template, allowed_placeholders('announcement'))
+    school_name = settings.SCHOOL_NAME
+    return lambda contact: render(dict(contact, school_name=school_name))
+
+
+def _announcement_contact(student, render):
+    contact = {
+        'phone': student.parent_contact,
+        'name': student.parent_name or 'Parent',
+        'student_name': student.name,
+        'student': student,
+    }
+    contact['message'] = render(contact)
+    return contact
+
+
+def _whatsapp_page(request, queryset, ordering):
+    """Keyset page of recipients (infinite scroll, see core.pagination)"""
+    from .pagination import keyset_paginate
+
+    return keyset_paginate(queryset, ordering, request.GET.get('cursor'), WHATSAPP_PAGE_SIZE)
+
+
+def _whatsapp_rows_querystring(request):
+    qs_dict = request.GET.copy()
+    qs_dict.pop('cursor', None)
+    return qs_dict.urlencode()
+
+
+@require_http_methods(["GET", "POST"])
+def whatsapp_payment_reminders(request):
+    """Paginated payment reminders, one per household of unpaid students (POST: queue them all in the outbox)"""
+    
+    current_month = timezone.now().date().replace(day=1)
+    recipients = _payment_reminder_recipients(current_month)
+    
+    if request.method == 'POST':
+        today = timezone.now().date()
+        contacts = list(_payment_reminder_households(recipients, current_month))
+        # Families are keyed by phone, a single child by id (same key as before households)
+        _queue_whatsapp_contacts(
+            request, contacts, 'PAYMENT_REMINDER',
+            lambda contact: (
+                f"payment_reminder:{contact['student'].parent_contact_e164}:{today:%Y%m%d}"
+                if len(contact['students']) > 1
+                else f"payment_reminder:{contact['student'].id}:{today:%Y%m%d}"
+            ),
+        )
+        return redirect('core:whatsapp_payment_reminders')
+    
+    # One row per household: page through one child per family, then load the siblings
+    heads = household_heads(recipients)
+    page = _whatsapp_page(request, heads, ['name', 'id'])
+    siblings = defaultdict(list)
+    phones = [s.parent_contact_e164 for s in page if s.parent_contact_e164]
+    for student in recipients.filter(parent_contact_e164__in=phones).order_by('name', 'id'):
+        siblings[student.parent_contact_e164].append(student)
+    
+    # Only the amounts: messages and links are built on demand (preview / open)
+    households = []
+    for head in page:
+        children = siblings[head.parent_contact_e164] if head.parent_contact_e164 else [head]
+        for student in children:
+            student.due_amount = student.monthly_fees - student.month_paid
+        households.append({
+            'head': head,
+            'students': children,
+            'parent_name': next((s.parent_name for s in children if s.parent_name), ''),
+            'due_amount': sum((s.due_amount for s in children), Decimal('0')),
+        })
     
     context = {
-        'unpaid_contacts': unpaid_contacts,
-        'total_unpaid': len(unpaid_contacts),
-        'current_month': current_month,
+        'households': households,
+        'page': page,
+        'querystring': _whatsapp_rows_querystring(request),
     }
+    if request.htmx and request.GET.get('cursor'):
+        return render(request, 'core/_whatsapp_reminder_rows.html', context)
     
+    context.update({
+        'total_unpaid': recipients.count(),
+        'total_households': heads.count(),
+        'current_month': current_month,
+    })
     return render(request, 'core/whatsapp_payment_reminders.html', context)
 
 
-@require_GET
+@require_http_methods(["GET", "POST"])
 def whatsapp_absence_notifications(request):
-    """Generate WhatsApp links to notify parents of student absences"""
+    """Paginated absence notifications for a date (POST: queue them all in the outbox)"""
     
     # Get date parameter (default to today)
-    date_param = request.GET.get('date')
+    date_param = request.POST.get('date') or request.GET.get('date')
     if date_param:
         try:
             target_date = datetime.strptime(date_param, '%Y-%m-%d').date()
@@ -1058,99 +1692,80 @@ def whatsapp_absence_notifications(request):
     else:
         target_date = timezone.now().date()
     
-    # Get all attendance records for the date where student was absent
-    absences = Attendance.objects.filter(
-        date=target_date,
-        is_present=False
-    ).select_related(
-        'student',
-        'course_group'
-    )
+    recipients = _absence_recipients(target_date)
     
-    # Build notification contacts
-    absence_contacts = []
-    
-    for absence in absences:
-        student = absence.student
-        
-        if student.parent_contact:
-            contact = {
-                'phone': student.parent_contact,
-                'name': student.parent_name or 'Parent',
-                'student_name': student.name,
-                'course_name': absence.course_group.name,
-                'date': target_date.strftime('%d/%m/%Y'),
-                'time': f"{absence.course_group.start_time} - {absence.course_group.end_time}",
-            }
-            
-            # Generate message
-            message = f"Bonjour {contact['name']},\n\n"
-            message += f"Nous vous informons que {contact['student_name']} était absent(e) "
-            message += f"au cours de {contact['course_name']} le {contact['date']}.\n\n"
-            message += "Si vous avez des questions, n'hésitez pas à nous contacter.\n\n"
-            message += "Cordialement,\nL'équipe pédagogique"
-            
-            # Generate WhatsApp link
-            whatsapp_link = WhatsAppUtils.generate_chat_link(
-                contact['phone'],
-                message
-            )
-            
-            contact['whatsapp_link'] = whatsapp_link
-            contact['message'] = message
-            contact['student'] = student
-            contact['absence'] = absence
-            
-            absence_contacts.append(contact)
+    if request.method == 'POST':
+        render_absence = message_renderer('absence')
+        contacts = [_absence_contact(absence, render_absence) for absence in recipients.iterator(chunk_size=500)]
+        _queue_whatsapp_contacts(
+            request, contacts, 'ABSENCE',
+            lambda contact: f"absence:{contact['absence'].pk}",
+        )
+        return redirect(f"{reverse('core:whatsapp_absence_notifications')}?date={target_date:%Y-%m-%d}")
     
     context = {
-        'absence_contacts': absence_contacts,
-        'total_absences': len(absence_contacts),
-        'target_date': target_date,
+        'absences': _whatsapp_page(request, recipients, ['id']),
+        'querystring': _whatsapp_rows_querystring(request),
     }
+    if request.htmx and request.GET.get('cursor'):
+        return render(request, 'core/_whatsapp_absence_rows.html', context)
     
+    context.update({
+        'total_absences': recipients.count(),
+        'target_date': target_date,
+    })
     return render(request, 'core/whatsapp_absence_notifications.html', context)
 
 
-@require_GET
+@require_http_methods(["GET", "POST"])
 def whatsapp_bulk_announcements(request):
-    """Create bulk WhatsApp announcement links for all active students"""
+    """Compose a WhatsApp announcement for all active students' parents"""
+    from django.core.exceptions import ValidationError
     
-    students = Student.objects.filter(is_active=True)
+    recipients = _announcement_recipients()
     
-    # Build contacts list
-    contacts = []
-    for student in students:
-        if student.parent_contact:
-            contacts.append({
-                'phone': student.parent_contact,
-                'name': student.parent_name or 'Parent',
-                'student_name': student.name,
-            })
-    
-    # If POST, generate links with custom message
+    # If POST, queue the announcement or generate the links
     if request.method == 'POST':
         message_template = request.POST.get('message_template', '')
         
         if message_template:
-            # Generate bulk links
-            bulk_links = WhatsAppUtils.generate_bulk_links(
-                contacts,
-                message_template
+            try:
+                render_announcement = _announcement_renderer(message_template)
+            except ValidationError as e:
+                messages.error(request, ' '.join(e.messages))
+                message_template = ''
+        
+        if message_template and request.POST.get('action') == 'queue':
+            # Same announcement queued once per student and per day
+            digest = hashlib.sha1(message_template.encode('utf-8')).hexdigest()[:12]
+            today = timezone.now().date()
+            contacts = (
+                _announcement_contact(student, render_announcement)
+                for student in recipients.order_by('id').iterator(chunk_size=2000)
             )
-            
-            context = {
-                'bulk_links': bulk_links,
-                'message_template': message_template,
-                'total_contacts': len(bulk_links),
-            }
-            
-            return render(request, 'core/whatsapp_bulk_results.html', context)
+            queued = enqueue_messages(
+                (
+                    {
+                        'to': contact['phone'],
+                        'body': contact['message'],
+                        'student': contact['student'],
+                        'dedupe_key': f"announcement:{digest}:{today:%Y%m%d}:{contact['student'].pk}",
+                    }
+                    for contact in contacts
+                ),
+                kind='ANNOUNCEMENT',
+            )
+            messages.success(request, f"{queued} annonce(s) ajoutée(s) à la file d'envoi.")
+            return redirect('core:whatsapp_bulk_announcements')
+        
+        if message_template:
+            # Links are listed page by page from the template kept in the session
+            request.session[ANNOUNCEMENT_SESSION_KEY] = message_template
+            return redirect('core:whatsapp_bulk_results')
     
-    # GET request - show form
+    # GET request - show form (recipients are listed page by page on the results page)
     context = {
-        'contacts': contacts,
-        'total_contacts': len(contacts),
+        'total_contacts': recipients.count(),
         'templates': {
             'general': "Bonjour {name}, message général pour tous les parents...",
             'event': "Bonjour {name}, nous organisons un événement le [DATE]. Votre enfant {student_name} est invité à participer.",
@@ -1161,6 +1776,79 @@ def whatsapp_bulk_announcements(request):
     return render(request, 'core/whatsapp_bulk_announcements.html', context)
 
 
+@require_GET
+def whatsapp_bulk_results(request):
+    """Paginated WhatsApp links for the announcement composed on whatsapp_bulk_announcements"""
+    
+    message_template = request.session.get(ANNOUNCEMENT_SESSION_KEY)
+    if not message_template:
+        return redirect('core:whatsapp_bulk_announcements')
+    
+    recipients = _announcement_recipients()
+    context = {
+        'students': _whatsapp_page(request, recipients, ['name', 'id']),
+        'querystring': _whatsapp_rows_querystring(request),
+    }
+    if request.htmx and request.GET.get('cursor'):
+        return render(request, 'core/_whatsapp_announcement_rows.html', context)
+    
+    context.update({
+        'message_template': message_template,
+        'total_contacts': recipients.count(),
+    })
+    return render(request, 'core/whatsapp_bulk_results.html', context)
+
+
+def _whatsapp_message_contact(request, kind, pk):
+    """Contact dict (with message) of one row of the pages above, or 404"""
+    
+    if kind == 'payment_reminder':
+        month = timezone.now().date().replace(day=1)
+        student = get_object_or_404(
+            Student.objects.with_row_data(month).prefetch_related(None), pk=pk, parent_contact__gt=''
+        )
+        return _payment_reminder_contact(student, month)
+    if kind == 'household_reminder':
+        month = timezone.now().date().replace(day=1)
+        recipients = _payment_reminder_recipients(month)
+        head = get_object_or_404(recipients, pk=pk)
+        return _household_reminder_contact(
+            list(household_members(head, recipients).order_by('name', 'id')), month
+        )
+    if kind == 'absence':
+        absence = get_object_or_404(
+            Attendance.objects.select_related('student', 'course_group', 'session'), pk=pk, is_present=False
+        )
+        return _absence_contact(absence)
+    if kind == 'announcement':
+        message_template = request.session.get(ANNOUNCEMENT_SESSION_KEY)
+        if not message_template:
+            raise Http404
+        student = get_object_or_404(_announcement_recipients(), pk=pk)
+        return _announcement_contact(student, _announcement_renderer(message_template))
+    raise Http404
+
+
+@require_GET
+def whatsapp_message_preview(request, kind, pk):
+    """HTMX: content of the message preview modal for one row"""
+    
+    contact = _whatsapp_message_contact(request, kind, pk)
+    return render(request, 'core/_whatsapp_message_preview.html', {
+        'contact': contact,
+        'kind': kind,
+        'pk': pk,
+    })
+
+
+@require_GET
+def whatsapp_message_open(request, kind, pk):
+    """Redirect to the WhatsApp chat link of one row (message built on click, not in the page)"""
+    
+    contact = _whatsapp_message_contact(request, kind, pk)
+    return redirect(WhatsAppUtils.generate_chat_link(contact['phone'], contact['message']))
+
+
 @require_GET
 def whatsapp_payment_confirmation(request, payment_id):
     """Generate WhatsApp link to send payment confirmation"""
@@ -1172,15 +1860,15 @@ def whatsapp_payment_confirmation(request, payment_id):
         messages.error(request, "Aucun numéro de téléphone disponible pour ce parent")
         return redirect('core:student_page', student_id=student.id)
     
-    # Generate confirmation message
-    message = f"Bonjour {student.parent_name or 'Parent'},\n\n"
-    message += f"Nous confirmons la réception de votre paiement:\n\n"
-    message += f"Montant: {payment.amount} DH\n"
-    message += f"Date: {payment.payment_date.strftime('%d/%m/%Y')}\n"
-    message += f"Reçu N°: {payment.receipt_number}\n"
-    message += f"Pour le mois de: {payment.month_covered.strftime('%B %Y')}\n\n"
-    message += "Merci pour votre confiance!\n\n"
-    message += "Cordialement,\nL'équipe administrative"
+    # Confirmation message (MessageTemplate 'payment_confirmation')
+    message = render_message('payment_confirmation', {
+        'name': student.parent_name or 'Parent',
+        'student_name': student.name,
+        'amount': payment.amount,
+        'date': payment.payment_date.strftime('%d/%m/%Y'),
+        'receipt_number': payment.receipt_number,
+        'month': date_format(payment.month_covered, 'F Y'),
+    }, student.message_language)
     
     # Generate WhatsApp link
     whatsapp_link = WhatsAppUtils.generate_chat_link(
@@ -1198,54 +1886,29 @@ def whatsapp_payment_confirmation(request, payment_id):
     return render(request, 'core/whatsapp_payment_confirmation.html', context)
 
 
-@require_GET
+@require_http_methods(["GET", "POST"])
 def whatsapp_session_reminder(request, session_id):
-    """Generate WhatsApp links to remind students about upcoming session"""
+    """Generate WhatsApp links to remind students about upcoming session (POST: queue them in the outbox)"""
     
     session = get_object_or_404(
-        Session.objects.select_related('group', 'group__teacher', 'group__room'),
+        Session.objects.select_related('group', 'group__teacher', 'group__room', 'room'),
         pk=session_id
     )
     
-    students = session.group.students.filter(is_active=True)
-    
-    # Build reminder contacts
-    reminder_contacts = []
+    # Same contacts and messages as the scheduled reminders (core.reminders)
+    reminder_contacts = session_reminder_contacts(session)
+    for contact in reminder_contacts:
+        contact['whatsapp_link'] = WhatsAppUtils.generate_chat_link(
+            contact['phone'],
+            contact['message']
+        )
     
-    for student in students:
-        if student.parent_contact:
-            contact = {
-                'phone': student.parent_contact,
-                'name': student.parent_name or 'Parent',
-                'student_name': student.name,
-                'course_name': session.group.name,
-                'date': session.date.strftime('%d/%m/%Y'),
-                'time': session.start_time.strftime('%H:%M'),
-                'room': session.group.room.name,
-            }
-            
-            # Use template
-            template = WhatsAppMessageTemplates.EDUCATION['class_reminder']
-            message = WhatsAppUtils.create_template_message(
-                template,
-                {
-                    'student_name': contact['student_name'],
-                    'subject': contact['course_name'],
-                    'date': f"{contact['date']} à {contact['time']}",
-                    'room': contact['room'],
-                }
-            )
-            
-            whatsapp_link = WhatsAppUtils.generate_chat_link(
-                contact['phone'],
-                message
-            )
-            
-            contact['whatsapp_link'] = whatsapp_link
-            contact['message'] = message
-            contact['student'] = student
-            
-            reminder_contacts.append(contact)
+    if request.method == 'POST':
+        _queue_whatsapp_contacts(
+            request, reminder_contacts, 'SESSION_REMINDER',
+            lambda contact: session_reminder_key(session.pk, contact['student'].pk),
+        )
+        return redirect('core:whatsapp_session_reminder', session_id=session.pk)
     
     context = {
         'session': session,
@@ -136,6 +136,80 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
 
+# Cache (mémoire locale ; FileBasedCache pour partager entre plusieurs workers)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'school-erp',
+    }
+}
+
+# Durée max (secondes) d'une section du tableau de bord en cache ; les signaux
+# invalident avant sur toute écriture
+DASHBOARD_CACHE_TTL = 120
+
+# Fragments de template versionnés (cartes élèves, cellules du planning)
+FRAGMENT_CACHE_TTL = 3600
+
+# Cockpit : calculer les panneaux en parallèle côté serveur au lieu de les
+# charger un par un en HTMX ; au-delà du délai, retour au chargement HTMX
+DASHBOARD_EAGER_PANELS = False
+DASHBOARD_EAGER_TIMEOUT = 1.5
+# Threads du pool partagé qui calcule ces panneaux
+DASHBOARD_WORKERS = 5
+
+# Événements temps réel (SSE) : 'local' (un seul processus) ou 'file'
+# (spool partagé entre plusieurs workers sur la même machine)
+EVENTS_BACKEND = 'local'
+EVENTS_SPOOL_PATH = BASE_DIR / 'var' / 'events.jsonl'
+# Sans serveur ASGI (pas de flux SSE) : rafraîchissement du cockpit, en secondes
+DASHBOARD_POLL_SECONDS = 60
+
+# Exports CSV/XLSX en flux : lignes lues par paquet
+EXPORT_CHUNK_SIZE = 2000
+
+# Exports de l'admin en arrière-plan (manage.py run_export_jobs) : fichiers
+# dans MEDIA_ROOT/exports/, supprimés après ce nombre de jours
+EXPORT_JOB_RETENTION_DAYS = 7
+
+# Import rapide (admin / manage.py bulk_import) : lignes par bulk_create
+IMPORT_BATCH_SIZE = 1000
+
+# Boîte d'envoi (manage.py run_outbox) : passerelle WhatsApp/SMS, débit
+# (messages par seconde, rafale), taille des lots et nouvelles tentatives
+# (délai doublé à chaque échec, en secondes). FakeGateway n'envoie rien.
+OUTBOX_GATEWAY = 'core.outbox.FakeGateway'
+OUTBOX_GATEWAY_OPTIONS = {}
+OUTBOX_RATE_PER_SECOND = 5
+OUTBOX_BURST = 20
+OUTBOX_BATCH_SIZE = 20
+OUTBOX_MAX_ATTEMPTS = 6
+OUTBOX_RETRY_BASE_SECONDS = 30
+OUTBOX_RETRY_MAX_SECONDS = 3600
+
+# Textes des messages (admin « Modèles de messages ») : langue utilisée quand
+# un parent n'a pas de variante dans sa langue
+MESSAGE_DEFAULT_LANGUAGE = 'fr'
+
+# Rappels de séance programmés (manage.py send_session_reminders, chaque
+# heure) : séances qui commencent dans ce nombre d'heures
+SESSION_REMINDER_HOURS = 24
+
+# Listes paginées par clé : durée (secondes) du total approximatif en cache
+PAGINATION_COUNT_TTL = 300
+
+# Recherche globale : budget (ms) au-delà duquel un type d'entité est omis
+OMNISEARCH_BUDGET_MS = 50
+# Threads du pool partagé de la recherche globale (élèves, reçus)
+OMNISEARCH_WORKERS = 8
+# Âge maximal (s) des index en mémoire (professeurs, groupes, salles) : rattrape
+# les écritures d'autres processus (bulk_import...) avec un cache local
+OMNISEARCH_INDEX_MAX_AGE = 60
+
+# Indicatif ajouté aux numéros saisis en format local (06..., 6...)
+PHONE_DEFAULT_COUNTRY_CODE = '212'
+
+
 # Settings for school ERP
 SCHOOL_NAME = "École de Soutien"
 SCHOOL_ADDRESS = "123 Rue de l'Éducation, Ville, Pays"